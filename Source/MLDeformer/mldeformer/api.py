@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # Copyright Epic Games, Inc. All Rights Reserved
 
+from mldeformer.generator.maya.generation.fast_generation import FastGenerationContext
 from mldeformer.ui.maya.maya_event_handler import MayaEventHandler
 from mldeformer.ui.parameter import Parameter
 # Add the parameters from the add params window to this.
@@ -23,7 +24,8 @@ class DeformerInterface(object):
     def has_parameter(self, parameter_name):
         return self.event_handler.generator_config.has_parameter(parameter_name)
     
-    def add_parameter(self, name, display_name=None, default_value=0.0, min_value =0.0, max_value = 1.0, object_type = "joint"):
+    def add_parameter(self, name, display_name=None, default_value=0.0, min_value =0.0, max_value = 1.0, object_type = "joint",
+                      distribution=Parameter.DISTRIBUTION_UNIFORM, distribution_params=None):
         new_param = Parameter()
         new_param.name = name
         new_param.display_name = display_name or name
@@ -31,6 +33,8 @@ class DeformerInterface(object):
         new_param.min_value = min_value
         new_param.max_value = max_value
         new_param.default_value = default_value
+        new_param.distribution = distribution
+        new_param.distribution_params = list(distribution_params or [])
         if not self.event_handler.generator_config.has_parameter(name):
             self.event_handler.generator_config.parameters.append(new_param)
     
@@ -53,10 +57,17 @@ class DeformerInterface(object):
         all_params = [param.name for param in self.event_handler.generator_config.parameters]
         return all_params
     
-    def generate_samples(self):
-        return self.event_handler.generate()
+    def generate_samples(self, resume=False):
+        return self.event_handler.generate(resume)
+
+    def generate_samples_sharded(self, num_shards=None, mayapy=None, num_processes=None):
+        return self.event_handler.generate_sharded(num_shards, mayapy, num_processes)
 
     def export_fbx_and_abc(self, output_fbx_file, output_abc_file):
+        with FastGenerationContext('Export'):
+            return self._export_fbx_and_abc(output_fbx_file, output_abc_file)
+
+    def _export_fbx_and_abc(self, output_fbx_file, output_abc_file):
         old_fbx = self.event_handler.generator_config.output_fbx_file
         old_abc = self.event_handler.generator_config.output_abc_file
         self.event_handler.generator_config.output_fbx_file = output_fbx_file
@@ -103,7 +114,8 @@ def has_parameter(parameter_name):
     return api_module.iface.has_parameter(parameter_name)
 
 
-def add_parameter(name, display_name=None, default_value=0.0, min_value =0.0, max_value = 1.0, object_type = "joint"):
+def add_parameter(name, display_name=None, default_value=0.0, min_value =0.0, max_value = 1.0, object_type = "joint",
+                  distribution=Parameter.DISTRIBUTION_UNIFORM, distribution_params=None):
     """Add a new parameter with the given name
 
        Arguments:
@@ -113,15 +125,22 @@ def add_parameter(name, display_name=None, default_value=0.0, min_value =0.0, ma
            min_value(float, optional): The minimum value of the parameter
            max_value(float, optional): The maximum value of the parameter
            object_type(string, optional): The type of the parameter (joint, blendshape etc.)
+           distribution(int, optional): How values are sampled in the range, one of the Parameter.DISTRIBUTION_*
+               values: uniform, truncated normal, beta, discrete or log-uniform
+           distribution_params(list(float), optional): The parameters of the distribution, [mean, deviation] for
+               normal, [alpha, beta] for beta, the allowed values for discrete and [offset] for log-uniform.
+               Empty for the defaults.
 
       Example: 
           >>> from mldeformer import api as ml_api 
           >>> param = ml_api.add_parameter("example_joint", default_value=0.5, min_value=-1.0, max_value=1.0)
+          >>> param = ml_api.add_parameter("smile.weight", object_type="blendShape",
+          >>>                              distribution=Parameter.DISTRIBUTION_NORMAL, distribution_params=[0.0, 0.2])
 
       """
     _create_deformer_api_interface()
     return api_module.iface.add_parameter(name, display_name, default_value, min_value,
-                                                       max_value, object_type)
+                                                       max_value, object_type, distribution, distribution_params)
 
 
 def get_parameter(parameter_name):
@@ -179,7 +198,8 @@ def list_parameters():
 
 def generate_samples(start_frame=0, end_frame=1000,
                      controller_probability=0.2, set_range_limit_probability=0.01,
-                     random_seed=7777):
+                     random_seed=7777, seed_mode=None, intersection_engine=None, sampling_strategy=None,
+                     return_coverage=False, resume=False, keyframe_flush_interval=None):
     """Generate samples given the current parameter settings
 
     This function executes the mldeformer.generator.maya.pose_generator to create random animation on the 
@@ -191,10 +211,33 @@ def generate_samples(start_frame=0, end_frame=1000,
         controller_probability (float, optional): Probability of a controller activating
         set_range_limit_probability (float, optional): Probability of making a controller the max or min value
         random_seed:(int, optional): The seed value used by the random number generator
+        seed_mode (int, optional): Config.SEED_MODE_SEQUENTIAL or Config.SEED_MODE_PER_FRAME. In per-frame mode
+            the pose of every frame only depends on the seed and the frame, so frame ranges can be regenerated
+            independently. A random number generator is created per frame, which makes sampling a little slower
+            than in sequential mode. Group probabilities are never adapted in per-frame mode, since that would make
+            a pose depend on the tests of earlier frames. Uses the configuration value when None.
+        intersection_engine (int, optional): Config.INTERSECTION_ENGINE_MAYA or Config.INTERSECTION_ENGINE_NUMPY,
+            the engine used by the ray mesh collision test. Uses the configuration value when None.
+        sampling_strategy (int, optional): Config.SAMPLING_STRATEGY_UNIFORM, Config.SAMPLING_STRATEGY_SOBOL or
+            Config.SAMPLING_STRATEGY_LATIN_HYPERCUBE. Sobol requires scipy and falls back to Latin hypercube
+            sampling without it. Uses the configuration value when None.
+        return_coverage (bool, optional): Also return the coverage statistics of the generated poses as a dict:
+            per parameter histograms and min/max hit counts, and the co-occurrence counts of active groups.
+            The statistics are also written to CoverageStatistics.json and .npz next to the output fbx file.
+        resume (bool, optional): Continue an interrupted generation from the checkpoint next to the output fbx file.
+            Pass the same arguments as the interrupted call, the result is identical to an uninterrupted generation.
+            The generation state is checkpointed every Config.checkpoint_interval frames and when cancelled,
+            checkpoints are off by default (0). The checkpoint is removed once all poses are keyed.
+        keyframe_flush_interval (int, optional): Key the poses on the animation curves every this many frames while
+            generating, so memory stays bounded for very long generations. 0 keys all poses at the end.
+            Checkpoints are not saved while flushing. Uses the configuration value when None.
 
     Example: 
         >>> from mldeformer import api as ml_api 
         >>> ml_api.generate_samples(start_frame=100, end_frame=500)
+        >>> generated, message, coverage = ml_api.generate_samples(end_frame=500, return_coverage=True)
+        >>> print(coverage['controllers'][0]['histogram'])
+        >>> ml_api.generate_samples(start_frame=100, end_frame=500, resume=True)
     """
 
     _create_deformer_api_interface()
@@ -205,11 +248,59 @@ def generate_samples(start_frame=0, end_frame=1000,
     deformer_config.start_frame = start_frame
     deformer_config.num_samples = end_frame - start_frame
     deformer_config.controller_probability = controller_probability
-    deformer_config.set_max_probability = set_range_limit_probability
+    deformer_config.set_max_min_probability = set_range_limit_probability
     
     deformer_config.random_seed = random_seed
+    if seed_mode is not None:
+        deformer_config.seed_mode = seed_mode
+    if intersection_engine is not None:
+        deformer_config.intersection_engine = intersection_engine
+    if sampling_strategy is not None:
+        deformer_config.sampling_strategy = sampling_strategy
+    if keyframe_flush_interval is not None:
+        deformer_config.keyframe_flush_interval = keyframe_flush_interval
+
+    generate_results = api_module.iface.generate_samples(resume)
+
+    api_module.iface.event_handler.generator_config = previous_config
+
+    if return_coverage:
+        coverage_statistics = api_module.iface.event_handler.coverage_statistics
+        coverage_data = coverage_statistics.to_json_data() if coverage_statistics is not None else None
+        return tuple(generate_results) + (coverage_data,)
+    return generate_results
+
+
+def generate_samples_sharded(start_frame=0, end_frame=1000, num_shards=None, mayapy=None, num_processes=None):
+    """Generate samples in several mayapy processes given the current parameter settings
+
+    The frame range is split into shards. Every shard runs in its own mayapy process against the saved scene and
+    the current configuration, after which the poses are merged back in frame order and keyed in the current scene.
+    The shards use the per-frame seed mode, so the result is identical to a serial generation in that mode.
+    Settings that depend on the poses of earlier frames, like the minimum pose distance and the adaptive number of
+    samples, can't be used in shards and make the generation fail with a message.
+
+    Arguments:
+        start_frame (int, optional): The first frame to start generating samples
+        end_frame (int, optional): The last frame of the generated samples
+        num_shards (int, optional): The number of shards, defaults to the number of cpus
+        mayapy (string, optional): The python executable of the workers, found automatically when None
+        num_processes (int, optional): The maximum number of workers running at once, defaults to the number of cpus
+
+    Example: 
+        >>> from mldeformer import api as ml_api 
+        >>> ml_api.generate_samples_sharded(start_frame=0, end_frame=100000, num_shards=32)
+    """
+
+    _create_deformer_api_interface()
+
+    deformer_config = api_module.iface.event_handler.generator_config
+    previous_config = copy.copy(deformer_config)
+
+    deformer_config.start_frame = start_frame
+    deformer_config.num_samples = end_frame - start_frame
 
-    generate_results = api_module.iface.generate_samples()
+    generate_results = api_module.iface.generate_samples_sharded(num_shards, mayapy, num_processes)
 
     api_module.iface.event_handler.generator_config = previous_config
 
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module reads the keyed animation of many controllers into a (frames x controllers) matrix.
+The curves are evaluated directly, without evaluating the scene.
+"""
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as omanim
+import numpy as np
+
+from .anim_curve_writer import ANGULAR_CURVE_TYPES
+
+
+class AnimCurveReader(object):
+    """Evaluates the animation curves of controllers at a range of frames."""
+
+    def __init__(self, ctrl_list, attr_list):
+        """ Initialize AnimCurveReader class, resolving the curves of the plugs.
+        Parameters:
+            ctrl_list (list(str)) -- Controller names
+            attr_list (list(str)) -- Attribute names, one per controller
+        """
+        self.plug_names = ['{0}.{1}'.format(ctrl, attr) for ctrl, attr in zip(ctrl_list, attr_list)]
+        selection_list = om.MSelectionList()
+        for plug_name in self.plug_names:
+            selection_list.add(plug_name)
+
+        # Controllers without a curve have no animation to read.
+        self.curves = []
+        for idx in range(len(self.plug_names)):
+            mcurve = omanim.MFnAnimCurve(selection_list.getPlug(idx))
+            try:
+                mcurve.name()  # errors if does not exist
+            except RuntimeError:
+                mcurve = None
+            self.curves.append(mcurve)
+
+    def get_key_range(self):
+        """Get the first and last key time over all curves, in the current time unit.
+        Return:
+            Tuple of the first and last frame, None when no curve has keys
+        """
+        time_unit = om.MTime.uiUnit()
+        key_times = []
+        for mcurve in self.curves:
+            if mcurve is not None and mcurve.numKeys > 0:
+                key_times.append(mcurve.input(0).asUnits(time_unit))
+                key_times.append(mcurve.input(mcurve.numKeys - 1).asUnits(time_unit))
+        if not key_times:
+            return None
+        return min(key_times), max(key_times)
+
+    def read(self, frame_times):
+        """Evaluate all curves at the given frames.
+        Parameters:
+            frame_times (list(float)) -- Frame times, in the current time unit
+        Return:
+            Matrix (frames x controllers) of values, angles in degrees and nan for controllers without a curve
+        """
+        time_unit = om.MTime.uiUnit()
+        key_times = [om.MTime(frame_time, time_unit) for frame_time in np.asarray(frame_times).tolist()]
+        values = np.full((len(key_times), len(self.curves)), np.nan)
+        for idx, mcurve in enumerate(self.curves):
+            if mcurve is None:
+                continue
+            values[:, idx] = [mcurve.evaluate(key_time) for key_time in key_times]
+            # Angular curves store radians.
+            if mcurve.animCurveType in ANGULAR_CURVE_TYPES:
+                values[:, idx] = np.degrees(values[:, idx])
+        return values
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module writes key frames to many animation curves at once.
+Plugs and curves are resolved a single time into a cached table, so writing keys
+only costs one addKeys call per curve.
+"""
+
+import time
+
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as omanim
+import numpy as np
+
+ANGULAR_CURVE_TYPES = (omanim.MFnAnimCurve.kAnimCurveTA, omanim.MFnAnimCurve.kAnimCurveUA)
+
+
+class AnimCurveWriter(object):
+    """Writes (frames x controllers) key values to the animation curves of the controllers."""
+
+    def __init__(self, ctrl_list, attr_list):
+        """ Initialize AnimCurveWriter class, resolving all plugs and curves.
+        Parameters:
+            ctrl_list (list(str)) -- Controller names
+            attr_list (list(str)) -- Attribute names, one per controller
+        """
+        self.plug_names = ['{0}.{1}'.format(ctrl, attr) for ctrl, attr in zip(ctrl_list, attr_list)]
+        self.plugs = []
+        self.curves = []
+        self.curve_timings = np.zeros(len(self.plug_names))
+        self.resolve_curves()
+
+    def resolve_curves(self):
+        """Resolve every plug and its animation curve, creating curves that do not exist yet."""
+        selection_list = om.MSelectionList()
+        for plug_name in self.plug_names:
+            selection_list.add(plug_name)
+
+        self.plugs = [selection_list.getPlug(idx) for idx in range(len(self.plug_names))]
+        self.curves = []
+        for mplug in self.plugs:
+            mcurve = omanim.MFnAnimCurve(mplug)
+            try:
+                mcurve.name()  # errors if does not exist
+            except RuntimeError:
+                mcurve.create(mplug)  # if the curve does not exist, create it and attach it to the plug
+            self.curves.append(mcurve)
+
+        # Angular curves are keyed in radians, while the values are in degrees.
+        self.angular_columns = np.array([mcurve.animCurveType in ANGULAR_CURVE_TYPES for mcurve in self.curves],
+                                        dtype=bool)
+
+    def write(self, frame_times, values, keep_existing=True):
+        """Add keys to all curves.
+        Parameters:
+            frame_times (list(float)) -- Frame times of the keys, in the current time unit
+            values (ndarray)          -- Matrix (frames x controllers) of key values
+            keep_existing (bool)      -- When False, existing keys between the first and last frame are removed
+        """
+        time_unit = om.MTime.uiUnit()
+        key_times = om.MTimeArray([om.MTime(frame_time, time_unit) for frame_time in np.asarray(frame_times).tolist()])
+
+        # Convert all angular columns in one pass, then get one contiguous row of values per curve.
+        curve_values = np.array(values, dtype=np.float64, copy=True)
+        curve_values[:, self.angular_columns] = np.radians(curve_values[:, self.angular_columns])
+        curve_values = np.ascontiguousarray(curve_values.T)
+
+        for idx, mcurve in enumerate(self.curves):
+            start_time = time.time()
+            mcurve.addKeys(
+                key_times,
+                om.MDoubleArray(curve_values[idx].tolist()),
+                omanim.MFnAnimCurve.kTangentStep,
+                omanim.MFnAnimCurve.kTangentStep,
+                keep_existing)
+            self.curve_timings[idx] += time.time() - start_time
+
+    def print_timings(self, num_slowest=5):
+        """Print the total time spent adding keys and the slowest curves.
+        Parameters:
+            num_slowest (int) -- Number of slowest curves to list
+        """
+        if len(self.curves) == 0:
+            return
+        print('[MLDeformer] Keyed {} curves in {:.3f} seconds ({:.3f} ms per curve)'.format(
+            len(self.curves), self.curve_timings.sum(), 1000.0 * self.curve_timings.mean()))
+        for idx in np.argsort(self.curve_timings)[::-1][:num_slowest]:
+            print('[MLDeformer]     {}: {:.3f} ms'.format(self.plug_names[idx], 1000.0 * self.curve_timings[idx]))
@@ -5,12 +5,49 @@ import maya.cmds as cmds
 import maya.api.OpenMaya as om
 import maya.api.OpenMayaAnim as omanim
 import math
+import numpy as np
+
+from .anim_curve_writer import AnimCurveWriter
 
 try:
     from itertools import izip
 except ImportError:  #python3.x
     izip = zip
 
+try:
+    import tracemalloc
+except ImportError:  # Python 2 has no tracemalloc.
+    tracemalloc = None
+
+
+def measure_peak_memory(function, *args):
+    """Call a function and measure the peak of the memory it allocates in Python and numpy with tracemalloc.
+    Tracing is only switched on for the call, unless it was on already.
+    Parameters:
+        function (function) -- Function to call
+        args                -- Arguments of the function
+    Return:
+        The result of the function and the peak bytes allocated during the call, or None when it can't be measured
+    """
+    if tracemalloc is None:
+        return function(*args), None
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # The peak of an earlier allocation can't be told apart from the peak of the call.
+        return function(*args), None
+    start_memory = tracemalloc.get_traced_memory()[0]
+    try:
+        result = function(*args)
+        peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return result, max(0, peak_memory)
+
 # Keyframe animation class
 class KeyFrameAnimation():
     """KeyFrameAnimation """
@@ -22,6 +59,19 @@ class KeyFrameAnimation():
         self.attr_list = []
         self.attr_times = om.MTimeArray()
         self.attr_values = []
+        # Preallocated (frames x controllers) storage, used instead of attr_times and attr_values once allocated.
+        self.key_frame_times = None
+        self.key_buffer = None
+        self.num_stored_keyframes = 0
+        # Streaming mode: the buffer is keyed on the curves and emptied every flush_interval frames.
+        self.flush_interval = 0
+        self.num_flushed_keyframes = 0
+        self.curve_writer = None
+        # Peak bytes of the key buffer plus the memory measured while writing it to the curves, None until measured.
+        self.peak_key_memory = None
+        # Largest memory measured while writing a flush to the curves, and the number of frames of that flush.
+        self.peak_write_memory = 0
+        self.peak_write_frames = 0
         # Default input and output animation curve types.
         self.in_curve_type = 'linear'
         self.out_curve_type = 'linear'
@@ -135,18 +185,111 @@ class KeyFrameAnimation():
                 return True
             return False
 
+    def set_flush_interval(self, flush_interval):
+        """Enable the streaming mode, which keys the stored key frames on the curves every flush_interval frames
+        and reuses the buffer, instead of holding all key frames until set_all_stored_keyframes.
+        get_stored_keyframes then only returns the key frames that are not flushed yet.
+        Call this before allocating the key frames.
+        Parameters:
+            flush_interval (int) -- Number of frames per flush, 0 to keep all key frames until the end
+        """
+        self.flush_interval = max(0, flush_interval)
+
+    def allocate_keyframes(self, num_frames, dtype=np.float64):
+        """Store key frames in a preallocated contiguous (frames x controllers) buffer.
+        Call this after setting the controller attributes and before storing key frames.
+        The buffer grows when more frames are stored than allocated.
+        In streaming mode the buffer only holds the frames of one flush.
+        Parameters:
+            num_frames (int) -- Number of frames to allocate
+            dtype            -- Value type of the buffer
+        """
+        if self.flush_interval > 0:
+            num_frames = min(num_frames, self.flush_interval)
+        self.key_frame_times = np.empty(num_frames, dtype=np.float64)
+        self.key_buffer = np.empty((num_frames, len(self.ctrl_list)), dtype=dtype)
+        self.num_stored_keyframes = 0
+
+    def get_key_buffer_bytes(self):
+        if self.key_buffer is None:
+            return 0
+        return self.key_buffer.nbytes + self.key_frame_times.nbytes
+
+    def get_num_keyframes(self):
+        """Get the number of key frames stored so far, including the flushed ones."""
+        return self.num_flushed_keyframes + self.num_stored_keyframes
+
+    def grow_keyframe_buffer(self, num_frames):
+        """Make sure the key frame buffer can hold a given number of frames.
+        Parameters:
+            num_frames (int) -- Number of frames the buffer should be able to hold
+        """
+        if num_frames <= len(self.key_buffer):
+            return
+        num_frames = max(num_frames, 2 * len(self.key_buffer))
+        key_frame_times = np.empty(num_frames, dtype=self.key_frame_times.dtype)
+        key_frame_times[:self.num_stored_keyframes] = self.key_frame_times[:self.num_stored_keyframes]
+        key_buffer = np.empty((num_frames, self.key_buffer.shape[1]), dtype=self.key_buffer.dtype)
+        key_buffer[:self.num_stored_keyframes] = self.key_buffer[:self.num_stored_keyframes]
+        self.key_frame_times = key_frame_times
+        self.key_buffer = key_buffer
+
+    def store_keyframes_batch(self, frame_times, values):
+        """Store the key frames of several frames at once in the preallocated buffer.
+        Parameters:
+            frame_times (list(float))       -- Times of the key frames
+            values (ndarray)                -- Matrix (frames x controllers) of values to store
+        """
+        if self.key_buffer is None:
+            self.allocate_keyframes(len(frame_times))
+        start = self.num_stored_keyframes
+        end = start + len(frame_times)
+        self.grow_keyframe_buffer(end)
+        self.key_frame_times[start:end] = frame_times
+        self.key_buffer[start:end] = values
+        self.num_stored_keyframes = end
+        if 0 < self.flush_interval <= self.num_stored_keyframes:
+            self.flush_stored_keyframes()
+
     def store_keyframes(self, frame_time, in_val_list):
         """"Set key frames.
         Parameters:
             frame_time    -- time of the key frame
             in_val_list   -- list of values to store - these value match the indices in ctrl_list
         """
+        if self.key_buffer is not None:
+            # Write a whole row into the preallocated buffer.
+            if self.num_stored_keyframes == len(self.key_buffer):
+                self.grow_keyframe_buffer(self.num_stored_keyframes + 1)
+            self.key_frame_times[self.num_stored_keyframes] = frame_time
+            self.key_buffer[self.num_stored_keyframes] = in_val_list
+            self.num_stored_keyframes += 1
+            if 0 < self.flush_interval <= self.num_stored_keyframes:
+                self.flush_stored_keyframes()
+            return
+
         idx = 0
         self.attr_times.append(om.MTime(frame_time, om.MTime.uiUnit()))
         for in_val in in_val_list:
             self.attr_values[idx].append(in_val)
             idx += 1
 
+    def get_stored_keyframes(self, start_index=0):
+        """Get the key frames stored with store_keyframes, in streaming mode the ones that are not flushed yet.
+        Parameters:
+            start_index (int) -- Index of the first stored key frame to get, to skip the ones read before
+        Return:
+            Vector (ndarray) of frame times and matrix (frames x controllers) of stored values
+        """
+        if self.key_buffer is not None:
+            return (self.key_frame_times[start_index:self.num_stored_keyframes].copy(),
+                    self.key_buffer[start_index:self.num_stored_keyframes].astype(np.float64))
+
+        indices = range(start_index, len(self.attr_times))
+        frame_times = np.array([self.attr_times[i].value for i in indices], dtype=np.float64)
+        values = np.array([[attr_values[i] for i in indices] for attr_values in self.attr_values], dtype=np.float64)
+        return frame_times, values.reshape(len(self.attr_values), len(frame_times)).T
+
     @staticmethod
     def om_set_keyframes(ctrl_name, attr_name, key_times, key_values):
         """"Set key frames at once using the open maya api
@@ -176,9 +319,55 @@ class KeyFrameAnimation():
             omanim.MFnAnimCurve.kTangentStep,
             True)
 
+    def flush_stored_keyframes(self):
+        """Key the frames in the buffer on the curves and empty the buffer.
+        The plugs and curves are resolved once, on the first flush.
+        """
+        if self.num_stored_keyframes == 0:
+            return
+        if self.curve_writer is None:
+            self.curve_writer = AnimCurveWriter(self.ctrl_list, self.attr_list)
+        # The writer converts the values to a radians copy and a transposed copy, the write memory is measured.
+        _, write_memory = measure_peak_memory(self.curve_writer.write, self.key_frame_times[:self.num_stored_keyframes],
+                                              self.key_buffer[:self.num_stored_keyframes])
+        if write_memory is not None:
+            self.peak_key_memory = max(self.peak_key_memory or 0, self.get_key_buffer_bytes() + write_memory)
+            if write_memory > self.peak_write_memory:
+                self.peak_write_memory = write_memory
+                self.peak_write_frames = self.num_stored_keyframes
+        self.num_flushed_keyframes += self.num_stored_keyframes
+        self.num_stored_keyframes = 0
+
+    def print_key_memory(self):
+        """Print the peak memory of the key frames: the key buffer plus the memory that tracemalloc measured while
+        writing the curves. Allocations inside Maya aren't traced. In streaming mode the memory of keying all frames
+        at the end is extrapolated from the largest measured flush.
+        """
+        num_frames = self.get_num_keyframes()
+        if self.key_buffer is None or num_frames == 0 or self.peak_key_memory is None:
+            return
+        if self.flush_interval <= 0:
+            print('[MLDeformer] Peak key frame memory {:.1f} MB, {:.1f} MB measured while writing the curves'.format(
+                self.peak_key_memory / 1048576.0, self.peak_write_memory / 1048576.0))
+            return
+        # Keying at the end holds a buffer of all frames and writes all of them at once.
+        row_bytes = self.key_buffer.itemsize * self.key_buffer.shape[1] + self.key_frame_times.itemsize
+        all_at_end_bytes = num_frames * (row_bytes + self.peak_write_memory / float(max(1, self.peak_write_frames)))
+        print('[MLDeformer] Peak key frame memory {:.1f} MB flushing every {} frames, keying all {} frames at the end '
+              'needs about {:.1f} MB, extrapolated from the measured flushes'.format(
+                  self.peak_key_memory / 1048576.0, self.flush_interval, num_frames, all_at_end_bytes / 1048576.0))
+
     def set_all_stored_keyframes(self):
         """"Set all key frames stored with store_keyframes.
         """
+        if self.key_buffer is not None:
+            # Write all curves at once, converting to Maya arrays once per curve.
+            self.flush_stored_keyframes()
+            if self.curve_writer is not None:
+                self.curve_writer.print_timings()
+            self.print_key_memory()
+            return
+
         idx = 0
         for ctrl_name in self.ctrl_list:
             attr_name = self.attr_list[idx]
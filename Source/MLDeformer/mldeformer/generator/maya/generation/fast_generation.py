@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module contains a context that puts the scene in a fast state for pose generation and exporting.
+Undo recording, auto keying and viewport refresh are turned off and restored afterwards,
+also when an exception is raised or the user cancels.
+"""
+
+import time
+
+import maya.cmds as cmds
+
+# Number of fast generation contexts that are currently entered, only the outermost one changes the scene state.
+_active_context_count = [0]
+
+
+class FastGenerationContext(object):
+    """Context manager that suspends undo recording, auto keying and viewport refresh.
+
+    An optional probe function, for example one that sets the rest pose, is timed with and without the viewport
+    suspended when entering. Undo recording and auto keying are off for both timings, so the probe leaves no undo
+    steps or keys in the scene, and the estimate only covers the viewport. Set num_operations to the number of
+    probe-equivalent operations that were performed inside the context, and the estimated time saved is reported
+    when leaving.
+    """
+
+    def __init__(self, label='Generation', probe=None, num_probe_iterations=10):
+        """ Initialize FastGenerationContext class.
+        Parameters:
+            label (str)                 -- Name of the work that is performed, used when reporting
+            probe (function)            -- Optional function without arguments, timed in both modes
+            num_probe_iterations (int)  -- Number of times the probe is called in every mode
+        """
+        self.label = label
+        self.probe = probe
+        self.num_probe_iterations = num_probe_iterations
+        self.num_operations = 0
+        self.normal_probe_time = None
+        self.fast_probe_time = None
+        self.start_time = 0.0
+        self.elapsed_time = 0.0
+        self.is_outermost = False
+        self.undo_state = True
+        self.auto_keyframe_state = False
+        self.refresh_suspended = False
+        self.viewport_paused = False
+
+    def time_probe(self):
+        start_time = time.time()
+        for _ in range(self.num_probe_iterations):
+            self.probe()
+        return (time.time() - start_time) / self.num_probe_iterations
+
+    def __enter__(self):
+        self.is_outermost = _active_context_count[0] == 0
+        if not self.is_outermost:
+            # The scene is already in the fast state.
+            _active_context_count[0] += 1
+            self.start_time = time.time()
+            return self
+
+        self.undo_state = cmds.undoInfo(query=True, stateWithoutFlush=True)
+        self.auto_keyframe_state = cmds.autoKeyframe(query=True, state=True)
+        _active_context_count[0] += 1
+        # A failure while entering restores the scene and the context count, since __exit__ isn't called then.
+        try:
+            cmds.undoInfo(stateWithoutFlush=False)
+            cmds.autoKeyframe(state=False)
+
+            if self.probe:
+                self.normal_probe_time = self.time_probe()
+
+            # There is no viewport to refresh in batch mode.
+            if not cmds.about(batch=True):
+                cmds.refresh(suspend=True)
+                self.refresh_suspended = True
+                if not cmds.ogs(query=True, pause=True):
+                    cmds.ogs(pause=True)  # Toggles the viewport 2.0 evaluation.
+                    self.viewport_paused = True
+
+            if self.probe:
+                self.fast_probe_time = self.time_probe()
+        except Exception:
+            _active_context_count[0] -= 1
+            self.restore_scene_state()
+            raise
+
+        self.start_time = time.time()
+        return self
+
+    def restore_scene_state(self):
+        """Restore the viewport, auto keying and undo recording, even when one of the restore steps fails."""
+        try:
+            if self.viewport_paused:
+                cmds.ogs(pause=True)
+                self.viewport_paused = False
+            if self.refresh_suspended:
+                cmds.refresh(suspend=False)
+                self.refresh_suspended = False
+        finally:
+            cmds.autoKeyframe(state=self.auto_keyframe_state)
+            cmds.undoInfo(stateWithoutFlush=self.undo_state)
+
+    def __exit__(self, exception_type, exception_value, exception_traceback):
+        self.elapsed_time = time.time() - self.start_time
+        _active_context_count[0] -= 1
+        if not self.is_outermost:
+            return False
+
+        self.restore_scene_state()
+        self.report()
+        return False
+
+    def get_estimated_time_saved(self):
+        """Estimate how much time the fast mode saved, based on the probe timings.
+        Return:
+            Seconds saved, or None when no probe was timed
+        """
+        if self.normal_probe_time is None or self.fast_probe_time is None:
+            return None
+        return (self.normal_probe_time - self.fast_probe_time) * self.num_operations
+
+    def report(self):
+        """Print the elapsed time and the estimated time saved versus the normal mode."""
+        print('[MLDeformer] {} took {:.2f} seconds in fast generation mode'.format(self.label, self.elapsed_time))
+        time_saved = self.get_estimated_time_saved()
+        if time_saved is not None and self.num_operations > 0:
+            print('[MLDeformer] Estimated time saved by suspending the viewport: {:.2f} seconds '
+                  '({:.3f} ms normal vs {:.3f} ms fast per pose, {} poses)'.format(
+                      time_saved, 1000.0 * self.normal_probe_time, 1000.0 * self.fast_probe_time,
+                      self.num_operations))
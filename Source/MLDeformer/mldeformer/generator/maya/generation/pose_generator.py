@@ -5,128 +5,394 @@ This script generates random poses from a complex and simple rig.
 So both rigs must be in the scene.
 """
 
+import os
+
 import maya.cmds as cmds
-import random
+import numpy as np
+import time
 from ..rig import character_rig
 from ..animation.key_frame_animation import KeyFrameAnimation
+from ..animation.anim_curve_reader import AnimCurveReader
+from ...sampling.pose_sampler import PoseSampler, DEFAULT_BATCH_SIZE, get_group_indices
+from ...sampling.random_stream import SEED_MODE_PER_FRAME
+from ...sampling.pose_constraints import PoseConstraints
+from ...sampling.pose_mirror import PoseMirror
+from ...sampling.pose_prior import get_pose_prior, load_pose_matrix, PRIOR_SOURCE_SCENE, PRIOR_SOURCE_FILE
+from ...sampling.distributions import ControllerDistributions, DISTRIBUTION_UNIFORM
+from ...sampling.rotation_sampling import RotationGroupSampler, ROTATION_SAMPLING_ORIENTATION
+from ...sampling.pose_repair import PoseRepairer, REPAIR_MODE_BISECT
+from ...sampling.coverage import CoverageAccumulator, normalize_poses
+from ...sampling.coverage_statistics import CoverageStatistics, COVERAGE_STATISTICS_FILE_NAME, \
+    COVERAGE_HISTOGRAMS_FILE_NAME
+from ...sampling.group_statistics import GroupRejectionStatistics, GROUP_STATISTICS_FILE_NAME
+from ...sampling.pose_index import PoseDistanceIndex
+from ...sampling.early_stopping import CoverageStoppingCriterion, STOPPING_CURVE_FILE_NAME
+from ...sampling.checkpoint import CheckpointWriter, GenerationCheckpoint, get_settings_hash, remove_checkpoint, \
+    CHECKPOINT_FILE_NAME
+from .fast_generation import FastGenerationContext
+from mldeformer.ui.maya.joint_limit import JointLimit
+
 
+def generate_samples_from_gui(event_handler, resume=False):
+    """ Generate random poses using user-defined parameters from gui
+    Params:
+        event_handler (MLDeformerEventHandler) -- The event handler used to get the config and modify status bar.
+        resume (bool)                          -- Continue the interrupted generation from its last checkpoint
+
+    Return:
+        Whether samples were generated. If not, a message will also be returned.
+    """
+    deformer_config = event_handler.generator_config
 
-def random_uniform_list(low, high, size=None):
-    if size is None:
-        return random.uniform(low, high)
-    uniform_list = [random.uniform(low, high) for i in range(size)]
-    return uniform_list 
+    # Start frame.
+    start_frame = deformer_config.start_frame
+    # End frame.
+    end_frame = start_frame + deformer_config.num_samples
 
+    # In the adaptive mode the number of samples is the maximum, generation stops once the coverage converges.
+    stopping_criterion = None
+    if deformer_config.adaptive_num_samples:
+        stopping_criterion = CoverageStoppingCriterion(deformer_config.adaptive_chunk_size,
+                                                       deformer_config.adaptive_min_improvement)
 
-def sample_random_controller_values(target_controller_attributes, target_groups, target_prob, 
-                                    max_values=[1],min_values=[0], def_values=[0], max_min_prob=0.01):
+    statistics_folder = os.path.dirname(os.path.abspath(deformer_config.output_fbx_file))
+    checkpoint_file = None
+    if resume or deformer_config.checkpoint_interval > 0:
+        checkpoint_file = os.path.join(statistics_folder, CHECKPOINT_FILE_NAME)
+    generated, message, key_frame_anim = generate_poses(event_handler, start_frame, end_frame, statistics_folder,
+                                                        stopping_criterion, checkpoint_file, resume,
+                                                        deformer_config.keyframe_flush_interval)
+    if not generated:
+        return False, message
+
+    if stopping_criterion is not None and stopping_criterion.stopped:
+        deformer_config.num_samples = key_frame_anim.get_num_keyframes()
+        cmds.playbackOptions(minTime=0, maxTime=start_frame + deformer_config.num_samples)
+        print('[MLDeformer] Coverage converged, the number of samples is set to {}'.format(
+            deformer_config.num_samples))
+
+    with FastGenerationContext('Keying poses'):
+        key_frame_anim.set_all_stored_keyframes()
+
+    # The checkpoint is kept until the poses are keyed, so a crash while keying can still be resumed from the last
+    # saved frame. A cancelled generation keeps it to be resumed later.
+    completed = key_frame_anim.get_num_keyframes() == end_frame - start_frame or (
+        stopping_criterion is not None and stopping_criterion.stopped)
+    if completed:
+        remove_checkpoint(checkpoint_file)
+
+    return True, ''
+
+
+def get_joint_limit(node):
+    """ Get the rotation limits of a joint.
+    Params:
+        node (string) -- Name of the node
 
-    """"Sample random controller values with a certain probability in a range defined by user.
-    Parameters:
-        target_controller_attributes (list (string))    -- Names of controller attributes
-        target_groups (dict())   -- {group_name -> [index list]} where the indices ref target_controller_attributes
-        target_prob (float)      -- Probability of rejecting a target controller
-        max_values (list(float)) -- Maximum allowed value assigned to a controller
-        min_values (list(float)) -- Minimum allowed value assigned to a controller
-        def_values (list(float)) -- Default value assigned to a controller a.k.a rest value
-        max_min_prob (float)     --  Probability of a target controller being set to a max or minimum value
     Return:
-        Vector of random controller values
+        JointLimit of the joint, or None when the node isn't a joint
     """
-    num_controllers = len(target_controller_attributes)
-    num_groups = len(target_groups)
-    
-    group_names = list()
-    for i in target_groups.keys():
-        group_names.append(i)
-        
-    max_values_size = len(max_values)
-    min_values_size = len(min_values)
-    def_values_size = len(def_values)
-    max_minus_min = [a_i - b_i for a_i, b_i in zip(max_values, min_values)]
-
-    assert max_values_size == min_values_size, 'vector size mismatch len(max_values):{} != len(min_values):{}'.format(
-        max_values_size, min_values_size)
-    assert def_values_size == max_values_size, 'vector size mismatch len(def_values):{} != len(max_values):{}'.format(
-        def_values_size, max_values_size)
-
-    # Perform probability test for selecting controller groups.  Produces a list like [0.341, 0.56, 0.02, 0.49] with 
-    # length equal to num_groups
-    
-    while True:
-        prob_test_list = random_uniform_list(0.0, 1.0, num_groups)
-        #  Return a boolean list of groups that are going to be sampled
-        prob_test_grp = [i < target_prob for i in prob_test_list]
-        
-        #  Keep resampling until at least one group has a value
-        if True in prob_test_grp or num_groups == 0: 
-            break
-    
-    # each group has a list of indices in the controller list. 
-    controller_is_default = [True for i in range(num_controllers)]
-    controller_is_max = [False for i in range(num_controllers)]
-    controller_is_min = [False for i in range(num_controllers)]
-
-    for idx, sample_group in enumerate(group_names):
-        if prob_test_grp[idx]:
-            for control_idx in target_groups[sample_group]:
-                controller_is_default[control_idx] = False
-                if random.uniform(0.0, 1.0) < max_min_prob:
-                    if random.uniform(0.0, 1.0) < 0.5:
-                        controller_is_max[control_idx] = True
-                    else:
-                        controller_is_min[control_idx] = True
-                    
-    if def_values_size == 1:
-        # Create a random vector of controller activations using single user-defined range
-        rnd_attr_values = random_uniform_list(min_values[0], max_values[0], num_controllers)
-                
-        # Assign default values to controller that do not pass the probability test.
-        for i, use_default in enumerate(controller_is_default):
-            if use_default:
-                rnd_attr_values[i] = def_values[0]
+    if cmds.objectType(node) != 'joint':
+        return None
+    query_results = cmds.joint(node, query=True, limitSwitchX=True, limitSwitchY=True, limitSwitchZ=True,
+                               limitX=True, limitY=True, limitZ=True)
+    limit_info = JointLimit()
+    (limit_info.min_rot_limit_x, limit_info.max_rot_limit_x, limit_info.min_rot_limit_y, limit_info.max_rot_limit_y,
+     limit_info.min_rot_limit_z, limit_info.max_rot_limit_z, limit_info.has_min_rot_limit_x,
+     limit_info.has_max_rot_limit_x, limit_info.has_min_rot_limit_y, limit_info.has_max_rot_limit_y,
+     limit_info.has_min_rot_limit_z, limit_info.has_max_rot_limit_z) = query_results[:12]
+    return limit_info
+
+
+def get_rotation_limits(node, columns, max_values, min_values):
+    """ Get the x, y and z angle range of a joint, the parameter ranges narrowed by the enabled joint limits.
+    Params:
+        node (string)            -- Name of the node that holds the rotation channels
+        columns (list(int))      -- Controller indices of the x, y and z rotation channels
+        max_values (list(float)) -- Maximum value per controller
+        min_values (list(float)) -- Minimum value per controller
+
+    Return:
+        The minimum and maximum x, y and z angles
+    """
+    rotation_min = [min_values[column] for column in columns]
+    rotation_max = [max_values[column] for column in columns]
+    limit_info = get_joint_limit(node)
+    if limit_info is None:
+        return rotation_min, rotation_max
+    limits = ((limit_info.has_min_rot_limit_x, limit_info.min_rot_limit_x,
+               limit_info.has_max_rot_limit_x, limit_info.max_rot_limit_x),
+              (limit_info.has_min_rot_limit_y, limit_info.min_rot_limit_y,
+               limit_info.has_max_rot_limit_y, limit_info.max_rot_limit_y),
+              (limit_info.has_min_rot_limit_z, limit_info.min_rot_limit_z,
+               limit_info.has_max_rot_limit_z, limit_info.max_rot_limit_z))
+    for axis, (has_min_limit, min_limit, has_max_limit, max_limit) in enumerate(limits):
+        if has_min_limit:
+            rotation_min[axis] = max(rotation_min[axis], min_limit)
+        if has_max_limit:
+            rotation_max[axis] = min(rotation_max[axis], max_limit)
+        # Keep a valid range when the parameter range lies outside of the joint limits.
+        rotation_max[axis] = max(rotation_max[axis], rotation_min[axis])
+    return rotation_min, rotation_max
+
+
+def get_rotation_group_samplers(target_groups, controller_attributes, max_values, min_values,
+                                distribution_types=None):
+    """ Create orientation samplers for the groups that hold the rotateX, rotateY and rotateZ channels of a node.
+    The orientations are drawn within the parameter ranges, narrowed by the joint limits that are enabled on the
+    joint. The samplers replace the max/min snapping and the distributions of their channels.
+    Params:
+        target_groups (dict())               -- {group_name -> [index list]} where the indices ref the attributes
+        controller_attributes (list(string)) -- Names of the controller attributes, as node.attribute
+        max_values (list(float))             -- Maximum value per controller
+        min_values (list(float))             -- Minimum value per controller
+        distribution_types (list(int))       -- Distribution per controller, a warning is printed for rotation
+                                                channels that aren't uniform
+
+    Return:
+        List of RotationGroupSampler
+    """
+    degrees = cmds.currentUnit(query=True, angle=True) != 'rad'
+    samplers = []
+    for group_name, controller_indices in target_groups.items():
+        if len(controller_indices) != 3:
+            continue
+        channels = {}
+        nodes = set()
+        for index in controller_indices:
+            node, attr = controller_attributes[index].rsplit('.', 1)
+            nodes.add(node)
+            channels[attr] = index
+        if len(nodes) != 1 or not all(attr in channels for attr in ('rotateX', 'rotateY', 'rotateZ')):
+            continue
+        node = nodes.pop()
+        if not cmds.attributeQuery('rotateOrder', node=node, exists=True):
+            continue
+        columns = [channels['rotateX'], channels['rotateY'], channels['rotateZ']]
+        if distribution_types is not None and any(distribution_types[column] != DISTRIBUTION_UNIFORM
+                                                  for column in columns):
+            print('[MLDeformer] Warning: The distributions of the rotation channels of group "{}" are ignored, '
+                  'its orientations are sampled uniformly'.format(group_name))
+        rotation_min, rotation_max = get_rotation_limits(node, columns, max_values, min_values)
+        samplers.append(RotationGroupSampler(columns, cmds.getAttr(node + '.rotateOrder'), rotation_min, rotation_max,
+                                             degrees))
+    return samplers
+
+
+def create_pose_prior(event_handler, target_controller_attributes, target_groups, def_values):
+    """ Fit the pose prior on the animation configured as prior source, or load it from the cache.
+    Params:
+        event_handler (MLDeformerEventHandler) -- The event handler used to get the config and the cache folder
+        target_controller_attributes (list(string)) -- Names of the controller attributes, as node.attribute
+        target_groups (dict())                 -- {group_name -> [index list]} where the indices ref the attributes
+        def_values (list(float))               -- Default value per controller
+
+    Return:
+        The PosePrior, or None when there is no animation to fit it on
+    """
+    deformer_config = event_handler.generator_config
+    if deformer_config.prior_source == PRIOR_SOURCE_FILE:
+        if not os.path.exists(deformer_config.prior_file):
+            print('[MLDeformer] Pose prior file {} not found'.format(deformer_config.prior_file))
+            return None
+        poses = load_pose_matrix(deformer_config.prior_file, target_controller_attributes)
+    elif deformer_config.prior_source == PRIOR_SOURCE_SCENE:
+        ctrl_list, attr_list = zip(*[attribute.rsplit('.', 1) for attribute in target_controller_attributes])
+        reader = AnimCurveReader(ctrl_list, attr_list)
+        start_frame = deformer_config.prior_start_frame
+        end_frame = deformer_config.prior_end_frame
+        if end_frame < start_frame:
+            key_range = reader.get_key_range()
+            if key_range is None:
+                print('[MLDeformer] No keyed animation found for the pose prior')
+                return None
+            start_frame, end_frame = int(np.floor(key_range[0])), int(np.ceil(key_range[1]))
+        poses = reader.read(np.arange(start_frame, end_frame + 1))
     else:
-        assert num_controllers == def_values_size, 'vector size mismatch size:{} != len(def_values):{}'.format(
-            num_controllers, def_values_size)
-        # Create a random vector of controller activations using multiple user-defined range
-        list_prod = [a_i * b_i for a_i, b_i in zip(max_minus_min, random_uniform_list(0.0, 1.0, num_controllers))]
-        rnd_attr_values = [a_i + b_i for a_i, b_i in zip(list_prod, min_values)]
-        # Assign default values to controller that do not pass the probability test.
-        for i, use_default in enumerate(controller_is_default):
-            if use_default:
-                rnd_attr_values[i] = def_values[i]
-        for i, use_max in enumerate(controller_is_max):
-            if use_max:
-                rnd_attr_values[i] = max_values[i]
-        for i, use_min in enumerate(controller_is_min):
-            if use_min:
-                rnd_attr_values[i] = min_values[i]
-    return rnd_attr_values
-
-
-def generate_samples_from_gui(event_handler):
-    """ Generate random poses using user-defined parameters from gui
+        return None
+
+    cache_folder = os.path.join(event_handler.rig_deformer_path, 'PosePriors')
+    return get_pose_prior(cache_folder, poses, target_controller_attributes,
+                          get_group_indices(target_groups, len(target_controller_attributes)), len(target_groups),
+                          np.asarray(def_values, dtype=np.float64), deformer_config.prior_num_components,
+                          deformer_config.prior_ratio)
+
+
+# Number of frames between updates of the adapted group probabilities.
+GROUP_PROBABILITY_UPDATE_INTERVAL = 100
+
+
+def record_pose_tests(group_statistics, group_active, rejected):
+    """ Record pose test results in the group rejection statistics, when they are tracked.
+    Params:
+        group_statistics (GroupRejectionStatistics) -- The statistics, or None
+        group_active (ndarray)                      -- Boolean matrix (num_poses x groups) of the groups the
+                                                       sampler activated in the tested poses
+        rejected (ndarray)                          -- Boolean vector of the poses that failed the test
+    """
+    if group_statistics is None:
+        return
+    for row in range(group_active.shape[0]):
+        group_statistics.record(group_active[row], rejected[row])
+
+
+def get_distinct_pose_mask(distance_index, pose_sampler, poses):
+    """ Get the poses that are at least the minimum distance away from all accepted poses.
+    Params:
+        distance_index (PoseDistanceIndex) -- Index of the accepted poses, or None to accept every pose
+        pose_sampler (PoseSampler)         -- The sampler that drew the poses, its ranges normalize the poses
+        poses (ndarray)                    -- Matrix (num_poses x controllers) of candidate poses
+    Return:
+        Boolean vector of the distinct poses
+    """
+    poses = np.atleast_2d(poses)
+    if distance_index is None:
+        return np.ones(poses.shape[0], dtype=bool)
+    unit_poses = normalize_poses(poses, pose_sampler.min_values, pose_sampler.max_values)
+    return distance_index.are_far_enough(unit_poses)
+
+
+def add_accepted_pose(distance_index, pose_sampler, pose):
+    if distance_index is not None:
+        distance_index.add(normalize_poses(pose, pose_sampler.min_values, pose_sampler.max_values)[0])
+
+
+def find_valid_pose_batched(pose_sampler, frame, valid_pose_test, ctrl_list, attr_list, num_attempts, batch_size,
+                            scratch_start_frame, repairer=None, group_statistics=None, distance_index=None):
+    """ Draw the candidate poses of a frame in batches and return the first valid one.
+    Params:
+        pose_sampler (PoseSampler)          -- The sampler that draws the candidates
+        frame (int)                         -- The frame to find a pose for
+        valid_pose_test (RayMeshPoseTest)   -- Pose test that supports validate_batch
+        num_attempts (int)                  -- Maximum number of candidates to test
+        batch_size (int)                    -- Number of candidates keyed and tested together
+        scratch_start_frame (int)           -- First frame to key the candidates at
+        repairer (PoseRepairer)             -- Repairs the first tested candidate when its batch has no valid pose
+        group_statistics (GroupRejectionStatistics) -- Records the test results of the candidates, if given
+        distance_index (PoseDistanceIndex)  -- Candidates too close to an accepted pose are skipped, if given
+
+    Return:
+        The pose, the number of candidates drawn, whether the pose is valid and the number of candidates
+        skipped for being too close to an accepted pose.
+        When no candidate is valid, the last candidate is returned.
+    """
+    attempt = 0
+    num_too_close = 0
+    candidates = None
+    repair_attempted = False
+    while attempt < num_attempts:
+        num_candidates = min(batch_size, num_attempts - attempt)
+        candidates, candidate_groups = pose_sampler.pose_candidates(frame, attempt, num_candidates)
+        tested_indices = np.arange(num_candidates)
+        distinct = get_distinct_pose_mask(distance_index, pose_sampler, candidates)
+        # The last batch is tested in full when none of its candidates are distinct, a frame always gets a pose.
+        if attempt + num_candidates < num_attempts or np.any(distinct):
+            num_too_close += num_candidates - np.count_nonzero(distinct)
+            if not np.any(distinct):
+                attempt += num_candidates
+                continue
+            tested_indices = np.nonzero(distinct)[0]
+            candidates = candidates[tested_indices]
+            candidate_groups = candidate_groups[tested_indices]
+        valid = np.nonzero(valid_pose_test.validate_batch(candidates, ctrl_list, attr_list, scratch_start_frame))[0]
+        # Candidates after the first valid one are not tested.
+        num_tested = valid[0] + 1 if valid.size > 0 else len(candidates)
+        rejected = np.ones(num_tested, dtype=bool)
+        rejected[-1] = valid.size == 0
+        record_pose_tests(group_statistics, candidate_groups[:num_tested], rejected)
+        if valid.size > 0:
+            return candidates[valid[0]], attempt + tested_indices[valid[0]] + 1, True, num_too_close
+        # Only the first candidate that reached the pose test is repaired, candidates that were too close don't count.
+        if repairer is not None and not repair_attempted:
+            repair_attempted = True
+            # The repair candidates are keyed at the scratch frame as well, a setAttr would be overridden by the
+            # scratch keys of the batch. Candidates too close to an accepted pose are invalid.
+            repaired_pose = repairer.repair(candidates[0], lambda values: get_distinct_pose_mask(
+                distance_index, pose_sampler, values)[0] and valid_pose_test.validate_batch(
+                values, ctrl_list, attr_list, scratch_start_frame)[0])
+            if repaired_pose is not None:
+                return repaired_pose, attempt + num_candidates, True, num_too_close
+        attempt += num_candidates
+    return candidates[-1], attempt, False, num_too_close
+
+
+# Config members that don't change the generated poses, a checkpoint can be resumed when only they changed.
+CHECKPOINT_IGNORED_SETTINGS = ('checkpoint_interval', 'keyframe_flush_interval', 'output_fbx_file', 'output_abc_file',
+                               'save_target_alembic', 'save_target_fbx', 'mesh_mappings')
+
+
+def get_checkpoint_settings_hash(deformer_config, target_controller_attributes, start_frame, end_frame):
+    """ Get the hash of everything in the config that decides the generated poses.
+    Changes to the rig itself are not detected.
+    """
+    settings = dict((name, value) for name, value in deformer_config.__dict__.items()
+                    if name not in CHECKPOINT_IGNORED_SETTINGS)
+    settings['controller_attributes'] = target_controller_attributes
+    settings['frame_range'] = [start_frame, end_frame]
+    return get_settings_hash(settings)
+
+
+# Counters of the pose repairer that are continued on resume.
+REPAIRER_COUNTERS = ('num_repaired', 'num_failed', 'num_tests', 'blend_factor_sum')
+
+
+def save_generation_checkpoint(checkpoint_writer, settings_hash, key_frame_anim, next_frame, pose_sampler,
+                               group_statistics, stopping_criterion, repairer, counters):
+    """ Save the poses accepted since the previous checkpoint and the state that decides the next poses.
+    Params:
+        checkpoint_writer (CheckpointWriter)        -- Writes the checkpoint files
+        settings_hash (str)                         -- Hash of the generation settings
+        key_frame_anim (KeyFrameAnimation)          -- Stores the accepted poses
+        next_frame (int)                            -- First frame that is not generated yet
+        pose_sampler (PoseSampler)                  -- The sampler that draws the poses
+        group_statistics (GroupRejectionStatistics) -- The rejection statistics, or None
+        stopping_criterion (CoverageStoppingCriterion) -- The stopping criterion, or None
+        repairer (PoseRepairer)                     -- The pose repairer, or None
+        counters (dict)                             -- Pose counters of the generation loop
+    """
+    frame_times, poses = key_frame_anim.get_stored_keyframes(checkpoint_writer.num_saved_poses)
+    sampler_state, arrays = pose_sampler.get_state()
+    state = {'sampler': sampler_state, 'counters': counters}
+    if group_statistics is not None:
+        state['group_statistics'] = group_statistics.get_state()
+    if stopping_criterion is not None:
+        state['stopping_criterion'] = stopping_criterion.to_json_data()
+    if repairer is not None:
+        state['repairer'] = dict((name, getattr(repairer, name)) for name in REPAIRER_COUNTERS)
+    checkpoint_writer.save(settings_hash, frame_times, poses, next_frame, state, arrays)
+
+
+def generate_poses(event_handler, start_frame, end_frame, statistics_folder=None, stopping_criterion=None,
+                   checkpoint_file=None, resume=False, flush_interval=0):
+    """ Generate random poses for a frame range, without keying them yet.
     Params:
         event_handler (MLDeformerEventHandler) -- The event handler used to get the config and modify status bar.
+        start_frame (int)                      -- First frame to generate
+        end_frame (int)                        -- Frame after the last frame to generate
+        statistics_folder (str)                -- Folder to write the generation statistics to, None to skip them
+        stopping_criterion (CoverageStoppingCriterion) -- Stops the generation before the end frame, if given
+        checkpoint_file (str)                  -- File the generation state is saved to every checkpoint interval
+                                                  and when cancelled, None to skip checkpoints
+        resume (bool)                          -- Continue from the checkpoint file, which gives exactly the poses
+                                                  of an uninterrupted generation with the same settings
+        flush_interval (int)                   -- Key the poses on the curves every flush_interval frames during
+                                                  the generation, 0 to keep all poses in memory until they are keyed
 
     Return:
-        Whether samples were generated. If not, a message will also be returned.
+        Whether poses were generated, a message when they were not and the KeyFrameAnimation storing the poses.
+        Call set_all_stored_keyframes on the KeyFrameAnimation to key the poses in the scene, or the poses
+        that are not flushed yet.
     """
     
     valid_pose_test = event_handler.get_pose_valid_callback()
+    event_handler.coverage_statistics = None
     
     deformer_config = event_handler.generator_config
 
     event_handler.start_progress_bar('Initializing...')
     if event_handler.is_progress_bar_cancelled():
-        return False, ''
+        return False, '', None
 
-    # Set random seed
-    random.seed(deformer_config.random_seed)
-    # Start frame.
-    start_frame = deformer_config.start_frame
-    # End frame.
-    end_frame = start_frame + deformer_config.num_samples
     # Re-adjust timeline before generating keyposes.
     cmds.playbackOptions(minTime=0, maxTime=end_frame)
 
@@ -138,27 +404,30 @@ def generate_samples_from_gui(event_handler):
     def_attr_values = []
     max_ctrl_attr_values = []
     min_ctrl_attr_values = []
+    distribution_types = []
+    distribution_params = []
     group_names_dict = {} 
     for paramIndex, param in enumerate(deformer_config.parameters):
         if not event_handler.get_parameter_exists(paramIndex):
             continue
         if param.group_name not in group_names_dict:
             group_names_dict[param.group_name] = []
-        group_names_dict[param.group_name].append(paramIndex)
+        # Group indices reference the sampled controllers, which skip parameters missing from the scene.
+        group_names_dict[param.group_name].append(len(target_controller_attributes))
         target_controller_attributes.append(param.display_name)
         def_attr_values.append(param.default_value)
         max_ctrl_attr_values.append(param.max_value)
         min_ctrl_attr_values.append(param.min_value)
+        distribution_types.append(param.distribution)
+        distribution_params.append(param.distribution_params)
 
     num_controller_attributes = len(target_controller_attributes)
     if num_controller_attributes == 0:
-        return False, 'No parameters for sampling poses.'
+        return False, 'No parameters for sampling poses.', None
 
     # Limit values: Max and min values
     assert len(def_attr_values) == num_controller_attributes, 'attribute value-name size mismatch'
 
-    num_groups = len(group_names_dict)
-    
     # Evaluate simple rig with default weights to set mesh at rest pose
     if rig_state_attr:
         cmds.setAttr(rig_state_attr, 0)
@@ -167,62 +436,290 @@ def generate_samples_from_gui(event_handler):
 
     event_handler.set_progress_bar_value(20)
     if event_handler.is_progress_bar_cancelled():
-        return False, ''
+        return False, '', None
 
     event_handler.set_progress_bar_value(30)
     if event_handler.is_progress_bar_cancelled():
-        return False, ''
+        return False, '', None
 
     event_handler.set_progress_bar_value(50)
     if event_handler.is_progress_bar_cancelled():
-        return False, ''
+        return False, '', None
 
     event_handler.set_progress_bar_value(100)
     if event_handler.is_progress_bar_cancelled():
-        return False, ''
+        return False, '', None
+
+    # Sample the poses in batches, they are consumed one pose at a time below.
+    distributions = ControllerDistributions(distribution_types, distribution_params, min_ctrl_attr_values,
+                                            max_ctrl_attr_values, def_attr_values)
+    rotation_samplers = None
+    if deformer_config.rotation_sampling_mode == ROTATION_SAMPLING_ORIENTATION:
+        rotation_samplers = get_rotation_group_samplers(group_names_dict, target_controller_attributes,
+                                                        max_ctrl_attr_values, min_ctrl_attr_values, distribution_types)
+        print('[MLDeformer] Sampling {} joint rotations as uniform orientations'.format(len(rotation_samplers)))
+        if rotation_samplers and deformer_config.set_max_min_probability > 0.0:
+            print('[MLDeformer] Warning: Max/min snapping doesn\'t apply to the rotation channels that are sampled '
+                  'as orientations')
+    pose_prior = create_pose_prior(event_handler, target_controller_attributes, group_names_dict, def_attr_values)
+    constraints = PoseConstraints(deformer_config.constraints, target_controller_attributes, def_attr_values,
+                                  min_ctrl_attr_values, max_ctrl_attr_values)
+    pose_sampler = PoseSampler(
+        target_controller_attributes, group_names_dict, deformer_config.controller_probability,
+        max_ctrl_attr_values, min_ctrl_attr_values, def_attr_values, deformer_config.set_max_min_probability,
+        random_seed=deformer_config.random_seed, batch_size=max(1, min(DEFAULT_BATCH_SIZE, end_frame - start_frame)),
+        seed_mode=deformer_config.seed_mode, sampling_strategy=deformer_config.sampling_strategy,
+        distributions=distributions, rotation_samplers=rotation_samplers, pose_prior=pose_prior,
+        constraints=constraints)
 
     # Create instance of KeyFrameAnimation
     key_frame_anim = KeyFrameAnimation()
     key_frame_anim.set_controller_attributes(target_controller_attributes)
+    key_frame_anim.set_flush_interval(flush_interval)
+    key_frame_anim.allocate_keyframes(end_frame - start_frame)
     event_handler.start_progress_bar('Generating Poses...')
     total_poses_generated = 0
     total_poses_retried = 0
     invalid_poses = 0
-    for i in range(start_frame, end_frame):
-        # Create a random vector of controller activations, given a
-        # user-defined controller rejection probability.
-
-        valid_pose = False
-        retry_attempts = deformer_config.collision_retry_attempts + 1 
-        while not valid_pose and retry_attempts > 0:
-            rnd_attr_values = sample_random_controller_values(
-                target_controller_attributes, group_names_dict, deformer_config.controller_probability,
-                max_ctrl_attr_values, min_ctrl_attr_values, def_attr_values, deformer_config.set_max_min_probability)
-            valid_pose = True
-            total_poses_generated += 1
-            if valid_pose_test and not valid_pose_test(rnd_attr_values, key_frame_anim.ctrl_list, 
-                                                       key_frame_anim.attr_list):
-                valid_pose = False
-                retry_attempts -= 1
-                total_poses_retried += 1
-
-        if retry_attempts == 0:
-            invalid_poses += 1
-        # Set keyframe animation.
-        key_frame_anim.store_keyframes(i, rnd_attr_values)
-        # Update progress bar.
-        progress_percentage = int(((i - start_frame) / float(end_frame - start_frame)) * 100.0)
-        event_handler.set_progress_bar_value(progress_percentage)
-
-        # User cancelled.
-        if event_handler.is_progress_bar_cancelled():
-            break
+
+    # Candidates are validated in batches when the pose test supports it, keyed at frames after the generated range.
+    batch_size = deformer_config.collision_batch_size
+    validate_batches = batch_size > 1 and hasattr(valid_pose_test, 'validate_batch')
+    num_attempts = deformer_config.collision_retry_attempts + 1
+
+    # Colliding poses are shrunk toward the default pose before new poses are drawn.
+    repairer = None
+    if valid_pose_test and deformer_config.collision_repair_mode == REPAIR_MODE_BISECT:
+        repairer = PoseRepairer(pose_sampler.def_values, pose_sampler.group_indices, pose_sampler.num_groups,
+                                deformer_config.collision_repair_iterations, pose_sampler.get_unblendable_columns(),
+                                pose_sampler.constraints)
+    generation_start_time = time.time()
+
+    # Rejections are counted per group, optionally lowering the probability of groups that often collide.
+    group_statistics = None
+    if valid_pose_test:
+        group_statistics = GroupRejectionStatistics(
+            list(group_names_dict.keys()), deformer_config.controller_probability,
+            deformer_config.adaptive_probability_min, deformer_config.adaptive_probability_max)
+    adapt_group_probabilities = group_statistics is not None and deformer_config.adaptive_group_probability
+    # Adapted probabilities depend on the tests of earlier frames, which per-frame poses must not.
+    if adapt_group_probabilities and deformer_config.seed_mode == SEED_MODE_PER_FRAME:
+        print('[MLDeformer] Group probabilities are not adapted in the per-frame seed mode')
+        adapt_group_probabilities = False
+
+    # Candidates closer than the minimum distance to an accepted pose are redrawn, they add little training data.
+    distance_index = None
+    if deformer_config.min_pose_distance > 0.0:
+        distance_index = PoseDistanceIndex(num_controller_attributes, deformer_config.min_pose_distance,
+                                           random_seed=deformer_config.random_seed)
+    too_close_poses = 0
+
+    # Every second frame mirrors the pose of the frame before it, which is neither sampled nor tested.
+    pose_mirror = None
+    mirrored_poses = 0
+    if deformer_config.mirror_poses:
+        pose_mirror = PoseMirror(target_controller_attributes, pose_sampler.min_values, pose_sampler.max_values,
+                                 deformer_config.mirror_pairs, deformer_config.mirror_patterns,
+                                 deformer_config.mirror_negated_channels)
+        print('[MLDeformer] Mirroring poses with {} paired controllers'.format(pose_mirror.num_paired))
+
+    # Histograms, range limit hits and group co-occurrences of the stored poses.
+    coverage_statistics = CoverageStatistics(
+        target_controller_attributes, list(group_names_dict.keys()), pose_sampler.group_indices,
+        pose_sampler.min_values, pose_sampler.max_values, pose_sampler.def_values)
+    event_handler.coverage_statistics = coverage_statistics
+    # Occupied coverage bins of the stored poses, so the coverage is known without keeping the poses in memory.
+    coverage_accumulator = CoverageAccumulator(num_controller_attributes)
+
+    # Continue from the checkpoint, rebuilding everything that only depends on the accepted poses.
+    first_frame = start_frame
+    valid_pose = True
+    rnd_attr_values = None
+    settings_hash = get_checkpoint_settings_hash(deformer_config, target_controller_attributes, start_frame,
+                                                 end_frame)
+    if resume:
+        if not checkpoint_file or not os.path.exists(checkpoint_file):
+            return False, 'There is no checkpoint to resume the generation from.', None
+        checkpoint = GenerationCheckpoint.load_from_file(checkpoint_file)
+        if checkpoint.settings_hash != settings_hash:
+            return False, 'The checkpoint was saved with different settings or parameters.', None
+        key_frame_anim.store_keyframes_batch(checkpoint.frame_times, checkpoint.poses)
+        for pose in checkpoint.poses:
+            add_accepted_pose(distance_index, pose_sampler, pose)
+        coverage_statistics.add_poses(checkpoint.poses)
+        coverage_accumulator.add_poses(normalize_poses(checkpoint.poses, pose_sampler.min_values,
+                                                       pose_sampler.max_values))
+        pose_sampler.set_state(checkpoint.state['sampler'], checkpoint.arrays)
+        if group_statistics is not None:
+            group_statistics.set_state(checkpoint.state['group_statistics'])
+        if stopping_criterion is not None:
+            stopping_criterion.set_state(checkpoint.state['stopping_criterion'])
+        if repairer is not None:
+            for name in REPAIRER_COUNTERS:
+                setattr(repairer, name, checkpoint.state['repairer'][name])
+        counters = checkpoint.state['counters']
+        total_poses_generated = counters['total_poses_generated']
+        total_poses_retried = counters['total_poses_retried']
+        invalid_poses = counters['invalid_poses']
+        too_close_poses = counters['too_close_poses']
+        mirrored_poses = counters['mirrored_poses']
+        # The next frame may mirror the last accepted pose.
+        valid_pose = counters['last_pose_valid']
+        if len(checkpoint.poses) > 0:
+            rnd_attr_values = checkpoint.poses[-1]
+        first_frame = checkpoint.next_frame
+        print('[MLDeformer] Resuming the generation at frame {}'.format(first_frame))
+
+    checkpoint_interval = deformer_config.checkpoint_interval
+    # Checkpoints read the accepted poses from the stored key frames, which the streaming mode flushes.
+    save_checkpoints = checkpoint_file is not None and flush_interval <= 0
+    if checkpoint_file and flush_interval > 0:
+        print('[MLDeformer] Checkpoints are not saved while flushing key frames during the generation')
+    checkpoint_writer = None
+    if save_checkpoints:
+        if not resume:
+            # A checkpoint of an earlier generation can't be resumed once this one starts.
+            remove_checkpoint(checkpoint_file)
+        checkpoint_writer = CheckpointWriter(checkpoint_file, key_frame_anim.get_num_keyframes())
+
+    # Setting the rest pose is timed in the normal and the fast mode, to report the time saved per tested pose.
+    set_rest_pose = lambda: character_rig.set_controller_attributes(target_controller_attributes, def_attr_values)
+    with FastGenerationContext('Pose generation', probe=set_rest_pose if valid_pose_test else None) as fast_context:
+        try:
+            for i in range(first_frame, end_frame):
+                # Create a random vector of controller activations, given a
+                # user-defined controller rejection probability.
+
+                # The parity is taken from the configured start frame, so shards and resumed generations mirror the
+                # same frames as a full generation. The source frame is never outside of the range of a shard.
+                if pose_mirror is not None and (i - deformer_config.start_frame) % 2 == 1 and \
+                        rnd_attr_values is not None:
+                    # The mirror is as valid as the pose it mirrors.
+                    rnd_attr_values = pose_mirror.mirror(rnd_attr_values)
+                    mirrored_poses += 1
+                elif validate_batches:
+                    rnd_attr_values, num_tested, valid_pose, num_too_close = find_valid_pose_batched(
+                        pose_sampler, i, valid_pose_test, key_frame_anim.ctrl_list, key_frame_anim.attr_list,
+                        num_attempts, batch_size, end_frame + 1, repairer, group_statistics, distance_index)
+                    too_close_poses += num_too_close
+                    total_poses_generated += num_tested
+                    total_poses_retried += num_tested - 1 if valid_pose else num_tested
+                else:
+                    valid_pose = False
+                    retry_attempts = num_attempts
+                    repair_attempted = False
+                    while not valid_pose and retry_attempts > 0:
+                        retry = num_attempts - retry_attempts
+                        candidate_poses, candidate_groups = pose_sampler.pose_candidates(i, retry, 1)
+                        rnd_attr_values = candidate_poses[0]
+                        # The last attempt is kept even when it is too close, a frame always gets a pose.
+                        if retry_attempts > 1 and not get_distinct_pose_mask(distance_index, pose_sampler,
+                                                                             rnd_attr_values)[0]:
+                            retry_attempts -= 1
+                            too_close_poses += 1
+                            continue
+                        valid_pose = True
+                        total_poses_generated += 1
+                        if valid_pose_test and not valid_pose_test(rnd_attr_values, key_frame_anim.ctrl_list, 
+                                                                   key_frame_anim.attr_list):
+                            record_pose_tests(group_statistics, candidate_groups, [True])
+                            valid_pose = False
+                            retry_attempts -= 1
+                            total_poses_retried += 1
+                            # The first pose that reached the collision test is repaired, even when earlier
+                            # draws were too close to an accepted pose.
+                            if repairer is not None and not repair_attempted:
+                                repair_attempted = True
+                                repaired_pose = repairer.repair(rnd_attr_values, lambda values: get_distinct_pose_mask(
+                                    distance_index, pose_sampler, values)[0] and valid_pose_test(
+                                    values, key_frame_anim.ctrl_list, key_frame_anim.attr_list))
+                                if repaired_pose is not None:
+                                    rnd_attr_values = repaired_pose
+                                    valid_pose = True
+                        elif valid_pose_test:
+                            record_pose_tests(group_statistics, candidate_groups, [False])
+
+                if not valid_pose:
+                    invalid_poses += 1
+                add_accepted_pose(distance_index, pose_sampler, rnd_attr_values)
+                coverage_statistics.add_poses(rnd_attr_values)
+                coverage_accumulator.add_poses(normalize_poses(rnd_attr_values, pose_sampler.min_values,
+                                                               pose_sampler.max_values))
+                # Set keyframe animation.
+                key_frame_anim.store_keyframes(i, rnd_attr_values)
+
+                if adapt_group_probabilities and (i + 1 - start_frame) % GROUP_PROBABILITY_UPDATE_INTERVAL == 0:
+                    pose_sampler.set_group_probabilities(group_statistics.get_adapted_probabilities())
+                stopped = False
+                if stopping_criterion is not None and stopping_criterion.is_chunk_end(i + 1 - start_frame):
+                    stopped = stopping_criterion.update_coverage(coverage_accumulator.get_coverage(),
+                                                                 coverage_accumulator.num_poses)
+                # Update progress bar.
+                progress_percentage = int(((i - start_frame) / float(end_frame - start_frame)) * 100.0)
+                event_handler.set_progress_bar_value(progress_percentage)
+
+                # User cancelled.
+                cancelled = event_handler.is_progress_bar_cancelled()
+                # The last frame and the stopped generation are complete, so they need no checkpoint.
+                if save_checkpoints and not stopped and i + 1 < end_frame and (cancelled or (
+                        checkpoint_interval > 0 and (i + 1 - start_frame) % checkpoint_interval == 0)):
+                    counters = {
+                        'total_poses_generated': total_poses_generated,
+                        'total_poses_retried': total_poses_retried,
+                        'invalid_poses': invalid_poses,
+                        'too_close_poses': too_close_poses,
+                        'mirrored_poses': mirrored_poses,
+                        'last_pose_valid': bool(valid_pose)}
+                    save_generation_checkpoint(checkpoint_writer, settings_hash, key_frame_anim, i + 1, pose_sampler,
+                                               group_statistics, stopping_criterion, repairer, counters)
+                if stopped or cancelled:
+                    break
+        finally:
+            if validate_batches:
+                valid_pose_test.clear_scratch_keys()
+
+        fast_context.num_operations = total_poses_generated if valid_pose_test else 0
 
     if total_poses_retried > 0: 
         print("Generated {0} poses with {1} collisions".format(total_poses_generated, total_poses_retried))
     if invalid_poses: 
         print("WARNING: {0} poses are invalid".format(invalid_poses))
+    if constraints.num_fixed or constraints.num_filtered:
+        print('[MLDeformer] Constraints fixed {} and rejected {} sampled poses'.format(
+            constraints.num_fixed, constraints.num_filtered))
+    if mirrored_poses:
+        print('[MLDeformer] Mirrored {} poses without sampling or testing them'.format(mirrored_poses))
+    if too_close_poses:
+        print('[MLDeformer] Redrew {} poses closer than {} to an accepted pose'.format(
+            too_close_poses, deformer_config.min_pose_distance))
 
-    key_frame_anim.set_all_stored_keyframes()
+    coverage = coverage_accumulator.get_coverage()
+    print('[MLDeformer] Coverage of {} poses: {:.3f} (per controller {:.3f}, per controller pair {:.3f})'.format(
+        coverage_accumulator.num_poses, coverage['score'], coverage['marginal'], coverage['pairwise']))
 
-    return True, ''
+    if group_statistics is not None and group_statistics.num_poses_rejected > 0:
+        print('[MLDeformer] Groups with the most rejected poses:')
+        group_statistics.print_worst_groups()
+    if statistics_folder:
+        if not os.path.exists(statistics_folder):
+            os.makedirs(statistics_folder)
+        coverage_statistics.save_to_file(os.path.join(statistics_folder, COVERAGE_STATISTICS_FILE_NAME))
+        coverage_statistics.save_arrays_to_file(os.path.join(statistics_folder, COVERAGE_HISTOGRAMS_FILE_NAME))
+        if stopping_criterion is not None:
+            stopping_criterion.save_to_file(os.path.join(statistics_folder, STOPPING_CURVE_FILE_NAME))
+    if group_statistics is not None and statistics_folder:
+        group_statistics.save_to_file(os.path.join(statistics_folder, GROUP_STATISTICS_FILE_NAME),
+                                      pose_sampler.target_prob if adapt_group_probabilities else None)
+
+    if repairer is not None:
+        num_frames = key_frame_anim.get_num_keyframes()
+        num_fresh_valid = num_frames - invalid_poses - repairer.num_repaired
+        num_tests = total_poses_generated + repairer.num_tests
+        seconds_per_test = (time.time() - generation_start_time) / max(1, num_tests)
+        repairer.report(num_fresh_valid / float(max(1, total_poses_generated)), seconds_per_test, num_attempts)
+
+    collision_engine = getattr(valid_pose_test, 'collision_engine', None)
+    if collision_engine is not None:
+        collision_engine.print_statistics()
+
+    return True, '', key_frame_anim
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Worker script that generates a single shard of poses in a mayapy process.
+It is started by sharding.generate_samples_sharded, for example:
+
+    mayapy shard_worker.py --scene rig.ma --config shard.config --start-frame 0 --num-samples 1000 --output shard.npz
+
+Maya has to be initialized before the mldeformer package is imported, so this file is run as a script
+and not imported as part of the package.
+"""
+
+import argparse
+import sys
+import traceback
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Generate a shard of ML Deformer training poses.')
+    parser.add_argument('--scene', required=True, help='Maya scene to open')
+    parser.add_argument('--config', required=True, help='Generator config to load')
+    parser.add_argument('--start-frame', type=int, required=True, help='First frame of the shard')
+    parser.add_argument('--num-samples', type=int, required=True, help='Number of frames in the shard')
+    parser.add_argument('--output', required=True, help='File the poses of the shard are saved to')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    try:
+        from maya import cmds
+        from mldeformer.generator.maya.generation import sharding
+        from mldeformer.ui.maya.batch_event_handler import BatchEventHandler
+
+        cmds.file(args.scene, open=True, force=True)
+        event_handler = BatchEventHandler(log_prefix='[MLDeformer shard {}]'.format(args.start_frame))
+        event_handler.generator_config.load_from_file(args.config)
+        generated, message = sharding.generate_shard(event_handler, args.start_frame, args.num_samples, args.output)
+        if not generated:
+            print('[MLDeformer] Shard was not generated: {}'.format(message))
+            return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        maya.standalone.uninitialize()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
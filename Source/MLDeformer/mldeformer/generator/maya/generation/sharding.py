@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This script splits pose generation into shards that run in separate mayapy processes.
+Every shard generates a part of the frame range against the same scene and config,
+after which the poses of all shards are merged back in frame order and keyed in the scene.
+"""
+
+import copy
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import maya.cmds as cmds
+
+from mldeformer.ui.config import Config
+from . import pose_generator
+from .fast_generation import FastGenerationContext
+from ..animation.key_frame_animation import KeyFrameAnimation
+
+# The script that is executed by every mayapy worker.
+SHARD_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shard_worker.py')
+# The folder containing the mldeformer package, which the workers need on their python path.
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))))
+
+
+def get_history_dependent_settings(deformer_config):
+    """Get the enabled settings that make the pose of a frame depend on the poses of earlier frames.
+    A shard doesn't have the poses of the frames before it, so these can't be generated in shards.
+    Adaptive group probabilities are not listed, they are always disabled in the per-frame seed mode of the shards.
+    Neither are mirrored poses, the shards are split so every mirrored frame is in the shard of its source frame.
+    Parameters:
+        deformer_config (Config) -- The generator config
+    Return:
+        List of the names of the enabled settings
+    """
+    settings = []
+    if deformer_config.min_pose_distance > 0.0:
+        settings.append('min_pose_distance')
+    if deformer_config.adaptive_num_samples:
+        settings.append('adaptive_num_samples')
+    return settings
+
+
+def split_frame_range(start_frame, num_samples, num_shards, alignment=1):
+    """Split the frame range [start_frame, start_frame + num_samples) into contiguous shards.
+    Parameters:
+        start_frame (int) -- First frame
+        num_samples (int) -- Number of frames
+        num_shards (int)  -- Number of shards, reduced when there are fewer frames than shards
+        alignment (int)   -- Every shard except the last has a multiple of alignment frames
+    Return:
+        List of (shard start frame, shard number of frames) tuples
+    """
+    alignment = max(1, alignment)
+    num_units = (num_samples + alignment - 1) // alignment
+    num_shards = max(1, min(num_shards, num_units))
+    units_per_shard, remainder = divmod(num_units, num_shards)
+    end_frame = start_frame + num_samples
+    shards = []
+    shard_start = start_frame
+    for shard_index in range(num_shards):
+        shard_num_units = units_per_shard + (1 if shard_index < remainder else 0)
+        shard_num_samples = min(shard_num_units * alignment, end_frame - shard_start)
+        shards.append((shard_start, shard_num_samples))
+        shard_start += shard_num_samples
+    return shards
+
+
+def find_mayapy():
+    """Find the mayapy executable.
+    Return:
+        Path to mayapy, or None when it cannot be found
+    """
+    # In an interactive session mayapy lives next to the Maya executable.
+    folders = os.environ.get('PATH', '').split(os.pathsep) + [os.path.dirname(sys.executable)]
+    for folder in folders:
+        for name in ('mayapy', 'mayapy.exe'):
+            mayapy = os.path.join(folder.strip('"'), name)
+            if os.path.isfile(mayapy) and os.access(mayapy, os.X_OK):
+                return mayapy
+    return None
+
+
+def create_shard_command(mayapy, scene_file, config_file, start_frame, num_samples, output_file):
+    """Create the command line that generates a single shard.
+    Parameters:
+        mayapy (str)      -- Python executable of the worker, normally mayapy
+        scene_file (str)  -- Maya scene to open
+        config_file (str) -- Generator config to load
+        start_frame (int) -- First frame of the shard
+        num_samples (int) -- Number of frames in the shard
+        output_file (str) -- File the poses of the shard are saved to
+    Return:
+        Command as list of arguments
+    """
+    return [mayapy, SHARD_WORKER_SCRIPT,
+            '--scene', scene_file,
+            '--config', config_file,
+            '--start-frame', str(start_frame),
+            '--num-samples', str(num_samples),
+            '--output', output_file]
+
+
+def get_shard_environment():
+    """Get the environment of the worker processes, with the mldeformer package on the python path.
+    Return:
+        Environment dictionary
+    """
+    environment = dict(os.environ)
+    python_path = environment.get('PYTHONPATH')
+    environment['PYTHONPATH'] = PACKAGE_ROOT + os.pathsep + python_path if python_path else PACKAGE_ROOT
+    return environment
+
+
+def run_shard_commands(commands, log_files, num_processes=None, event_handler=None, poll_interval=0.5):
+    """Run the shard commands in a local process pool.
+    Parameters:
+        commands (list(list(str)))  -- Command per shard, see create_shard_command
+        log_files (list(str))       -- Log file per shard, receiving the output of the worker
+        num_processes (int)         -- Maximum number of simultaneous workers, the number of cpus when None
+        event_handler (EventHandler) -- Optional event handler used for progress and cancellation
+        poll_interval (float)       -- Seconds between checks of the running workers
+    Return:
+        Return code per shard, None for shards that did not finish because the user cancelled
+    """
+    if not num_processes:
+        num_processes = multiprocessing.cpu_count()
+
+    environment = get_shard_environment()
+    pending = list(range(len(commands)))
+    running = {}
+    logs = {}
+    return_codes = [None] * len(commands)
+    try:
+        while pending or running:
+            # Start new workers while there are free slots.
+            while pending and len(running) < num_processes:
+                shard_index = pending.pop(0)
+                logs[shard_index] = open(log_files[shard_index], 'wt')
+                running[shard_index] = subprocess.Popen(commands[shard_index], stdout=logs[shard_index],
+                                                        stderr=subprocess.STDOUT, env=environment)
+
+            for shard_index, process in list(running.items()):
+                return_code = process.poll()
+                if return_code is not None:
+                    return_codes[shard_index] = return_code
+                    del running[shard_index]
+                    logs.pop(shard_index).close()
+
+            if event_handler:
+                num_finished = len(commands) - len(pending) - len(running)
+                event_handler.set_progress_bar_value(int(num_finished * 100.0 / len(commands)))
+                if event_handler.is_progress_bar_cancelled():
+                    break
+
+            if running:
+                time.sleep(poll_interval)
+    finally:
+        # Stop the workers that are still running when the user cancelled or something went wrong.
+        for process in running.values():
+            process.kill()
+            process.wait()
+        for log in logs.values():
+            log.close()
+
+    return return_codes
+
+
+def save_shard(output_file, key_frame_anim):
+    """Save the poses stored in a KeyFrameAnimation.
+    Parameters:
+        output_file (str)                   -- File to save to (.npz)
+        key_frame_anim (KeyFrameAnimation)  -- Animation holding the stored key frames of the shard
+    """
+    frame_times, values = key_frame_anim.get_stored_keyframes()
+    controller_attributes = ['{}.{}'.format(ctrl, attr) for ctrl, attr in
+                             zip(key_frame_anim.ctrl_list, key_frame_anim.attr_list)]
+    with open(output_file, 'wb') as shard_file:
+        np.savez(shard_file, frame_times=frame_times, values=values,
+                 controller_attributes=np.array(controller_attributes))
+
+
+def load_shard(shard_file):
+    """Load the poses saved by save_shard.
+    Parameters:
+        shard_file (str) -- File to load
+    Return:
+        Vector of frame times, matrix (frames x controllers) of values and list of controller attributes
+    """
+    with np.load(shard_file) as data:
+        return data['frame_times'], data['values'], [str(name) for name in data['controller_attributes']]
+
+
+def merge_shards(shard_files):
+    """Merge the poses of several shards in frame order.
+    Parameters:
+        shard_files (list(str)) -- Files saved by save_shard
+    Return:
+        Vector of frame times, matrix (frames x controllers) of values and list of controller attributes
+    """
+    all_frame_times = []
+    all_values = []
+    controller_attributes = None
+    for shard_file in shard_files:
+        frame_times, values, shard_controller_attributes = load_shard(shard_file)
+        if controller_attributes is None:
+            controller_attributes = shard_controller_attributes
+        elif shard_controller_attributes != controller_attributes:
+            raise ValueError('Shard {} has different controller attributes than the other shards'.format(shard_file))
+        all_frame_times.append(frame_times)
+        all_values.append(values)
+
+    if controller_attributes is None:
+        return np.empty(0), np.empty((0, 0)), []
+
+    frame_times = np.concatenate(all_frame_times)
+    values = np.concatenate(all_values)
+    order = np.argsort(frame_times, kind='stable')
+    frame_times = frame_times[order]
+    if np.any(frame_times[1:] == frame_times[:-1]):
+        raise ValueError('Shards contain overlapping frames')
+    return frame_times, values[order], controller_attributes
+
+
+def generate_shard(event_handler, start_frame, num_samples, output_file):
+    """Generate the poses of one shard and save them. This runs inside the worker process.
+    Parameters:
+        event_handler (MLDeformerEventHandler) -- The event handler used to get the config
+        start_frame (int)                      -- First frame of the shard
+        num_samples (int)                      -- Number of frames in the shard
+        output_file (str)                      -- File the poses are saved to
+    Return:
+        Whether the shard was generated. If not, a message will also be returned.
+    """
+    generated, message, key_frame_anim = pose_generator.generate_poses(
+        event_handler, start_frame, start_frame + num_samples)
+    if not generated:
+        return False, message
+
+    save_shard(output_file, key_frame_anim)
+    return True, ''
+
+
+def generate_samples_sharded(event_handler, num_shards=None, mayapy=None, num_processes=None, work_folder=None):
+    """ Generate random poses in several mayapy processes and key the merged result in the current scene.
+    Every worker opens the saved scene file, so unsaved changes are not seen by the workers.
+    The shards always use the per-frame seed mode, which makes the result identical to a serial
+    generation in per-frame seed mode. Settings that depend on the poses of earlier frames are rejected,
+    see get_history_dependent_settings.
+    Params:
+        event_handler (MLDeformerEventHandler) -- The event handler used to get the config and modify status bar.
+        num_shards (int)    -- Number of shards, the number of cpus when None
+        mayapy (str)        -- Python executable of the workers, found automatically when None
+        num_processes (int) -- Maximum number of simultaneous workers, the number of cpus when None
+        work_folder (str)   -- Folder for the shard files and logs, a temporary folder when None
+
+    Return:
+        Whether samples were generated. If not, a message will also be returned.
+    """
+    deformer_config = event_handler.generator_config
+
+    history_dependent_settings = get_history_dependent_settings(deformer_config)
+    if history_dependent_settings:
+        return False, 'Shards cannot be generated with settings that depend on earlier frames, disable {}.'.format(
+            ', '.join(history_dependent_settings))
+
+    scene_file = cmds.file(query=True, sceneName=True)
+    if not scene_file:
+        return False, 'The scene has to be saved before generating poses in shards.'
+    if cmds.file(query=True, modified=True):
+        print('[MLDeformer] WARNING: The scene has unsaved changes, the shards use the saved scene {}'.format(
+            scene_file))
+
+    mayapy = mayapy or find_mayapy()
+    if not mayapy:
+        return False, 'Cannot find mayapy to run the shards with.'
+
+    if deformer_config.seed_mode != Config.SEED_MODE_PER_FRAME:
+        print('[MLDeformer] Generating shards with the per-frame seed mode')
+
+    remove_work_folder = work_folder is None
+    if remove_work_folder:
+        work_folder = tempfile.mkdtemp(prefix='mldeformer_shards_')
+    elif not os.path.isdir(work_folder):
+        os.makedirs(work_folder)
+
+    # The temporary folder is removed even when a shard fails or the user cancels.
+    try:
+        return generate_shards_in_folder(event_handler, scene_file, mayapy, num_shards, num_processes, work_folder)
+    finally:
+        if remove_work_folder:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+
+def generate_shards_in_folder(event_handler, scene_file, mayapy, num_shards, num_processes, work_folder):
+    """ Generate the shards with their files in the work folder and key the merged result.
+    See generate_samples_sharded for the parameters.
+    """
+    deformer_config = event_handler.generator_config
+
+    # Every shard uses the same config, in per-frame seed mode.
+    shard_config = copy.copy(deformer_config)
+    shard_config.seed_mode = Config.SEED_MODE_PER_FRAME
+    config_file = os.path.join(work_folder, 'ShardConfig.config')
+    shard_config.save_to_file(config_file)
+
+    # A mirrored frame follows its source frame, so both have to be in the same shard.
+    alignment = 2 if deformer_config.mirror_poses else 1
+    shards = split_frame_range(deformer_config.start_frame, deformer_config.num_samples,
+                               num_shards or multiprocessing.cpu_count(), alignment)
+    commands = []
+    log_files = []
+    shard_files = []
+    for shard_index, (shard_start, shard_num_samples) in enumerate(shards):
+        shard_file = os.path.join(work_folder, 'Shard{}.npz'.format(shard_index))
+        commands.append(create_shard_command(mayapy, scene_file, config_file, shard_start, shard_num_samples,
+                                             shard_file))
+        log_files.append(os.path.join(work_folder, 'Shard{}.log'.format(shard_index)))
+        shard_files.append(shard_file)
+
+    print('[MLDeformer] Generating {} frames in {} shards, working folder {}'.format(
+        deformer_config.num_samples, len(shards), work_folder))
+    event_handler.start_progress_bar('Generating Poses In {} Shards...'.format(len(shards)))
+    return_codes = run_shard_commands(commands, log_files, num_processes, event_handler)
+    if None in return_codes:
+        return False, ''
+
+    failed_logs = [log_file for return_code, log_file in zip(return_codes, log_files) if return_code != 0]
+    if failed_logs:
+        return False, 'Generating shards failed, see the logs: {}'.format(', '.join(failed_logs))
+
+    # Key the merged poses in the current scene.
+    event_handler.start_progress_bar('Merging Shards...')
+    frame_times, values, controller_attributes = merge_shards(shard_files)
+    key_frame_anim = KeyFrameAnimation()
+    key_frame_anim.set_controller_attributes(controller_attributes)
+    key_frame_anim.store_keyframes_batch(frame_times, values)
+
+    end_frame = deformer_config.start_frame + deformer_config.num_samples
+    cmds.playbackOptions(minTime=0, maxTime=end_frame)
+    with FastGenerationContext('Keying poses'):
+        key_frame_anim.set_all_stored_keyframes()
+
+    return True, ''
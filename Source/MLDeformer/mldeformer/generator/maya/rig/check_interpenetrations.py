@@ -1,6 +1,19 @@
+import numpy as np
+
 from maya import cmds
 from maya.api import OpenMaya
 
+from ...utils.mesh.bvh import TriangleBVH, DEFAULT_MAX_DISTANCE, transform_rays
+from ...utils.mesh import bounding_box
+from ...utils.mesh.polygon_topology import PolygonTopology
+from ..animation.anim_curve_writer import AnimCurveWriter
+
+INTERSECTION_ENGINE_MAYA = 0
+INTERSECTION_ENGINE_NUMPY = 1
+
+# Number of rays the NumPy engine casts before the first early exit check, doubled after every check.
+FIRST_RAY_CHUNK_SIZE = 32
+
 
 def get_dag_path(node, extend_to_shape=False):
     """
@@ -51,6 +64,10 @@ def get_bone_children(bone):
 
 
 def get_face_centers_and_normals(mesh_dag):
+    """
+    Returns the world space face centers and normals of a mesh, one face at a time.
+    CollisionEngine caches the mesh topology and computes them for all faces at once.
+    """
 
     rm_polyiter = OpenMaya.MItMeshPolygon(mesh_dag)
     face_centers = OpenMaya.MFloatPointArray()
@@ -66,11 +83,445 @@ def get_face_centers_and_normals(mesh_dag):
     return face_centers, face_normals
 
 
+def get_object_bounding_box(dag_path):
+    """
+    Returns the object space axis aligned bounding box of a node as (min, max) arrays
+    """
+    box = OpenMaya.MFnDagNode(dag_path).boundingBox
+    return (np.array([box.min.x, box.min.y, box.min.z], dtype=np.float64),
+            np.array([box.max.x, box.max.y, box.max.z], dtype=np.float64))
+
+
+def get_world_matrix(dag_path, frame=None):
+    """
+    Returns the world matrix of a node in the current pose, or evaluated at a frame, as 4x4 array.
+    Points are row vectors, as in Maya.
+    """
+    if frame is None:
+        matrix = dag_path.inclusiveMatrix()
+    else:
+        world_matrix_plug = OpenMaya.MFnDagNode(dag_path).findPlug('worldMatrix', False)
+        world_matrix_plug = world_matrix_plug.elementByLogicalIndex(dag_path.instanceNumber())
+        matrix = OpenMaya.MFnMatrixData(get_plug_object_at_time(world_matrix_plug, frame)).matrix()
+    return np.array([matrix.getElement(row, col) for row in range(4) for col in range(4)],
+                    dtype=np.float64).reshape(4, 4)
+
+
+def get_mesh_points(fn_mesh, space=OpenMaya.MSpace.kWorld):
+    """
+    Returns the vertex positions of a mesh as (num_vertices x 3) array
+    """
+    points = np.array(fn_mesh.getPoints(space), dtype=np.float64)
+    return points.reshape(-1, 4)[:, :3]
+
+
+def get_plug_object_at_time(plug, frame):
+    """
+    Returns the value of a plug evaluated at a frame as MObject, without changing the current time
+    """
+    context = OpenMaya.MDGContext(OpenMaya.MTime(frame, OpenMaya.MTime.uiUnit()))
+    if hasattr(OpenMaya, 'MDGContextGuard'):
+        with OpenMaya.MDGContextGuard(context):
+            return plug.asMObject()
+    return plug.asMObject(context)
+
+
+def get_mesh_at_time(mesh_dag, frame, world_space=True):
+    """
+    Returns the mesh evaluated at a frame as MFnMesh of its mesh data, which holds world or object space positions
+    """
+    fn_node = OpenMaya.MFnDagNode(mesh_dag)
+    if world_space:
+        mesh_plug = fn_node.findPlug('worldMesh', False).elementByLogicalIndex(mesh_dag.instanceNumber())
+    else:
+        mesh_plug = fn_node.findPlug('outMesh', False)
+    return OpenMaya.MFnMesh(get_plug_object_at_time(mesh_plug, frame))
+
+
+def get_mesh_points_at_time(mesh_dag, frame, world_space=True):
+    """
+    Returns the world or object space vertex positions of a mesh evaluated at a frame as (num_vertices x 3) array
+    """
+    # The mesh data holds the positions in the space of the plug.
+    return get_mesh_points(get_mesh_at_time(mesh_dag, frame, world_space), OpenMaya.MSpace.kObject)
+
+
+def get_mesh_topology(fn_mesh):
+    """
+    Returns the face to vertex indices of a mesh as PolygonTopology
+    """
+    face_vertex_counts, face_vertices = fn_mesh.getVertices()
+    return PolygonTopology(face_vertex_counts, face_vertices)
+
+
+def get_mesh_triangles(fn_mesh):
+    """
+    Returns the vertex indices of the triangulated mesh as (num_triangles x 3) array, and the face index of every
+    triangle as (num_triangles) array
+    """
+    face_triangle_counts, triangle_vertices = fn_mesh.getTriangles()
+    face_triangle_counts = np.array(face_triangle_counts, dtype=np.int64)
+    triangle_faces = np.repeat(np.arange(len(face_triangle_counts)), face_triangle_counts)
+    return np.array(triangle_vertices, dtype=np.int64).reshape(-1, 3), triangle_faces
+
+
 def set_pose(key_values, ctrl_list, attr_list):
     for i in range(0, len(ctrl_list)):
         cmds.setAttr('{0}.{1}'.format(ctrl_list[i], attr_list[i]), key_values[i])
       
 
+class CollisionEngine(object):
+    """
+    Stateful collision tests against a single collision mesh, created once per generation.
+
+    The DAG paths and function sets of the collision mesh, ray meshes and bones are resolved once.
+    The intersection accelerator of the collision mesh is reused between pose tests when the collision
+    mesh is static, and rebuilt for every test when it is deformed.
+    The hit and rebuild counters show how often the accelerator was reused.
+
+    Ray mesh tests can run on Maya's intersection functions, or on a NumPy BVH that tests the rays of all faces
+    at once. Like Maya's accelerator, the BVH is built in object space and the rays are transformed into it, so
+    only deformers invalidate it. With the NumPy engine a deformed collision mesh refits the BVH instead of
+    rebuilding it. The BVH counts the hits per polygon and scales the maximum ray distance into object space,
+    so it gives the same hit counts as allIntersections.
+
+    Face tests stop as soon as the threshold of intersecting faces is reached. With prioritize_faces, the faces
+    that intersected most often in earlier poses are tested first, so rejected poses only need a few rays.
+
+    Before any exact test, a broad phase culls the face rays and bone segments that can't reach the bounding box
+    of the collision mesh. Culled rays count as zero hits.
+
+    Face tests can also run on the meshes evaluated at another frame, which is how batches of candidate poses
+    keyed at scratch frames are validated. Both engines test those rays in the object space of the collision mesh
+    at that frame. The Maya engine keeps the accelerator of a static collision mesh and builds one on the mesh data
+    of the frame for a deformed one.
+    """
+
+    def __init__(self, collision_mesh, static_collision_mesh=None, intersection_engine=INTERSECTION_ENGINE_MAYA,
+                 prioritize_faces=True):
+        """
+        :param collision_mesh: Path of mesh to collide against.
+        :param static_collision_mesh: Whether the collision mesh keeps its shape in every pose.
+            When None, the mesh is considered static when there are no deformers in its history.
+        :param intersection_engine: INTERSECTION_ENGINE_MAYA or INTERSECTION_ENGINE_NUMPY, used by the ray mesh test.
+        :param prioritize_faces: Test the faces that intersected most often first.
+        """
+        self.collision_mesh = collision_mesh
+        self.col_mesh_dag = get_dag_path(collision_mesh, extend_to_shape=True)
+        self.col_fn_mesh = OpenMaya.MFnMesh(self.col_mesh_dag)
+        if static_collision_mesh is None:
+            static_collision_mesh = not has_deformers(collision_mesh)
+        self.static_collision_mesh = static_collision_mesh
+
+        self.intersection_engine = intersection_engine
+        self.mesh_accel_params = None
+        self.bvh = None
+        self.accelerator_hits = 0
+        self.accelerator_rebuilds = 0
+
+        self.ray_meshes = {}
+        self.bone_paths = {}
+
+        self.prioritize_faces = prioritize_faces
+        self.face_collision_counts = {}
+        self.rays_cast = 0
+        self.rays_skipped = 0
+        self.rays_culled = 0
+        self.segments_tested = 0
+        self.segments_culled = 0
+        self.collision_object_box = None
+
+    def get_accelerator(self):
+        """
+        Returns the accelerator parameters of the collision mesh, rebuilding the accelerator when needed.
+        """
+        if self.mesh_accel_params is not None and self.static_collision_mesh:
+            self.accelerator_hits += 1
+            return self.mesh_accel_params
+
+        self.col_fn_mesh.freeCachedIntersectionAccelerator()
+        self.mesh_accel_params = self.col_fn_mesh.autoUniformGridParams()
+        self.accelerator_rebuilds += 1
+        return self.mesh_accel_params
+
+    def get_collision_points(self, frame=None):
+        """
+        Returns the object space vertex positions of the collision mesh in the current pose, or at a frame.
+        """
+        if frame is None:
+            return get_mesh_points(self.col_fn_mesh, OpenMaya.MSpace.kObject)
+        return get_mesh_points_at_time(self.col_mesh_dag, frame, world_space=False)
+
+    def get_bvh(self, frame=None):
+        """
+        Returns the object space BVH of the collision mesh, refitted to the current pose (or the pose at a frame)
+        when the mesh is deformed.
+        """
+        if self.bvh is None:
+            triangles, triangle_faces = get_mesh_triangles(self.col_fn_mesh)
+            self.bvh = TriangleBVH(self.get_collision_points(frame), triangles, triangle_faces=triangle_faces)
+            self.accelerator_rebuilds += 1
+        elif self.static_collision_mesh:
+            self.accelerator_hits += 1
+        else:
+            self.bvh.refit(self.get_collision_points(frame))
+            self.accelerator_rebuilds += 1
+        return self.bvh
+
+    def get_collision_bounding_box(self, frame=None):
+        """
+        Returns the padded world space bounding box of the collision mesh in the current pose, or at a frame.
+        """
+        if self.collision_object_box is None or not self.static_collision_mesh:
+            if frame is None:
+                box_min, box_max = get_object_bounding_box(self.col_mesh_dag)
+            else:
+                box_min, box_max = bounding_box.get_points_bounding_box(self.get_collision_points(frame))
+            self.collision_object_box = bounding_box.pad_bounding_box(box_min, box_max)
+        box_min, box_max = self.collision_object_box
+        return bounding_box.transform_bounding_box(box_min, box_max, get_world_matrix(self.col_mesh_dag, frame))
+
+    def get_ray_candidates(self, face_centers, face_normals, frame=None):
+        """
+        Returns a mask of the face rays that can reach the collision mesh bounding box.
+        """
+        if len(face_centers) == 0:
+            return np.zeros(0, dtype=bool)
+        box_min, box_max = self.get_collision_bounding_box(frame)
+
+        # Whole ray mesh first: the rays can't reach further than their maximum length.
+        ray_length = DEFAULT_MAX_DISTANCE * np.linalg.norm(face_normals, axis=1).max()
+        ray_box_min, ray_box_max = bounding_box.get_points_bounding_box(face_centers)
+        if not bounding_box.boxes_overlap(ray_box_min - ray_length, ray_box_max + ray_length, box_min, box_max):
+            return np.zeros(len(face_centers), dtype=bool)
+
+        return bounding_box.rays_overlap_box(face_centers, face_normals, box_min, box_max, DEFAULT_MAX_DISTANCE)
+
+    def get_ray_mesh(self, ray_mesh):
+        """
+        Returns the function set and topology of the ray mesh, resolved once per mesh.
+        """
+        if ray_mesh not in self.ray_meshes:
+            ray_mesh_dag = get_dag_path(ray_mesh, extend_to_shape=True)
+            fn_mesh = OpenMaya.MFnMesh(ray_mesh_dag)
+            self.ray_meshes[ray_mesh] = (ray_mesh_dag, fn_mesh, get_mesh_topology(fn_mesh))
+        return self.ray_meshes[ray_mesh]
+
+    def get_face_rays(self, ray_mesh, frame=None):
+        """
+        Returns the world space face centers and normals of the ray mesh in its current pose, or at a frame.
+        """
+        ray_mesh_dag, fn_mesh, topology = self.get_ray_mesh(ray_mesh)
+        if frame is None:
+            points = get_mesh_points(fn_mesh)
+        else:
+            points = get_mesh_points_at_time(ray_mesh_dag, frame)
+        return topology.get_face_centers_and_normals(points)
+
+    def get_bone_paths(self, bone_node):
+        """
+        Returns the bone path and the paths of its child bones, resolved once per bone.
+        """
+        if bone_node not in self.bone_paths:
+            bone = get_dag_path(bone_node)
+            self.bone_paths[bone_node] = (bone, get_bone_children(bone))
+        return self.bone_paths[bone_node]
+
+    def get_intersecting_bones(self, bones, threshold=10):
+        '''
+        Checks if the bone-hierarchy is colliding against the collision mesh.
+        A ray will be shoot from each bone to of its children, and check for closest intersection.
+        Returns list of intersecting bones. 
+        '''
+        mesh_accel_params = self.get_accelerator()
+        box_min, box_max = self.get_collision_bounding_box()
+
+        intersecting_bones = set()
+        for bone_node in bones:
+        
+            # get bone position and children
+            bone, bone_children = self.get_bone_paths(bone_node)
+            ray_source = get_world_position(bone)
+            
+            for i in range(len(bone_children)):
+                
+                child_position = get_world_position(bone_children[i])
+
+                # skip segments that can't overlap the collision mesh
+                self.segments_tested += 1
+                segment = np.array([[ray_source.x, ray_source.y, ray_source.z],
+                                    [child_position.x, child_position.y, child_position.z]])
+                if not bounding_box.boxes_overlap(segment.min(axis=0), segment.max(axis=0), box_min, box_max):
+                    self.segments_culled += 1
+                    continue
+
+                ray_direction = child_position - ray_source # no need to normalize
+                max_param = ray_direction.length()
+                
+                # get closest intersection
+                intersection = self.col_fn_mesh.closestIntersection(
+                    ray_source, ray_direction, OpenMaya.MSpace.kWorld, max_param, False,
+                    idsSorted=False, accelParams=mesh_accel_params, tolerance=1e-6)
+                
+                if intersection:
+                    hit_point = intersection[0]
+
+                    # make sure ray is under radius
+                    if (hit_point-ray_source).length() < max_param:                    
+                        intersecting_bones.add(bone_node)
+                
+                # early exit if number of intersecting bones is over threshold.
+                if threshold != -1 and len(intersecting_bones) >= threshold:
+                    return list(intersecting_bones)
+                
+        return list(intersecting_bones)
+
+    def get_face_order(self, ray_mesh, num_faces):
+        """
+        Returns the face ids in test order, the faces that intersected most often first.
+        """
+        collision_counts = self.face_collision_counts.get(ray_mesh)
+        if not self.prioritize_faces or collision_counts is None:
+            return np.arange(num_faces)
+        return np.argsort(-collision_counts, kind='stable')
+
+    def get_intersecting_faces(self, ray_mesh, calibration_mode=False, calibration_data=[], threshold=-1,
+                               frame=None):
+        """
+        Returns the ids of the ray mesh faces whose rays intersect the collision mesh in a different odd / even
+        pattern than in calibration_data. In calibration mode, returns the faces with an odd number of hits.
+        Stops testing faces when the number of intersecting faces reaches the threshold, unless it is -1.
+        Tests the meshes in the current pose, or evaluated at frame when it is given.
+        """
+
+        # get rays from mesh
+        face_centers, face_normals = self.get_face_rays(ray_mesh, frame)
+        num_faces = len(face_centers)
+
+        # Conditions for logging intersection:
+        # faceID is NOT in calibration_data AND odd number of hits recorded
+        # faceID is in calibration data AND even number of hits recorded
+        # calibration mode just logs intersection based on odd number of hits to determine a 'default state' of 
+        # each face we cast from.
+        calibrated = np.zeros(num_faces, dtype=bool)
+        if not calibration_mode:
+            calibrated[np.asarray(calibration_data, dtype=np.int64)] = True
+
+        # Culled rays have no hits, so they only intersect when they were calibrated with an odd number of hits.
+        candidates = self.get_ray_candidates(face_centers, face_normals, frame)
+        intersecting_faces = np.nonzero(~candidates & calibrated)[0].tolist()
+        num_culled = num_faces - int(np.count_nonzero(candidates))
+
+        face_order = self.get_face_order(ray_mesh, num_faces)
+        face_order = face_order[candidates[face_order]]
+        if self.intersection_engine == INTERSECTION_ENGINE_NUMPY:
+            num_tested = self.get_intersecting_faces_numpy(
+                face_centers, face_normals, face_order, calibrated, threshold, intersecting_faces, frame)
+        else:
+            num_tested = self.get_intersecting_faces_maya(
+                face_centers, face_normals, face_order, calibrated, threshold, intersecting_faces, frame)
+
+        self.rays_cast += num_tested
+        self.rays_culled += num_culled
+        self.rays_skipped += num_faces - num_culled - num_tested
+        if not calibration_mode and self.prioritize_faces:
+            if ray_mesh not in self.face_collision_counts:
+                self.face_collision_counts[ray_mesh] = np.zeros(num_faces, dtype=np.int64)
+            self.face_collision_counts[ray_mesh][intersecting_faces] += 1
+
+        return intersecting_faces
+
+    def get_intersecting_faces_maya(self, face_centers, face_normals, face_order, calibrated, threshold,
+                                    intersecting_faces, frame=None):
+        """
+        Tests the faces in face_order with Maya's allIntersections, appends the intersecting ones to
+        intersecting_faces and returns the number of faces tested.
+        """
+        fn_mesh = self.col_fn_mesh
+        space = OpenMaya.MSpace.kWorld
+        max_distances = np.full(len(face_centers), DEFAULT_MAX_DISTANCE)
+        if frame is None:
+            mesh_accel_params = self.get_accelerator()
+        else:
+            # The current pose is not the one at the frame, so the rays are moved into the object space of the
+            # collision mesh at the frame.
+            world_inverse_matrix = np.linalg.inv(get_world_matrix(self.col_mesh_dag, frame))
+            face_centers, face_normals, max_distances = transform_rays(face_centers, face_normals,
+                                                                       world_inverse_matrix, DEFAULT_MAX_DISTANCE)
+            space = OpenMaya.MSpace.kObject
+            if self.static_collision_mesh:
+                mesh_accel_params = self.get_accelerator()
+            else:
+                fn_mesh = get_mesh_at_time(self.col_mesh_dag, frame, world_space=False)
+                mesh_accel_params = fn_mesh.autoUniformGridParams()
+                self.accelerator_rebuilds += 1
+
+        num_tested = 0
+        for face_id in face_order:
+            if threshold != -1 and len(intersecting_faces) >= threshold:
+                break
+
+            # raycast for intersections   
+            result = fn_mesh.allIntersections(OpenMaya.MFloatPoint(*face_centers[face_id]),
+                                              OpenMaya.MFloatVector(*face_normals[face_id]),
+                                              space, float(max_distances[face_id]), False,
+                                              accelParams=mesh_accel_params)
+            num_tested += 1
+            num_hits = len(result[0]) if result else 0
+            if (num_hits % 2 == 1) != calibrated[face_id]:
+                intersecting_faces.append(int(face_id))
+
+        return num_tested
+
+    def get_intersecting_faces_numpy(self, face_centers, face_normals, face_order, calibrated, threshold,
+                                     intersecting_faces, frame=None):
+        """
+        Tests the faces in face_order against the BVH in doubling chunks, appends the intersecting ones to
+        intersecting_faces and returns the number of faces tested.
+        """
+        bvh = self.get_bvh(frame)
+
+        # Transform the rays into the object space of the BVH, the maximum distance is scaled along.
+        world_inverse_matrix = np.linalg.inv(get_world_matrix(self.col_mesh_dag, frame))
+        face_centers, face_normals, max_distances = transform_rays(face_centers, face_normals, world_inverse_matrix,
+                                                                   DEFAULT_MAX_DISTANCE)
+
+        num_tested = 0
+        chunk_size = FIRST_RAY_CHUNK_SIZE if threshold != -1 else len(face_order)
+        while num_tested < len(face_order):
+            if threshold != -1 and len(intersecting_faces) >= threshold:
+                break
+
+            face_ids = face_order[num_tested:num_tested + chunk_size]
+            hit_counts = bvh.count_intersections(face_centers[face_ids], face_normals[face_ids],
+                                                 max_distance=max_distances[face_ids])
+            intersecting = (hit_counts % 2 == 1) != calibrated[face_ids]
+            intersecting_faces.extend(face_ids[intersecting].tolist())
+            num_tested += len(face_ids)
+            chunk_size *= 2
+
+        return num_tested
+
+    def print_statistics(self):
+        print('[MLDeformer] Collision mesh {}: accelerator reused {} times, rebuilt {} times ({})'.format(
+            self.collision_mesh, self.accelerator_hits, self.accelerator_rebuilds,
+            'static' if self.static_collision_mesh else 'deformed'))
+        if self.rays_cast + self.rays_culled > 0:
+            print('[MLDeformer] Cast {} face rays, culled {} outside the collision mesh bounds, '
+                  'skipped {} after early exits'.format(self.rays_cast, self.rays_culled, self.rays_skipped))
+        if self.segments_tested > 0:
+            print('[MLDeformer] Culled {} of {} bone segments outside the collision mesh bounds'.format(
+                self.segments_culled, self.segments_tested))
+
+
+def has_deformers(mesh):
+    """
+    Returns true if there are deformers (skin clusters, blend shapes, etc.) in the history of the mesh
+    """
+    history = cmds.listHistory(mesh, pruneDagObjects=True) or []
+    return len(cmds.ls(history, type='geometryFilter')) > 0
+
+
 def get_intersecting_bones(collision_mesh, bones, threshold=10):
     '''
     Checks if the bone-hierarchy is colliding against the given mesh.
@@ -79,83 +530,14 @@ def get_intersecting_bones(collision_mesh, bones, threshold=10):
 
     Note: if the bone-hierarchy has a complex leaf structure, it is recommended to create a simplified version of the skeleton.
     Same applies to the mesh, creating a simplified single mesh might work better.
+    Use a CollisionEngine to reuse the resolved paths and accelerator between tests.
     '''
-    
-    # get mesh structure
-    col_mesh_dag = get_dag_path(collision_mesh, extend_to_shape=True)
-    col_fn_mesh = OpenMaya.MFnMesh(col_mesh_dag)
-    col_fn_mesh.freeCachedIntersectionAccelerator()
-    mesh_accel_params = col_fn_mesh.autoUniformGridParams()
-        
-    intersecting_bones = set()
-    for bone_node in bones:
-    
-        # get bone position
-        bone = get_dag_path(bone_node)
-        ray_source = get_world_position(bone)
-
-        # get bone children
-        bone_children = get_bone_children(bone)
-        
-        for i in range(len(bone_children)):
-            
-            child_position = get_world_position(bone_children[i])
-            ray_direction = child_position - ray_source # no need to normalize
-            max_param = ray_direction.length()
-            
-            # get closest intersection
-            intersection = col_fn_mesh.closestIntersection(
-                ray_source, ray_direction, OpenMaya.MSpace.kWorld, max_param, False,
-                idsSorted=False, accelParams=mesh_accel_params, tolerance=1e-6)
-            
-            if intersection:
-                hit_point = intersection[0]
-
-                # make sure ray is under radius
-                if (hit_point-ray_source).length() < max_param:                    
-                    intersecting_bones.add(bone_node)
-            
-            # early exit if number of intersecting bones is over threshold.
-            if threshold != -1 and len(intersecting_bones) >= threshold:
-                return list(intersecting_bones)
-            
-    return list(intersecting_bones)
+    return CollisionEngine(collision_mesh, static_collision_mesh=False).get_intersecting_bones(bones, threshold)
 
   
-def get_intersecting_faces(ray_mesh, collision_mesh, calibration_mode=False, calibration_data=[]):
-
-    ray_mesh_dag = get_dag_path(ray_mesh, extend_to_shape=True)
-    col_mesh_dag = get_dag_path(collision_mesh, extend_to_shape=True)
-
-    # get rays from mesh
-    face_centers, face_normals = get_face_centers_and_normals(ray_mesh_dag)
-    
-    col_fn_mesh = OpenMaya.MFnMesh(col_mesh_dag)
-    col_fn_mesh.freeCachedIntersectionAccelerator()
-    mesh_accel_params = col_fn_mesh.autoUniformGridParams()
-
-    intersecting_faces = set()
-
-    for face_id in range(len(face_centers)):
-        # raycast for intersections   
-        result = col_fn_mesh.allIntersections(face_centers[face_id], face_normals[face_id], OpenMaya.MSpace.kWorld, 
-                                             500, False, accelParams=mesh_accel_params)
-        if result:
-            if calibration_mode and not len(result[0]) % 2 == 0:
-                # calibration mode just logs intersection based on odd number of hits to determine a 'default state' of 
-                # each vert we cast from.
-                intersecting_faces.add(face_id)
-
-            if not calibration_mode:
-                # Conditions for logging intersection:
-                # vertID is NOT in calibration_data AND odd number of hits recorded
-                # vertID is in calibration data AND even number of hits recorded
-                if not face_id in calibration_data and not len(result[0]) % 2 == 0: # not in list, and odd numer of hits.
-                    intersecting_faces.add(face_id)
-                if face_id in calibration_data and len(result[0]) % 2 == 0:  # is in list, and even number of hits...
-                    intersecting_faces.add(face_id)
-
-    return list(intersecting_faces)
+def get_intersecting_faces(ray_mesh, collision_mesh, calibration_mode=False, calibration_data=[], threshold=-1):
+    return CollisionEngine(collision_mesh, static_collision_mesh=False).get_intersecting_faces(
+        ray_mesh, calibration_mode, calibration_data, threshold)
 
 
 def create_bone_mesh_test(bone_list, collision_mesh, allowed_collisions):
@@ -171,8 +553,10 @@ def create_bone_mesh_test(bone_list, collision_mesh, allowed_collisions):
 
     """
     
+    collision_engine = CollisionEngine(collision_mesh)
+
     # initial collision check to calibrate num raycast intersections in ref pose
-    intersecting_bones = get_intersecting_bones(collision_mesh, bone_list, threshold=-1)
+    intersecting_bones = collision_engine.get_intersecting_bones(bone_list, threshold=-1)
     if intersecting_bones:
         cmds.warning('Bones intersecting: {}'.format(' '.join(intersecting_bones)))
     bone_list = list(set(bone_list) - set(intersecting_bones))
@@ -182,30 +566,98 @@ def create_bone_mesh_test(bone_list, collision_mesh, allowed_collisions):
     def valid_pose_test(rnd_attr_values, ctrl_list, attr_list):
         set_pose(rnd_attr_values, ctrl_list, attr_list)
         # test generated pose for intersection
-        intersecting_bones = get_intersecting_bones(collision_mesh, bone_list, threshold=allowed_collisions)
+        intersecting_bones = collision_engine.get_intersecting_bones(bone_list, threshold=allowed_collisions)
         return len(intersecting_bones) < allowed_collisions
         
+    valid_pose_test.collision_engine = collision_engine
     return valid_pose_test
 
 
-def create_ray_mesh_test(ray_mesh, collision_mesh, allowed_collisions):
+class RayMeshPoseTest(object):
     """
-     Returns a function that returns true rays cast from the center of ray mesh faces intersect with the collision mesh
-     in a different odd / even pattern than during the bind pose.  
-    
-    :param bone_list: bones to collide against mesh.  Only intersection between the parent and child count. 
-    :param collision_mesh: Path of mesh to collide against.  
+    Callable that returns true if the rays cast from the center of ray mesh faces intersect with the collision mesh
+    in the same odd / even pattern as during the bind pose, allowing up to allowed_collisions differences.
+
+    Besides testing one pose set with setAttr, validate_batch tests many candidate poses at once. The candidates are
+    keyed at scratch frames and the meshes are evaluated at those frames, without setting attributes or changing
+    the current time. Call clear_scratch_keys when done to remove the scratch keys.
     """
 
-    # initial collision check to calibrate num raycast intersections in ref pose
-    calibration_data = get_intersecting_faces(ray_mesh, collision_mesh, calibration_mode=True)
-    
-    def valid_pose_test(rnd_attr_values, ctrl_list, attr_list):
-        set_pose(rnd_attr_values, ctrl_list, attr_list)
-        # test generated pose for intersection
-        intersecting_faces = get_intersecting_faces(ray_mesh, collision_mesh, calibration_mode=False,
-                                                calibration_data=calibration_data)
-        return len(intersecting_faces) < allowed_collisions
+    def __init__(self, ray_mesh, collision_mesh, allowed_collisions, intersection_engine=INTERSECTION_ENGINE_MAYA,
+                 prioritize_faces=True):
+        self.ray_mesh = ray_mesh
+        self.allowed_collisions = allowed_collisions
+        self.collision_engine = CollisionEngine(collision_mesh, intersection_engine=intersection_engine,
+                                                prioritize_faces=prioritize_faces)
 
-    return valid_pose_test
+        # initial collision check to calibrate num raycast intersections in ref pose
+        self.calibration_data = self.collision_engine.get_intersecting_faces(ray_mesh, calibration_mode=True)
+
+        self.scratch_writer = None
+        self.scratch_frames = set()
+        self.num_batches = 0
+        self.num_batch_candidates = 0
+
+    def __call__(self, rnd_attr_values, ctrl_list, attr_list):
+        set_pose(rnd_attr_values, ctrl_list, attr_list)
+        return self.is_valid()
+
+    def is_valid(self, frame=None):
+        # test pose for intersection
+        intersecting_faces = self.collision_engine.get_intersecting_faces(self.ray_mesh, calibration_mode=False,
+                                                                          calibration_data=self.calibration_data,
+                                                                          threshold=self.allowed_collisions,
+                                                                          frame=frame)
+        return len(intersecting_faces) < self.allowed_collisions
+
+    def validate_batch(self, candidates, ctrl_list, attr_list, scratch_start_frame, stop_at_first_valid=True):
+        """
+        Returns a mask of the valid candidate poses.
+
+        :param candidates: Matrix (num_candidates x controllers) of candidate poses.
+        :param scratch_start_frame: First frame the candidates are keyed at, the frames after it must be free.
+        :param stop_at_first_valid: Don't evaluate the candidates after the first valid one, they are marked invalid.
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+        frames = scratch_start_frame + np.arange(candidates.shape[0])
+        if self.scratch_writer is None:
+            self.scratch_writer = AnimCurveWriter(ctrl_list, attr_list)
+
+        # Replace the keys of the previous batch, instead of adding more.
+        self.scratch_writer.write(frames, candidates, keep_existing=False)
+        self.scratch_frames.update(frames.tolist())
+        self.num_batches += 1
+
+        valid = np.zeros(candidates.shape[0], dtype=bool)
+        for idx, frame in enumerate(frames.tolist()):
+            self.num_batch_candidates += 1
+            valid[idx] = self.is_valid(frame)
+            if valid[idx] and stop_at_first_valid:
+                break
+        return valid
+
+    def clear_scratch_keys(self):
+        """
+        Removes the keys added by validate_batch.
+        """
+        if self.scratch_writer is not None and self.scratch_frames:
+            cmds.cutKey(self.scratch_writer.plug_names, time=(min(self.scratch_frames), max(self.scratch_frames)),
+                        clear=True)
+        self.scratch_writer = None
+        self.scratch_frames = set()
+
+
+def create_ray_mesh_test(ray_mesh, collision_mesh, allowed_collisions, intersection_engine=INTERSECTION_ENGINE_MAYA,
+                         prioritize_faces=True):
+    """
+     Returns a RayMeshPoseTest, a function that returns true if rays cast from the center of ray mesh faces intersect
+     with the collision mesh in the same odd / even pattern as during the bind pose.  
+    
+    :param ray_mesh: Path of mesh to cast rays from.
+    :param collision_mesh: Path of mesh to collide against.  
+    :param allowed_collisions: Number of intersecting faces that makes a pose invalid.
+    :param intersection_engine: INTERSECTION_ENGINE_MAYA or INTERSECTION_ENGINE_NUMPY.
+    :param prioritize_faces: Test the faces that intersected most often in earlier poses first.
+    """
 
+    return RayMeshPoseTest(ray_mesh, collision_mesh, allowed_collisions, intersection_engine, prioritize_faces)
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Package 'sampling' includes DCC-independent functionality to sample
+controller values (poses) in batches.
+"""
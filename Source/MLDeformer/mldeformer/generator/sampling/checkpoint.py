@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module saves and loads the state of a running generation, so an interrupted generation can be resumed.
+A checkpoint holds the poses accepted so far and everything that decides the next poses: the random stream,
+the poses sampled ahead, the adapted group probabilities and the statistics the generation branches on.
+Everything that can be rebuilt from the accepted poses, like the distance index and the coverage statistics,
+is rebuilt on resume instead of being saved.
+The accepted poses are appended to a raw pose file, so a save only writes the poses accepted since the previous
+one. The state has a fixed size and records the number of valid poses. It is written next to the previous state
+and then moved over it, so a crash while saving keeps the previous checkpoint intact. Poses appended after the
+last state are ignored on resume and generated again.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Name of the checkpoint file, next to the generated outputs.
+CHECKPOINT_FILE_NAME = 'GenerationCheckpoint.npz'
+
+
+def get_settings_hash(settings):
+    """Get the hash that identifies the settings of a generation.
+    Parameters:
+        settings (dict) -- Json serializable settings that decide the generated poses
+    Return:
+        The hex digest of the settings
+    """
+    json_string = json.dumps(settings, sort_keys=True, default=lambda value: value.__dict__)
+    return hashlib.sha1(json_string.encode('utf-8')).hexdigest()
+
+
+def get_pose_file_path(file_path):
+    """Get the path of the file the accepted poses of a checkpoint are appended to."""
+    return os.path.splitext(file_path)[0] + 'Poses.bin'
+
+
+def replace_file(source_path, target_path):
+    if hasattr(os, 'replace'):
+        os.replace(source_path, target_path)
+        return
+    # Python 2 can't rename over an existing file on Windows.
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    os.rename(source_path, target_path)
+
+
+class GenerationCheckpoint(object):
+    """The accepted poses and the sampling state of a generation at a frame."""
+
+    def __init__(self, settings_hash, frame_times, poses, next_frame, state, arrays=None):
+        """ Initialize GenerationCheckpoint class.
+        Parameters:
+            settings_hash (str)  -- Hash of the generation settings, see get_settings_hash
+            frame_times (ndarray) -- Vector of the frame times of the accepted poses
+            poses (ndarray)      -- Matrix (num_frames x num_controllers) of accepted poses
+            next_frame (int)     -- First frame that is not generated yet
+            state (dict)         -- Json serializable state of the samplers, statistics and counters
+            arrays (dict)        -- Named arrays of state that is too large for json, like the poses sampled ahead
+        """
+        self.settings_hash = settings_hash
+        self.frame_times = np.asarray(frame_times, dtype=np.float64)
+        self.poses = np.asarray(poses, dtype=np.float64)
+        self.next_frame = next_frame
+        self.state = state
+        self.arrays = arrays if arrays is not None else {}
+
+    @classmethod
+    def load_from_file(cls, file_path):
+        """Load a checkpoint with the poses that were accepted when its state was saved.
+        Parameters:
+            file_path (str) -- Path of the .npz state file
+        """
+        with np.load(file_path) as data:
+            arrays = dict((name[len('array_'):], data[name]) for name in data.files if name.startswith('array_'))
+            num_poses = int(data['num_poses'])
+            num_columns = int(data['num_columns'])
+            settings_hash = str(data['settings_hash'])
+            next_frame = int(data['next_frame'])
+            state = json.loads(str(data['state']))
+
+        rows = np.zeros((0, num_columns))
+        if num_poses > 0:
+            rows = np.fromfile(get_pose_file_path(file_path), dtype=np.float64, count=num_poses * num_columns)
+            if len(rows) < num_poses * num_columns:
+                raise IOError('The checkpoint pose file is missing poses: {}'.format(get_pose_file_path(file_path)))
+            rows = rows.reshape(num_poses, num_columns)
+        return cls(settings_hash, rows[:, 0], rows[:, 1:], next_frame, state, arrays)
+
+
+class CheckpointWriter(object):
+    """Saves the checkpoints of a generation, writing only the poses accepted since the previous save."""
+
+    def __init__(self, file_path, num_saved_poses=0):
+        """ Initialize CheckpointWriter class.
+        Parameters:
+            file_path (str)       -- Path of the .npz state file, the poses are appended to get_pose_file_path
+            num_saved_poses (int) -- Number of poses in the pose file that are kept, when continuing a checkpoint
+        """
+        self.file_path = file_path
+        self.pose_file_path = get_pose_file_path(file_path)
+        self.num_saved_poses = num_saved_poses
+        # Poses appended after the loaded state are cut off before the first save.
+        self.truncate_pose_file = True
+
+    def save(self, settings_hash, frame_times, poses, next_frame, state, arrays=None):
+        """Append the newly accepted poses and replace the state, only once the poses are written.
+        Parameters:
+            settings_hash (str)   -- Hash of the generation settings, see get_settings_hash
+            frame_times (ndarray) -- Vector of the frame times of the poses accepted since the previous save
+            poses (ndarray)       -- Matrix (num_frames x num_controllers) of the poses accepted since the previous save
+            next_frame (int)      -- First frame that is not generated yet
+            state (dict)          -- Json serializable state of the samplers, statistics and counters
+            arrays (dict)         -- Named arrays of state that is too large for json, like the poses sampled ahead
+        """
+        folder = os.path.dirname(os.path.abspath(self.file_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        rows = np.column_stack([np.asarray(frame_times, dtype=np.float64), np.asarray(poses, dtype=np.float64)])
+        num_columns = rows.shape[1]
+        with open(self.pose_file_path, 'ab') as pose_file:
+            if self.truncate_pose_file:
+                pose_file.truncate(self.num_saved_poses * num_columns * rows.itemsize)
+                self.truncate_pose_file = False
+            pose_file.write(np.ascontiguousarray(rows).tobytes())
+            pose_file.flush()
+            os.fsync(pose_file.fileno())
+        self.num_saved_poses += len(rows)
+
+        arrays = dict(('array_' + name, array) for name, array in (arrays or {}).items())
+        # The temporary name keeps the .npz extension, so numpy doesn't append it.
+        temp_file_path = self.file_path + '.tmp.npz'
+        np.savez_compressed(temp_file_path, settings_hash=np.array(settings_hash), num_poses=self.num_saved_poses,
+                            num_columns=num_columns, next_frame=next_frame,
+                            state=np.array(json.dumps(state, sort_keys=True)), **arrays)
+        replace_file(temp_file_path, self.file_path)
+
+
+def remove_checkpoint(file_path):
+    if not file_path:
+        return
+    for path in (file_path, get_pose_file_path(file_path)):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module measures how well a set of poses covers the controller ranges.
+Poses are normalized to the unit cube, then the occupied fraction of a grid of bins is measured
+for every controller and for pairs of controllers.
+"""
+
+import numpy as np
+
+DEFAULT_NUM_BINS = 16
+DEFAULT_MAX_PAIRS = 256
+
+
+def normalize_poses(poses, min_values, max_values):
+    """Map controller values to [0, 1] using the controller ranges.
+    Parameters:
+        poses (ndarray)       -- Matrix (num_poses x num_controllers) of controller values
+        min_values (ndarray)  -- Minimum value per controller
+        max_values (ndarray)  -- Maximum value per controller
+    Return:
+        Matrix (num_poses x num_controllers) of normalized values
+    """
+    value_range = np.asarray(max_values, dtype=np.float64) - min_values
+    value_range = np.where(value_range > 0.0, value_range, 1.0)
+    return np.clip((np.atleast_2d(poses) - min_values) / value_range, 0.0, 1.0)
+
+
+def get_bins(unit_poses, num_bins=DEFAULT_NUM_BINS):
+    """Get the bin index of normalized values.
+    Return:
+        Matrix of bin indices in [0, num_bins)
+    """
+    return np.minimum((np.asarray(unit_poses) * num_bins).astype(np.int64), num_bins - 1)
+
+
+def select_pairs(num_dimensions, max_pairs=DEFAULT_MAX_PAIRS, random_seed=0):
+    """Select the dimension pairs used by the pairwise coverage, a fixed random subset when there are many.
+    Return:
+        Matrix (num_pairs x 2) of dimension indices
+    """
+    first, second = np.triu_indices(num_dimensions, k=1)
+    pairs = np.stack((first, second), axis=1)
+    if len(pairs) > max_pairs:
+        rng = np.random.default_rng(random_seed)
+        pairs = pairs[np.sort(rng.choice(len(pairs), max_pairs, replace=False))]
+    return pairs
+
+
+def compute_coverage(unit_poses, num_bins=DEFAULT_NUM_BINS, max_pairs=DEFAULT_MAX_PAIRS):
+    """Compute the fraction of occupied bins per controller and per pair of controllers.
+    Parameters:
+        unit_poses (ndarray) -- Matrix (num_poses x num_controllers) of normalized values, see normalize_poses
+        num_bins (int)       -- Number of bins per controller
+        max_pairs (int)      -- Maximum number of controller pairs to measure
+    Return:
+        Dict with the mean 'marginal' and 'pairwise' occupied fractions and their mean as 'score'
+    """
+    unit_poses = np.atleast_2d(unit_poses)
+    num_dimensions = unit_poses.shape[1]
+    if unit_poses.shape[0] == 0 or num_dimensions == 0:
+        return {'marginal': 0.0, 'pairwise': 0.0, 'score': 0.0}
+
+    bins = get_bins(unit_poses, num_bins)
+    occupied = np.zeros((num_dimensions, num_bins), dtype=bool)
+    occupied[np.broadcast_to(np.arange(num_dimensions), bins.shape), bins] = True
+    marginal = occupied.mean()
+
+    pairs = select_pairs(num_dimensions, max_pairs)
+    if len(pairs) == 0:
+        pairwise = marginal
+    else:
+        cells = bins[:, pairs[:, 0]] * num_bins + bins[:, pairs[:, 1]]
+        cells += np.arange(len(pairs)) * num_bins * num_bins
+        pairwise = len(np.unique(cells)) / float(len(pairs) * num_bins * num_bins)
+
+    return {'marginal': float(marginal), 'pairwise': float(pairwise), 'score': float(0.5 * (marginal + pairwise))}
+
+
+class CoverageAccumulator(object):
+    """Tracks the occupied bins of poses added over time, the coverage equals compute_coverage of all poses."""
+
+    def __init__(self, num_dimensions, num_bins=DEFAULT_NUM_BINS, max_pairs=DEFAULT_MAX_PAIRS):
+        """ Initialize CoverageAccumulator class.
+        Parameters:
+            num_dimensions (int) -- Number of controllers
+            num_bins (int)       -- Number of bins per controller
+            max_pairs (int)      -- Maximum number of controller pairs to measure
+        """
+        self.num_dimensions = num_dimensions
+        self.num_bins = num_bins
+        self.pairs = select_pairs(num_dimensions, max_pairs)
+        self.occupied = np.zeros((num_dimensions, num_bins), dtype=bool)
+        self.occupied_cells = np.zeros(len(self.pairs) * num_bins * num_bins, dtype=bool)
+        self.num_poses = 0
+
+    def add_poses(self, unit_poses):
+        """Add poses to the occupied bins.
+        Parameters:
+            unit_poses (ndarray) -- Vector or matrix (num_poses x num_controllers) of normalized values
+        """
+        unit_poses = np.atleast_2d(unit_poses)
+        if unit_poses.shape[0] == 0 or self.num_dimensions == 0:
+            return
+        self.num_poses += unit_poses.shape[0]
+        bins = get_bins(unit_poses, self.num_bins)
+        self.occupied[np.broadcast_to(np.arange(self.num_dimensions), bins.shape), bins] = True
+        if len(self.pairs) > 0:
+            cells = bins[:, self.pairs[:, 0]] * self.num_bins + bins[:, self.pairs[:, 1]]
+            cells += np.arange(len(self.pairs)) * self.num_bins * self.num_bins
+            self.occupied_cells[cells.ravel()] = True
+
+    def get_coverage(self):
+        """Get the coverage of all added poses.
+        Return:
+            Dict with the mean 'marginal' and 'pairwise' occupied fractions and their mean as 'score'
+        """
+        if self.num_poses == 0 or self.num_dimensions == 0:
+            return {'marginal': 0.0, 'pairwise': 0.0, 'score': 0.0}
+        marginal = self.occupied.mean()
+        pairwise = self.occupied_cells.mean() if len(self.pairs) > 0 else marginal
+        return {'marginal': float(marginal), 'pairwise': float(pairwise), 'score': float(0.5 * (marginal + pairwise))}
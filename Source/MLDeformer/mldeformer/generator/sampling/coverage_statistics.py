@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module accumulates coverage statistics of the generated poses while they are produced.
+Per controller a histogram over its range and the number of poses at its minimum, maximum and default value are
+counted, and per controller group how often it is active together with every other group.
+The memory does not grow with the number of poses.
+"""
+
+import json
+
+import numpy as np
+
+from .coverage import DEFAULT_NUM_BINS, get_bins, normalize_poses
+from .group_statistics import get_active_group_mask
+
+# Names of the files the statistics are written to, next to the generated outputs.
+COVERAGE_STATISTICS_FILE_NAME = 'CoverageStatistics.json'
+COVERAGE_HISTOGRAMS_FILE_NAME = 'CoverageStatistics.npz'
+
+
+class CoverageStatistics(object):
+    """Streaming histograms, range limit hits and group co-occurrence counts of generated poses."""
+
+    def __init__(self, controller_names, group_names, group_indices, min_values, max_values, def_values,
+                 num_bins=DEFAULT_NUM_BINS):
+        """ Initialize CoverageStatistics class.
+        Parameters:
+            controller_names (list(string)) -- Names of the controller attributes
+            group_names (list(string))      -- Names of the controller groups, in group index order
+            group_indices (ndarray)         -- Group index per controller, see pose_sampler.get_group_indices
+            min_values (ndarray)            -- Minimum value per controller
+            max_values (ndarray)            -- Maximum value per controller
+            def_values (ndarray)            -- Default value per controller
+            num_bins (int)                  -- Number of histogram bins per controller
+        """
+        self.controller_names = list(controller_names)
+        self.group_names = list(group_names)
+        self.group_indices = np.asarray(group_indices)
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        self.def_values = np.asarray(def_values, dtype=np.float64)
+        self.num_bins = num_bins
+
+        num_controllers = len(self.controller_names)
+        num_groups = len(self.group_names)
+        self.num_poses = 0
+        self.histograms = np.zeros((num_controllers, num_bins), dtype=np.int64)
+        self.min_hits = np.zeros(num_controllers, dtype=np.int64)
+        self.max_hits = np.zeros(num_controllers, dtype=np.int64)
+        self.default_hits = np.zeros(num_controllers, dtype=np.int64)
+        self.group_cooccurrence = np.zeros((num_groups, num_groups), dtype=np.int64)
+
+    def add_poses(self, poses):
+        """Add generated poses to the statistics.
+        Parameters:
+            poses (ndarray) -- Vector of controller values, or matrix (num_poses x num_controllers)
+        """
+        poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+        if poses.shape[0] == 0:
+            return
+        self.num_poses += poses.shape[0]
+
+        bins = get_bins(normalize_poses(poses, self.min_values, self.max_values), self.num_bins)
+        controllers = np.broadcast_to(np.arange(bins.shape[1]), bins.shape)
+        np.add.at(self.histograms, (controllers, bins), 1)
+        self.min_hits += np.count_nonzero(poses <= self.min_values, axis=0)
+        self.max_hits += np.count_nonzero(poses >= self.max_values, axis=0)
+        self.default_hits += np.count_nonzero(poses == self.def_values, axis=0)
+
+        group_active = get_active_group_mask(poses, self.group_indices, len(self.group_names), self.def_values)
+        group_active = group_active.astype(np.int64)
+        self.group_cooccurrence += np.dot(group_active.T, group_active)
+
+    def to_json_data(self):
+        """Get the statistics as json serializable dict.
+        The diagonal of the co-occurrence matrix is the number of poses a group is active in.
+        """
+        controllers = []
+        for index, controller_name in enumerate(self.controller_names):
+            controllers.append({
+                'name': controller_name,
+                'min_value': float(self.min_values[index]),
+                'max_value': float(self.max_values[index]),
+                'histogram': self.histograms[index].tolist(),
+                'occupied_bins': int(np.count_nonzero(self.histograms[index])),
+                'num_min_hits': int(self.min_hits[index]),
+                'num_max_hits': int(self.max_hits[index]),
+                'num_default': int(self.default_hits[index])})
+        return {
+            'num_poses': self.num_poses,
+            'num_bins': self.num_bins,
+            'controllers': controllers,
+            'group_names': self.group_names,
+            'group_cooccurrence': self.group_cooccurrence.tolist()}
+
+    def save_to_file(self, file_path):
+        json_string = json.dumps(self.to_json_data(), sort_keys=True, indent=4)
+        with open(file_path, 'wt') as writeFile:
+            writeFile.writelines(json_string)
+
+    def save_arrays_to_file(self, file_path):
+        np.savez_compressed(file_path, controller_names=np.array(self.controller_names),
+                            group_names=np.array(self.group_names), histograms=self.histograms,
+                            min_hits=self.min_hits, max_hits=self.max_hits, default_hits=self.default_hits,
+                            group_cooccurrence=self.group_cooccurrence)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module maps points in the unit cube to controller values with a distribution per controller.
+The controllers are grouped by distribution type and every type transforms all of its columns at once,
+so mixing distributions costs about the same as sampling all controllers uniformly.
+Every distribution is an inverse cdf of the unit values, so quasi-random unit samples keep their spread.
+
+The distribution parameters per type are:
+    uniform      -- none, values are uniform in [min, max]
+    normal       -- [mean, standard deviation], truncated to [min, max], defaults to the default value and a quarter
+                    of the range
+    beta         -- [alpha, beta] over [min, max], defaults to [2, 2]
+    discrete     -- the allowed values, clipped to [min, max], defaults to the integers in [min, max]
+    log_uniform  -- [offset], values are log-uniform in [min + offset, max + offset] shifted back by the offset,
+                    which concentrates them near the minimum, defaults to 1% of the range
+"""
+
+import math
+
+import numpy as np
+
+DISTRIBUTION_UNIFORM = 0
+DISTRIBUTION_NORMAL = 1
+DISTRIBUTION_BETA = 2
+DISTRIBUTION_DISCRETE = 3
+DISTRIBUTION_LOG_UNIFORM = 4
+
+# Coefficients of the rational approximations of the inverse normal cdf by Peter J. Acklam,
+# the relative error is below 1.15e-9.
+_ACKLAM_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+             -3.066479806614716e+01, 2.506628277459239e+00)
+_ACKLAM_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+             -1.328068155288572e+01)
+_ACKLAM_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+             4.374664141464968e+00, 2.938163982698783e+00)
+_ACKLAM_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+_ACKLAM_LOW = 0.02425
+
+
+def normal_cdf(values):
+    """Cumulative distribution function of the standard normal distribution."""
+    erf = np.vectorize(math.erf, otypes=[np.float64])
+    return 0.5 * (1.0 + erf(np.asarray(values, dtype=np.float64) / math.sqrt(2.0)))
+
+
+def normal_ppf(probabilities):
+    """Inverse cumulative distribution function of the standard normal distribution.
+    Parameters:
+        probabilities (ndarray) -- Probabilities in (0, 1)
+    Return:
+        Array (ndarray) of standard normal values of the same shape
+    """
+    p = np.clip(np.asarray(probabilities, dtype=np.float64), 1e-15, 1.0 - 1e-15)
+    a, b, c, d = _ACKLAM_A, _ACKLAM_B, _ACKLAM_C, _ACKLAM_D
+
+    # Central region.
+    q = p - 0.5
+    r = q * q
+    result = ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q /
+              (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1.0))
+
+    # Tails, mirrored for the upper one.
+    tail = np.minimum(p, 1.0 - p) < _ACKLAM_LOW
+    if np.any(tail):
+        tail_p = np.minimum(p[tail], 1.0 - p[tail])
+        q = np.sqrt(-2.0 * np.log(tail_p))
+        tail_values = ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) /
+                       ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1.0))
+        result[tail] = np.where(p[tail] < 0.5, tail_values, -tail_values)
+    return result
+
+
+# Number of points of the tabulated beta cdf, spaced densely near 0 and 1 where the density can be unbounded.
+BETA_TABLE_SIZE = 4097
+MAX_CONTINUED_FRACTION_ITERATIONS = 300
+
+
+def incomplete_beta_fraction(x, a, b):
+    """Evaluate the continued fraction of the regularized incomplete beta function with the modified Lentz method."""
+    tiny = 1e-300
+    c = np.ones_like(x)
+    d = 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / np.where(np.abs(d) < tiny, tiny, d)
+    result = d.copy()
+    for m in range(1, MAX_CONTINUED_FRACTION_ITERATIONS + 1):
+        for numerator in (m * (b - m) * x / ((a + 2.0 * m - 1.0) * (a + 2.0 * m)),
+                          -(a + m) * (a + b + m) * x / ((a + 2.0 * m) * (a + 2.0 * m + 1.0))):
+            d = 1.0 + numerator * d
+            d = 1.0 / np.where(np.abs(d) < tiny, tiny, d)
+            c = 1.0 + numerator / c
+            c = np.where(np.abs(c) < tiny, tiny, c)
+            delta = c * d
+            result *= delta
+        if np.all(np.abs(delta - 1.0) < 1e-15):
+            break
+    return result
+
+
+def beta_cdf(x, a, b):
+    """Regularized incomplete beta function, the cdf of the beta distribution.
+    Parameters:
+        x (ndarray) -- Values in [0, 1]
+        a (float)   -- Alpha parameter
+        b (float)   -- Beta parameter
+    Return:
+        Array (ndarray) of probabilities of the same shape
+    """
+    x = np.clip(np.asarray(x, dtype=np.float64), 0.0, 1.0)
+    inner = (x > 0.0) & (x < 1.0)
+    xi = np.where(inner, x, 0.5)
+    log_front = (math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * np.log(xi) + b * np.log1p(-xi))
+    # The fraction converges quickly below the mean, above it the symmetry I(x, a, b) = 1 - I(1 - x, b, a) is used.
+    lower = xi < (a + 1.0) / (a + b + 2.0)
+    lower_cdf = np.exp(log_front) * incomplete_beta_fraction(xi, a, b) / a
+    upper_cdf = 1.0 - np.exp(log_front) * incomplete_beta_fraction(1.0 - xi, b, a) / b
+    cdf = np.where(lower, lower_cdf, upper_cdf)
+    return np.clip(np.where(inner, cdf, x), 0.0, 1.0)
+
+
+def get_beta_inverse_cdf_table(a, b, num_points=BETA_TABLE_SIZE):
+    """Tabulate the beta cdf, so the inverse cdf is a linear interpolation.
+    Return:
+        Vectors of increasing probabilities and their values in [0, 1]
+    """
+    values = 0.5 - 0.5 * np.cos(np.linspace(0.0, np.pi, num_points))
+    return np.maximum.accumulate(beta_cdf(values, a, b)), values
+
+
+def get_param(params, index, default):
+    return float(params[index]) if params is not None and len(params) > index else default
+
+
+class ControllerDistributions(object):
+    """Transforms unit cube points to controller values, with a distribution per controller."""
+
+    def __init__(self, distribution_types, distribution_params, min_values, max_values, def_values):
+        """ Initialize ControllerDistributions class.
+        Parameters:
+            distribution_types (list(int))     -- One of the DISTRIBUTION_* values per controller
+            distribution_params (list(list))   -- Distribution parameters per controller, empty for the defaults
+            min_values (ndarray)               -- Minimum value per controller
+            max_values (ndarray)               -- Maximum value per controller
+            def_values (ndarray)               -- Default value per controller
+        """
+        self.distribution_types = np.asarray(distribution_types, dtype=np.int64)
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        value_range = self.max_values - self.min_values
+
+        self.uniform_columns = np.nonzero(self.distribution_types == DISTRIBUTION_UNIFORM)[0]
+
+        # Truncated normal distributions, the unit values are mapped into the cdf range of the bounds.
+        self.normal_columns = np.nonzero(self.distribution_types == DISTRIBUTION_NORMAL)[0]
+        self.normal_means = np.array([get_param(distribution_params[i], 0, def_values[i])
+                                      for i in self.normal_columns])
+        self.normal_deviations = np.array([max(get_param(distribution_params[i], 1, 0.25 * value_range[i]), 1e-12)
+                                           for i in self.normal_columns])
+        self.normal_cdf_min = normal_cdf((self.min_values[self.normal_columns] - self.normal_means) /
+                                         self.normal_deviations)
+        self.normal_cdf_max = normal_cdf((self.max_values[self.normal_columns] - self.normal_means) /
+                                         self.normal_deviations)
+
+        self.beta_columns = np.nonzero(self.distribution_types == DISTRIBUTION_BETA)[0]
+        self.beta_alphas = np.array([get_param(distribution_params[i], 0, 2.0) for i in self.beta_columns])
+        self.beta_betas = np.array([get_param(distribution_params[i], 1, 2.0) for i in self.beta_columns])
+        # Columns with the same parameters share a table and are transformed together.
+        self.beta_groups = []
+        if len(self.beta_columns) > 0:
+            parameters, group_ids = np.unique(np.stack((self.beta_alphas, self.beta_betas), axis=1), axis=0,
+                                              return_inverse=True)
+            for group_id, (alpha, beta) in enumerate(parameters):
+                probabilities, fractions = get_beta_inverse_cdf_table(alpha, beta)
+                self.beta_groups.append((self.beta_columns[group_ids.ravel() == group_id], probabilities, fractions))
+
+        # Discrete values are stored in a padded (columns x max values) matrix.
+        self.discrete_columns = np.nonzero(self.distribution_types == DISTRIBUTION_DISCRETE)[0]
+        discrete_values = []
+        for i in self.discrete_columns:
+            values = distribution_params[i]
+            if not values:
+                values = np.arange(math.ceil(self.min_values[i]), math.floor(self.max_values[i]) + 1)
+            values = np.asarray(values if len(values) > 0 else [def_values[i]], dtype=np.float64)
+            discrete_values.append(np.clip(values, self.min_values[i], self.max_values[i]))
+        self.discrete_counts = np.array([len(values) for values in discrete_values], dtype=np.int64)
+        self.discrete_values = np.zeros((len(discrete_values), max([0] + list(self.discrete_counts))))
+        for row, values in enumerate(discrete_values):
+            self.discrete_values[row, :len(values)] = values
+
+        self.log_uniform_columns = np.nonzero(self.distribution_types == DISTRIBUTION_LOG_UNIFORM)[0]
+        self.log_offsets = np.array([max(get_param(distribution_params[i], 0, 0.01 * value_range[i]), 1e-12)
+                                     for i in self.log_uniform_columns])
+
+    def is_uniform(self):
+        return len(self.uniform_columns) == len(self.distribution_types)
+
+    def transform(self, unit_samples):
+        """Transform points in the unit cube to controller values.
+        Parameters:
+            unit_samples (ndarray) -- Matrix (num_samples x num_controllers) of points in [0, 1)
+        Return:
+            Matrix (num_samples x num_controllers) of controller values
+        """
+        values = self.min_values + (self.max_values - self.min_values) * unit_samples
+
+        columns = self.normal_columns
+        if len(columns) > 0:
+            probabilities = self.normal_cdf_min + (self.normal_cdf_max - self.normal_cdf_min) * unit_samples[:, columns]
+            values[:, columns] = np.clip(self.normal_means + self.normal_deviations * normal_ppf(probabilities),
+                                         self.min_values[columns], self.max_values[columns])
+
+        for columns, probabilities, fractions in self.beta_groups:
+            values[:, columns] = self.min_values[columns] + (self.max_values[columns] - self.min_values[columns]) * \
+                np.interp(unit_samples[:, columns], probabilities, fractions)
+
+        columns = self.discrete_columns
+        if len(columns) > 0:
+            indices = np.minimum((unit_samples[:, columns] * self.discrete_counts).astype(np.int64),
+                                 self.discrete_counts - 1)
+            values[:, columns] = self.discrete_values[np.arange(len(columns)), indices]
+
+        columns = self.log_uniform_columns
+        if len(columns) > 0:
+            log_min = np.log(self.log_offsets)
+            log_max = np.log(self.max_values[columns] - self.min_values[columns] + self.log_offsets)
+            values[:, columns] = self.min_values[columns] - self.log_offsets + np.exp(
+                log_min + (log_max - log_min) * unit_samples[:, columns])
+
+        return values
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module decides when enough poses are generated.
+Poses are generated in chunks and the coverage of all poses so far is measured after every chunk,
+the generation stops once a chunk improves the coverage by less than a threshold.
+"""
+
+import json
+
+# Name of the file the stopping curve is written to, next to the generated outputs.
+STOPPING_CURVE_FILE_NAME = 'StoppingCurve.json'
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MIN_IMPROVEMENT = 0.002
+
+
+class CoverageStoppingCriterion(object):
+    """Tracks the coverage per chunk of generated poses and stops when it no longer improves."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, min_improvement=DEFAULT_MIN_IMPROVEMENT, min_chunks=2):
+        """ Initialize CoverageStoppingCriterion class.
+        Parameters:
+            chunk_size (int)         -- Number of poses per chunk
+            min_improvement (float)  -- Minimum coverage improvement of a chunk to continue
+            min_chunks (int)         -- Number of chunks generated before stopping is considered
+        """
+        self.chunk_size = max(1, chunk_size)
+        self.min_improvement = min_improvement
+        self.min_chunks = max(1, min_chunks)
+        self.curve = []
+        self.stopped = False
+
+    def is_chunk_end(self, num_poses):
+        return num_poses > 0 and num_poses % self.chunk_size == 0
+
+    def update_coverage(self, coverage, num_poses):
+        """Decide whether to stop from the coverage of the poses generated so far.
+        Parameters:
+            coverage (dict)  -- Coverage of the poses generated so far, see CoverageAccumulator.get_coverage
+            num_poses (int)  -- Number of poses generated so far
+        Return:
+            True when the last chunk improved the coverage by less than the minimum improvement
+        """
+        improvement = coverage['score'] - self.curve[-1]['score'] if self.curve else coverage['score']
+        self.curve.append({
+            'num_poses': num_poses,
+            'score': coverage['score'],
+            'marginal': coverage['marginal'],
+            'pairwise': coverage['pairwise'],
+            'improvement': improvement})
+        print('[MLDeformer] Coverage after {} poses: {:.4f} (+{:.4f})'.format(
+            num_poses, coverage['score'], improvement))
+        self.stopped = len(self.curve) >= self.min_chunks and improvement < self.min_improvement
+        return self.stopped
+
+    def set_state(self, json_data):
+        """Continue from the curve of an earlier run, see to_json_data."""
+        self.curve = list(json_data['curve'])
+        self.stopped = json_data['stopped']
+
+    def to_json_data(self):
+        return {
+            'chunk_size': self.chunk_size,
+            'min_improvement': self.min_improvement,
+            'stopped': self.stopped,
+            'curve': self.curve}
+
+    def save_to_file(self, file_path):
+        json_string = json.dumps(self.to_json_data(), sort_keys=True, indent=4)
+        with open(file_path, 'wt') as writeFile:
+            writeFile.writelines(json_string)
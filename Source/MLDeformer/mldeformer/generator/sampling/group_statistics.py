@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module tracks how often poses are rejected per controller group and adapts the group activation
+probabilities to it, so groups that nearly always collide are tested less often.
+"""
+
+import json
+
+import numpy as np
+
+# Name of the file the statistics are written to, next to the generated outputs.
+GROUP_STATISTICS_FILE_NAME = 'GroupStatistics.json'
+
+
+def get_active_group_mask(poses, group_indices, num_groups, def_values):
+    """Get the groups that are active in a batch of poses, a group is active when any of its controllers
+    differs from its default value.
+    Parameters:
+        poses (ndarray)          -- Matrix (num_poses x num_controllers) of controller values
+        group_indices (ndarray)  -- Group index per controller, see pose_sampler.get_group_indices
+        num_groups (int)         -- Number of controller groups
+        def_values (ndarray)     -- Vector of default controller values
+    Return:
+        Boolean matrix (num_poses x num_groups) of active groups
+    """
+    poses = np.atleast_2d(poses)
+    changed = (poses != def_values) & (group_indices >= 0)
+    group_active = np.zeros((poses.shape[0], num_groups), dtype=bool)
+    rows, columns = np.nonzero(changed)
+    group_active[rows, group_indices[columns]] = True
+    return group_active
+
+
+class GroupRejectionStatistics(object):
+    """Counts the tested and rejected poses per controller group."""
+
+    def __init__(self, group_names, base_prob, min_prob=0.05, max_prob=0.95, min_observations=20):
+        """ Initialize GroupRejectionStatistics class.
+        Parameters:
+            group_names (list(string)) -- Names of the controller groups, in group index order
+            base_prob (float)          -- Activation probability of a group without rejections
+            min_prob (float)           -- Lower bound of the adapted probabilities
+            max_prob (float)           -- Upper bound of the adapted probabilities
+            min_observations (int)     -- Number of tests of a group before its probability is adapted
+        """
+        self.group_names = list(group_names)
+        self.base_prob = base_prob
+        self.min_prob = min_prob
+        self.max_prob = max_prob
+        self.min_observations = min_observations
+        self.num_tested = np.zeros(len(self.group_names), dtype=np.int64)
+        self.num_rejected = np.zeros(len(self.group_names), dtype=np.int64)
+        self.num_poses_tested = 0
+        self.num_poses_rejected = 0
+
+    def record(self, group_active, rejected):
+        """Record the result of a pose test.
+        Parameters:
+            group_active (ndarray) -- Boolean vector of the groups active in the pose
+            rejected (bool)        -- Whether the pose failed the test
+        """
+        self.num_tested += group_active
+        self.num_poses_tested += 1
+        if rejected:
+            self.num_rejected += group_active
+            self.num_poses_rejected += 1
+
+    def get_rejection_rates(self):
+        """Get the fraction of rejected poses per group.
+        Return:
+            Vector (ndarray) of rejection rates, 0 for groups that were never tested
+        """
+        return self.num_rejected / np.maximum(1, self.num_tested).astype(np.float64)
+
+    def get_adapted_probabilities(self):
+        """Get activation probabilities that scale the base probability by how much less often a group is
+        rejected than the average pose, clipped to the bounds.
+        Groups with too few observations keep the base probability.
+        Return:
+            Vector (ndarray) of activation probabilities per group
+        """
+        overall_acceptance = 1.0 - self.num_poses_rejected / float(max(1, self.num_poses_tested))
+        acceptance = 1.0 - self.get_rejection_rates()
+        probabilities = self.base_prob * acceptance / max(overall_acceptance, 1e-6)
+        probabilities = np.clip(probabilities, self.min_prob, self.max_prob)
+        return np.where(self.num_tested >= self.min_observations, probabilities, self.base_prob)
+
+    def get_state(self):
+        return {
+            'num_tested': self.num_tested.tolist(),
+            'num_rejected': self.num_rejected.tolist(),
+            'num_poses_tested': self.num_poses_tested,
+            'num_poses_rejected': self.num_poses_rejected}
+
+    def set_state(self, state):
+        self.num_tested = np.array(state['num_tested'], dtype=np.int64)
+        self.num_rejected = np.array(state['num_rejected'], dtype=np.int64)
+        self.num_poses_tested = state['num_poses_tested']
+        self.num_poses_rejected = state['num_poses_rejected']
+
+    def to_json_data(self, probabilities=None):
+        """Get the statistics as json serializable dict.
+        Parameters:
+            probabilities (ndarray) -- Activation probabilities used at the end of the generation, if adapted
+        """
+        rejection_rates = self.get_rejection_rates()
+        groups = []
+        for index, group_name in enumerate(self.group_names):
+            group = {
+                'group_name': group_name,
+                'num_tested': int(self.num_tested[index]),
+                'num_rejected': int(self.num_rejected[index]),
+                'rejection_rate': float(rejection_rates[index])}
+            if probabilities is not None:
+                group['activation_probability'] = float(np.broadcast_to(probabilities, self.num_tested.shape)[index])
+            groups.append(group)
+        return {
+            'num_poses_tested': self.num_poses_tested,
+            'num_poses_rejected': self.num_poses_rejected,
+            'base_probability': self.base_prob,
+            'groups': groups}
+
+    def save_to_file(self, file_path, probabilities=None):
+        json_string = json.dumps(self.to_json_data(probabilities), sort_keys=True, indent=4)
+        with open(file_path, 'wt') as writeFile:
+            writeFile.writelines(json_string)
+
+    def print_worst_groups(self, num_groups=5):
+        rejection_rates = self.get_rejection_rates()
+        for index in np.argsort(rejection_rates)[::-1][:num_groups]:
+            if self.num_rejected[index] == 0:
+                break
+            print('[MLDeformer]     {}: {} of {} poses rejected'.format(
+                self.group_names[index], self.num_rejected[index], self.num_tested[index]))
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module applies declarative constraints between controllers to whole batches of sampled poses.
+The constraints are compiled once into index and threshold arrays, after which a batch is fixed or filtered
+with a few array operations, before any scene evaluation happens.
+
+Every constraint is a dict with a 'type' and controller names, the parameter display names:
+    conditional -- {'type': 'conditional', 'target': name, 'driver': name, 'operator': '>', 'value': 0.5,
+                    'action': 'fix'}
+                   The target may only differ from its default when 'driver operator value' holds.
+                   The operator is one of <, <=, >, >=, ==, !=. With the 'fix' action the target is reset to its
+                   default, with the 'filter' action the pose is rejected.
+    coupled     -- {'type': 'coupled', 'source': name, 'target': name, 'scale': 1.0, 'offset': 0.0}
+                   The target is set to scale * source + offset, clipped to its range.
+                   Use it to mirror left and right pairs, with a scale of -1 for mirrored translations.
+"""
+
+import numpy as np
+
+CONSTRAINT_CONDITIONAL = 'conditional'
+CONSTRAINT_COUPLED = 'coupled'
+
+ACTION_FIX = 'fix'
+ACTION_FILTER = 'filter'
+
+OPERATORS = ('<', '<=', '>', '>=', '==', '!=')
+
+
+def compare(values, operator_codes, thresholds):
+    """Evaluate the comparisons of many constraints at once.
+    Parameters:
+        values (ndarray)          -- Matrix (num_poses x num_constraints) of driver values
+        operator_codes (ndarray)  -- Index in OPERATORS per constraint
+        thresholds (ndarray)      -- Value to compare with per constraint
+    Return:
+        Boolean matrix (num_poses x num_constraints) of the comparison results
+    """
+    results = np.stack((values < thresholds, values <= thresholds, values > thresholds, values >= thresholds,
+                        values == thresholds, values != thresholds))
+    return np.take_along_axis(results, operator_codes[np.newaxis, np.newaxis, :], axis=0)[0]
+
+
+class PoseConstraints(object):
+    """Compiled constraints that fix or filter batches of poses."""
+
+    def __init__(self, constraints, controller_names, def_values, min_values, max_values):
+        """ Initialize PoseConstraints class, compiling the constraints into arrays.
+        Constraints with unknown types, operators or controllers are skipped with a warning.
+        Parameters:
+            constraints (list(dict))         -- Constraint descriptions, see the module documentation
+            controller_names (list(string))  -- Names of the controller attributes
+            def_values (ndarray)             -- Default value per controller
+            min_values (ndarray)             -- Minimum value per controller
+            max_values (ndarray)             -- Maximum value per controller
+        """
+        self.num_controllers = len(controller_names)
+        self.def_values = np.asarray(def_values, dtype=np.float64)
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        columns = dict((name, column) for column, name in enumerate(controller_names))
+
+        conditionals = []
+        couplings = []
+        for constraint in constraints:
+            constraint_type = constraint.get('type')
+            try:
+                if constraint_type == CONSTRAINT_CONDITIONAL:
+                    action = constraint.get('action', ACTION_FIX)
+                    if action not in (ACTION_FIX, ACTION_FILTER):
+                        raise ValueError('unknown action {}'.format(action))
+                    conditionals.append((columns[constraint['target']], columns[constraint['driver']],
+                                         OPERATORS.index(constraint.get('operator', '>')),
+                                         float(constraint.get('value', 0.0)), action == ACTION_FILTER))
+                elif constraint_type == CONSTRAINT_COUPLED:
+                    couplings.append((columns[constraint['source']], columns[constraint['target']],
+                                      float(constraint.get('scale', 1.0)), float(constraint.get('offset', 0.0))))
+                else:
+                    raise ValueError('unknown type {}'.format(constraint_type))
+            except (KeyError, ValueError) as error:
+                print('[MLDeformer] Skipping constraint {}: {}'.format(constraint, error))
+
+        conditionals = np.array(conditionals, dtype=np.float64).reshape(-1, 5)
+        self.condition_targets = conditionals[:, 0].astype(np.int64)
+        self.condition_drivers = conditionals[:, 1].astype(np.int64)
+        self.condition_operators = conditionals[:, 2].astype(np.int64)
+        self.condition_thresholds = conditionals[:, 3]
+        self.condition_filters = conditionals[:, 4].astype(bool)
+        # Maps violated constraints (num_constraints) to the controllers they reset.
+        self.condition_resets = np.zeros((len(conditionals), self.num_controllers), dtype=bool)
+        self.condition_resets[np.arange(len(conditionals)), self.condition_targets] = True
+
+        couplings = np.array(couplings, dtype=np.float64).reshape(-1, 4)
+        self.coupling_sources = couplings[:, 0].astype(np.int64)
+        self.coupling_targets = couplings[:, 1].astype(np.int64)
+        self.coupling_scales = couplings[:, 2]
+        self.coupling_offsets = couplings[:, 3]
+
+        self.num_fixed = 0
+        self.num_filtered = 0
+
+    def __len__(self):
+        return len(self.condition_targets) + len(self.coupling_targets)
+
+    def get_coupled_values(self, poses):
+        """Get the values of the coupled targets, scale * source + offset clipped to the target ranges."""
+        coupled = self.coupling_scales * poses[:, self.coupling_sources] + self.coupling_offsets
+        return np.clip(coupled, self.min_values[self.coupling_targets], self.max_values[self.coupling_targets])
+
+    def apply(self, poses, fix_filters=False):
+        """Fix the poses that violate fix constraints and find the ones that violate filter constraints.
+        Coupled targets are set first, so conditions can use and reset them. A coupled target whose source is reset
+        by a condition is coupled again, so it follows its source back to the default.
+        Parameters:
+            poses (ndarray)     -- Matrix (num_poses x num_controllers) of controller values
+            fix_filters (bool)  -- Also fix the violated filter constraints instead of rejecting the poses
+        Return:
+            The fixed poses and a boolean vector of the poses that pass the filter constraints
+        """
+        poses = np.array(poses, dtype=np.float64, copy=True)
+        valid = np.ones(poses.shape[0], dtype=bool)
+
+        if len(self.coupling_targets) > 0:
+            poses[:, self.coupling_targets] = self.get_coupled_values(poses)
+
+        if len(self.condition_targets) > 0:
+            holds = compare(poses[:, self.condition_drivers], self.condition_operators, self.condition_thresholds)
+            violated = ~holds & (poses[:, self.condition_targets] != self.def_values[self.condition_targets])
+            fixed = violated if fix_filters else violated & ~self.condition_filters
+            reset = np.dot(fixed.astype(np.int64), self.condition_resets.astype(np.int64)) > 0
+            poses = np.where(reset, self.def_values, poses)
+            if len(self.coupling_targets) > 0:
+                source_reset = reset[:, self.coupling_sources]
+                poses[:, self.coupling_targets] = np.where(source_reset, self.get_coupled_values(poses),
+                                                           poses[:, self.coupling_targets])
+            if not fix_filters:
+                valid = ~np.any(violated & self.condition_filters, axis=1)
+            self.num_fixed += np.count_nonzero(np.any(reset, axis=1))
+
+        self.num_filtered += poses.shape[0] - np.count_nonzero(valid)
+        return poses, valid
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module keeps a spatial index of accepted poses to reject near-duplicate poses (Poisson-disk sampling).
+Poses are projected onto a few orthonormal directions and hashed into a grid with the rejection radius as cell size.
+A projection never increases distances, so every pose within the radius is found in the neighbouring cells and only
+those candidates are compared with the exact distance. When the neighbouring cells hold a large part of the poses,
+which happens for radii close to the spread of the poses, all poses are compared in a single vectorized pass instead.
+"""
+
+import itertools
+
+import numpy as np
+
+# Number of dimensions of the hashed projection, the neighbourhood has 3^n cells.
+DEFAULT_PROJECTION_DIMENSIONS = 4
+
+# Fraction of the poses in the neighbouring cells above which all poses are compared at once.
+BRUTE_FORCE_FRACTION = 0.25
+
+
+class PoseDistanceIndex(object):
+    """Grid hash over normalized poses that answers whether a pose is within a radius of an accepted pose."""
+
+    def __init__(self, num_dimensions, radius, projection_dimensions=DEFAULT_PROJECTION_DIMENSIONS, random_seed=0):
+        """ Initialize PoseDistanceIndex class.
+        Parameters:
+            num_dimensions (int)         -- Number of values per pose
+            radius (float)               -- Minimum distance between accepted poses
+            projection_dimensions (int)  -- Number of dimensions of the hashed projection
+            random_seed (int)            -- Seed of the random projection
+        """
+        self.num_dimensions = num_dimensions
+        self.radius = float(radius)
+        self.projection_dimensions = max(1, min(projection_dimensions, num_dimensions))
+
+        # Random orthonormal projection.
+        rng = np.random.default_rng(random_seed)
+        gaussian = rng.standard_normal((num_dimensions, self.projection_dimensions))
+        self.projection, _ = np.linalg.qr(gaussian)
+
+        self.neighbour_offsets = np.array(list(itertools.product((-1, 0, 1), repeat=self.projection_dimensions)),
+                                          dtype=np.int64)
+        self.cells = {}
+        self.points = np.zeros((1024, num_dimensions), dtype=np.float64)
+        self.squared_norms = np.zeros(1024, dtype=np.float64)
+        self.num_points = 0
+
+    def __len__(self):
+        return self.num_points
+
+    def get_cell(self, point):
+        return np.floor(np.dot(point, self.projection) / self.radius).astype(np.int64)
+
+    def get_neighbours(self, points):
+        """Get the indices of the accepted poses in the cells around a batch of poses.
+        Parameters:
+            points (ndarray) -- Matrix (num_poses x num_dimensions) of normalized poses
+        Return:
+            List of lists of pose indices, one list per occupied cell, every cell is listed once
+        """
+        cells = np.floor(np.dot(points, self.projection) / self.radius).astype(np.int64)
+        neighbour_cells = (cells[:, np.newaxis, :] + self.neighbour_offsets).reshape(-1, self.projection_dimensions)
+        if len(points) > 1:
+            neighbour_cells = np.unique(neighbour_cells, axis=0)
+        neighbours = []
+        for neighbour_cell in neighbour_cells.tolist():
+            indices = self.cells.get(tuple(neighbour_cell))
+            if indices:
+                neighbours.append(indices)
+        return neighbours
+
+    def are_far_enough(self, points):
+        """Check for a batch of poses whether each is at least the radius away from all accepted poses.
+        The neighbouring cells of the whole batch are looked up once, and the batch is compared with the poses in
+        them in a single distance matrix.
+        Parameters:
+            points (ndarray) -- Matrix (num_poses x num_dimensions) of normalized poses
+        Return:
+            Boolean vector (num_poses), True for the poses without an accepted pose closer than the radius
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        far_enough = np.ones(len(points), dtype=bool)
+        if self.num_points == 0 or len(points) == 0:
+            return far_enough
+        squared_radius = self.radius * self.radius
+        neighbours = self.get_neighbours(points)
+        num_neighbours = sum(len(indices) for indices in neighbours)
+        if num_neighbours == 0:
+            return far_enough
+
+        if num_neighbours > BRUTE_FORCE_FRACTION * self.num_points:
+            candidates = np.arange(self.num_points)
+        else:
+            candidates = np.concatenate(neighbours) if len(neighbours) > 1 else np.asarray(neighbours[0])
+        # Expanded squared distances of the batch to the candidates, the close pairs are confirmed with the exact
+        # distance, since the expansion loses precision for nearby poses.
+        squared_distances = (self.squared_norms[candidates] - 2.0 * np.dot(points, self.points[candidates].T) +
+                             np.sum(points * points, axis=1)[:, np.newaxis])
+        rows, columns = np.nonzero(squared_distances < squared_radius + 1e-9)
+        if len(rows) == 0:
+            return far_enough
+        exact_squared_distances = np.sum((points[rows] - self.points[candidates[columns]]) ** 2, axis=1)
+        far_enough[rows[exact_squared_distances < squared_radius]] = False
+        return far_enough
+
+    def is_far_enough(self, point):
+        """Check whether a pose is at least the radius away from all accepted poses.
+        Parameters:
+            point (ndarray) -- Normalized pose
+        Return:
+            True when no accepted pose is closer than the radius
+        """
+        return bool(self.are_far_enough(point)[0])
+
+    def add(self, point):
+        """Add an accepted pose to the index.
+        Parameters:
+            point (ndarray) -- Normalized pose
+        """
+        if self.num_points == len(self.points):
+            grown_points = np.zeros((2 * len(self.points), self.num_dimensions), dtype=np.float64)
+            grown_points[:self.num_points] = self.points
+            self.points = grown_points
+            self.squared_norms = np.concatenate((self.squared_norms, np.zeros_like(self.squared_norms)))
+        self.points[self.num_points] = point
+        self.squared_norms[self.num_points] = np.dot(point, point)
+        self.cells.setdefault(tuple(self.get_cell(point).tolist()), []).append(self.num_points)
+        self.num_points += 1
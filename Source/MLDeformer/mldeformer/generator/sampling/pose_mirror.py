@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module mirrors poses of symmetric characters.
+Every controller is mapped to its counterpart on the other side, found by swapping name patterns like _l_ and _r_
+or from an explicit table of pairs. Controllers without a counterpart mirror onto themselves.
+Channels listed as negated, by default the ones that flip when mirroring across the YZ plane, change sign.
+"""
+
+import numpy as np
+
+DEFAULT_MIRROR_PATTERNS = [['_l_', '_r_'], ['_L_', '_R_']]
+DEFAULT_NEGATED_CHANNELS = ['translateX', 'rotateY', 'rotateZ']
+
+
+def get_mirror_name(name, patterns=DEFAULT_MIRROR_PATTERNS):
+    """Get the name of the counterpart of a controller by swapping the first side pattern found in its node name.
+    Parameters:
+        name (string)              -- Controller name, as node.attribute
+        patterns (list(list(str))) -- Pairs of left and right name patterns
+    Return:
+        The mirrored name, or None when the node name has no side pattern
+    """
+    node, _, attr = name.rpartition('.')
+    for left, right in patterns:
+        if left in node:
+            return node.replace(left, right, 1) + '.' + attr
+        if right in node:
+            return node.replace(right, left, 1) + '.' + attr
+    return None
+
+
+class PoseMirror(object):
+    """Maps poses to their mirror image with a column permutation and sign flips."""
+
+    def __init__(self, controller_names, min_values, max_values, pairs=None, patterns=DEFAULT_MIRROR_PATTERNS,
+                 negated_channels=DEFAULT_NEGATED_CHANNELS):
+        """ Initialize PoseMirror class.
+        Parameters:
+            controller_names (list(string))  -- Names of the controller attributes, as node.attribute
+            min_values (ndarray)             -- Minimum value per controller, mirrored values are clipped to it
+            max_values (ndarray)             -- Maximum value per controller
+            pairs (list(list(string)))       -- Explicit pairs of controller names, used instead of the patterns
+            patterns (list(list(string)))    -- Pairs of left and right node name patterns
+            negated_channels (list(string))  -- Attributes that change sign when mirrored
+        """
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        columns = dict((name, column) for column, name in enumerate(controller_names))
+
+        self.mirror_columns = np.arange(len(controller_names))
+        if pairs:
+            for left, right in pairs:
+                if left in columns and right in columns:
+                    self.mirror_columns[columns[left]] = columns[right]
+                    self.mirror_columns[columns[right]] = columns[left]
+        else:
+            for column, name in enumerate(controller_names):
+                mirror_name = get_mirror_name(name, patterns)
+                if mirror_name in columns:
+                    self.mirror_columns[column] = columns[mirror_name]
+
+        self.signs = np.array([-1.0 if name.rpartition('.')[2] in negated_channels else 1.0
+                               for name in controller_names])
+        self.num_paired = int(np.count_nonzero(self.mirror_columns != np.arange(len(controller_names))))
+
+    def mirror(self, poses):
+        """Mirror poses.
+        Parameters:
+            poses (ndarray) -- Vector of controller values, or matrix (num_poses x num_controllers)
+        Return:
+            The mirrored poses, in the shape of the input
+        """
+        poses = np.asarray(poses, dtype=np.float64)
+        mirrored = poses[..., self.mirror_columns] * self.signs
+        return np.clip(mirrored, self.min_values, self.max_values)
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module fits a prior over the controller values from existing animation and samples poses from it.
+Every controller group gets its own Gaussian mixture with diagonal covariances, fitted with expectation
+maximization on the frames where the group is active. Sampled poses mix the prior with the other sampled values
+at a configurable ratio, so uniform coverage is kept while most poses stay plausible.
+Fitted priors are cached on disk, keyed by a hash of the animation content and the fit settings.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+PRIOR_SOURCE_NONE = 0
+PRIOR_SOURCE_SCENE = 1
+PRIOR_SOURCE_FILE = 2
+
+DEFAULT_NUM_COMPONENTS = 4
+DEFAULT_NUM_ITERATIONS = 50
+
+# Minimum number of active frames of a group to fit its mixture.
+MIN_GROUP_FRAMES = 10
+
+
+def logsumexp(values, axis):
+    max_values = np.max(values, axis=axis, keepdims=True)
+    return np.squeeze(max_values, axis) + np.log(np.sum(np.exp(values - max_values), axis=axis))
+
+
+def fit_gaussian_mixture(rng, data, num_components=DEFAULT_NUM_COMPONENTS, num_iterations=DEFAULT_NUM_ITERATIONS,
+                         min_variance=1e-6):
+    """Fit a Gaussian mixture with diagonal covariances with expectation maximization.
+    Parameters:
+        rng (numpy.random.Generator) -- Random number generator that picks the initial means
+        data (ndarray)               -- Matrix (num_frames x num_dimensions) of values
+        num_components (int)         -- Number of mixture components, at most the number of frames
+        num_iterations (int)         -- Number of expectation maximization iterations
+        min_variance (float)         -- Lower bound of the variances, relative to the variance of the data
+    Return:
+        Tuple of the component weights (num_components), means and variances (num_components x num_dimensions)
+    """
+    data = np.asarray(data, dtype=np.float64)
+    num_frames = data.shape[0]
+    num_components = max(1, min(num_components, num_frames))
+    variance_floor = min_variance * np.maximum(data.var(axis=0), 1e-12) + 1e-12
+
+    weights = np.full(num_components, 1.0 / num_components)
+    means = data[rng.choice(num_frames, num_components, replace=False)]
+    variances = np.tile(data.var(axis=0) + variance_floor, (num_components, 1))
+    for _ in range(num_iterations):
+        # Expectation: log responsibilities (num_frames x num_components).
+        differences = data[:, np.newaxis, :] - means[np.newaxis]
+        log_densities = -0.5 * np.sum(differences * differences / variances + np.log(2.0 * np.pi * variances),
+                                      axis=2)
+        log_densities += np.log(np.maximum(weights, 1e-300))
+        responsibilities = np.exp(log_densities - logsumexp(log_densities, axis=1)[:, np.newaxis])
+
+        # Maximization.
+        totals = responsibilities.sum(axis=0) + 1e-12
+        weights = totals / num_frames
+        means = np.dot(responsibilities.T, data) / totals[:, np.newaxis]
+        variances = np.dot(responsibilities.T, data * data) / totals[:, np.newaxis] - means * means
+        variances = np.maximum(variances, variance_floor)
+    return weights / weights.sum(), means, variances
+
+
+def sample_gaussian_mixture(rng, num_samples, weights, means, variances):
+    """Draw samples from a Gaussian mixture with diagonal covariances.
+    Return:
+        Matrix (num_samples x num_dimensions) of samples
+    """
+    components = rng.choice(len(weights), num_samples, p=weights)
+    return means[components] + np.sqrt(variances[components]) * rng.standard_normal((num_samples, means.shape[1]))
+
+
+def get_content_hash(poses, controller_names, group_indices, def_values, num_components, random_seed):
+    """Get the hash that identifies a fitted prior, from the animation and everything the fit depends on.
+    The default values decide on which frames a group is active, so they change the fitted mixtures too.
+    """
+    content = hashlib.sha1()
+    content.update(np.ascontiguousarray(poses, dtype=np.float64).tobytes())
+    content.update('|'.join(controller_names).encode('utf-8'))
+    content.update(np.ascontiguousarray(group_indices, dtype=np.int64).tobytes())
+    content.update(np.ascontiguousarray(def_values, dtype=np.float64).tobytes())
+    content.update('{}|{}'.format(num_components, random_seed).encode('utf-8'))
+    return content.hexdigest()
+
+
+def get_cache_file_path(cache_folder, content_hash):
+    return os.path.join(cache_folder, 'PosePrior_{}.npz'.format(content_hash))
+
+
+class PosePrior(object):
+    """Per-group Gaussian mixtures over the controller values."""
+
+    def __init__(self, group_models, prior_ratio=0.5):
+        """ Initialize PosePrior class.
+        Parameters:
+            group_models (list(tuple)) -- Per modelled group the controller indices, component weights, means and
+                                          variances
+            prior_ratio (float)        -- Fraction of the sampled poses that take their values from the prior
+        """
+        self.group_models = group_models
+        self.prior_ratio = prior_ratio
+
+    @classmethod
+    def fit(cls, poses, group_indices, num_groups, def_values, num_components=DEFAULT_NUM_COMPONENTS,
+            random_seed=0, prior_ratio=0.5):
+        """Fit a mixture per group on the frames where the group is active.
+        Groups with missing values or less than MIN_GROUP_FRAMES active frames are not modelled.
+        Parameters:
+            poses (ndarray)          -- Matrix (num_frames x num_controllers) of animated values, nan when missing
+            group_indices (ndarray)  -- Group index per controller, see pose_sampler.get_group_indices
+            num_groups (int)         -- Number of controller groups
+            def_values (ndarray)     -- Default value per controller
+            num_components (int)     -- Number of mixture components per group
+            random_seed (int)        -- Seed of the initial means
+            prior_ratio (float)      -- Fraction of the sampled poses that take their values from the prior
+        """
+        rng = np.random.default_rng(random_seed)
+        poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+        group_models = []
+        for group_index in range(num_groups):
+            columns = np.nonzero(group_indices == group_index)[0]
+            group_values = poses[:, columns]
+            if len(columns) == 0 or np.any(np.isnan(group_values)):
+                continue
+            active = np.any(group_values != def_values[columns], axis=1)
+            if np.count_nonzero(active) < MIN_GROUP_FRAMES:
+                continue
+            weights, means, variances = fit_gaussian_mixture(rng, group_values[active], num_components)
+            group_models.append((columns, weights, means, variances))
+        return cls(group_models, prior_ratio)
+
+    def sample_into(self, rng, values, min_values, max_values):
+        """Replace the modelled groups of a fraction of the poses by samples of the prior.
+        Parameters:
+            rng (numpy.random.Generator) -- Random number generator
+            values (ndarray)             -- Matrix (num_samples x num_controllers) of sampled values, changed in place
+            min_values (ndarray)         -- Minimum value per controller, the samples are clipped to the ranges
+            max_values (ndarray)         -- Maximum value per controller
+        """
+        rows = np.nonzero(rng.random(values.shape[0]) < self.prior_ratio)[0]
+        if len(rows) == 0:
+            return
+        for columns, weights, means, variances in self.group_models:
+            samples = sample_gaussian_mixture(rng, len(rows), weights, means, variances)
+            values[np.ix_(rows, columns)] = np.clip(samples, min_values[columns], max_values[columns])
+
+    def save_to_file(self, file_path):
+        arrays = {'num_groups': len(self.group_models)}
+        for index, (columns, weights, means, variances) in enumerate(self.group_models):
+            arrays['columns_{}'.format(index)] = columns
+            arrays['weights_{}'.format(index)] = weights
+            arrays['means_{}'.format(index)] = means
+            arrays['variances_{}'.format(index)] = variances
+        np.savez_compressed(file_path, **arrays)
+
+    @classmethod
+    def load_from_file(cls, file_path, prior_ratio=0.5):
+        with np.load(file_path) as arrays:
+            group_models = [(arrays['columns_{}'.format(index)], arrays['weights_{}'.format(index)],
+                             arrays['means_{}'.format(index)], arrays['variances_{}'.format(index)])
+                            for index in range(int(arrays['num_groups']))]
+        return cls(group_models, prior_ratio)
+
+
+def get_pose_prior(cache_folder, poses, controller_names, group_indices, num_groups, def_values,
+                   num_components=DEFAULT_NUM_COMPONENTS, prior_ratio=0.5, random_seed=0):
+    """Load the prior of an animation from the cache, or fit and cache it.
+    Parameters:
+        cache_folder (str)              -- Folder of the cached priors, None to always fit
+        poses (ndarray)                 -- Matrix (num_frames x num_controllers) of animated values
+        controller_names (list(string)) -- Names of the controller attributes
+        group_indices (ndarray)         -- Group index per controller, see pose_sampler.get_group_indices
+        num_groups (int)                -- Number of controller groups
+        def_values (ndarray)            -- Default value per controller
+        num_components (int)            -- Number of mixture components per group
+        prior_ratio (float)             -- Fraction of the sampled poses that take their values from the prior
+        random_seed (int)               -- Seed of the mixture fit
+    Return:
+        The PosePrior
+    """
+    cache_file_path = None
+    if cache_folder:
+        content_hash = get_content_hash(poses, controller_names, group_indices, def_values, num_components,
+                                        random_seed)
+        cache_file_path = get_cache_file_path(cache_folder, content_hash)
+        if os.path.exists(cache_file_path):
+            print('[MLDeformer] Using the cached pose prior {}'.format(cache_file_path))
+            return PosePrior.load_from_file(cache_file_path, prior_ratio)
+
+    pose_prior = PosePrior.fit(poses, group_indices, num_groups, def_values, num_components, random_seed, prior_ratio)
+    print('[MLDeformer] Fitted a pose prior of {} groups on {} frames'.format(len(pose_prior.group_models),
+                                                                           len(poses)))
+    if cache_file_path:
+        if not os.path.exists(cache_folder):
+            os.makedirs(cache_folder)
+        pose_prior.save_to_file(cache_file_path)
+    return pose_prior
+
+
+def load_pose_matrix(file_path, controller_names):
+    """Load a saved pose matrix and order its columns like the controllers.
+    The file is either a .npy matrix with the controllers in order, or a .npz file with a 'poses' matrix and
+    the 'controller_names' of its columns.
+    Parameters:
+        file_path (str)                 -- Path of the .npy or .npz file
+        controller_names (list(string)) -- Names of the controller attributes
+    Return:
+        Matrix (num_frames x num_controllers) of values, nan for controllers missing from the file
+    """
+    data = np.load(file_path)
+    if not isinstance(data, np.ndarray):
+        with data:
+            file_poses = np.atleast_2d(data['poses'])
+            file_names = [str(name) for name in data['controller_names']] if 'controller_names' in data else None
+    else:
+        file_poses = np.atleast_2d(data)
+        file_names = None
+
+    if file_names is None:
+        if file_poses.shape[1] != len(controller_names):
+            raise ValueError('The pose matrix has {} columns, expected {}'.format(
+                file_poses.shape[1], len(controller_names)))
+        return file_poses.astype(np.float64)
+
+    poses = np.full((file_poses.shape[0], len(controller_names)), np.nan)
+    file_columns = dict((name, column) for column, name in enumerate(file_names))
+    for column, name in enumerate(controller_names):
+        if name in file_columns:
+            poses[:, column] = file_poses[:, file_columns[name]]
+    return poses
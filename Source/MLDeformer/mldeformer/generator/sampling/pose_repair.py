@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module repairs invalid poses by blending them toward the default pose.
+Instead of throwing a colliding pose away, the largest blend factor that passes the pose test is searched
+with a bisection, after which the groups are grown back to their sampled values one at a time.
+Controllers whose values a blend would move off their distribution, like discrete values and sampled joint
+orientations, keep their sampled values. The constraints are applied to every blended pose before it is tested,
+so a repaired pose satisfies them like any sampled pose.
+"""
+
+import numpy as np
+
+REPAIR_MODE_NONE = 0
+REPAIR_MODE_BISECT = 1
+
+# Number of bisection steps on the global blend factor.
+DEFAULT_REPAIR_ITERATIONS = 4
+
+
+def blend_pose(pose, def_values, blend_factors):
+    """Blend a pose toward the default pose.
+    Parameters:
+        pose (ndarray)           -- Vector of controller values
+        def_values (ndarray)     -- Vector of default controller values
+        blend_factors (ndarray)  -- Scalar or vector of factors, 0 gives the default and 1 the pose
+    Return:
+        Vector (ndarray) of blended controller values
+    """
+    return def_values + blend_factors * (pose - def_values)
+
+
+class PoseRepairer(object):
+    """Shrinks invalid poses toward the default pose until they pass a pose test."""
+
+    def __init__(self, def_values, group_indices, num_groups, num_iterations=DEFAULT_REPAIR_ITERATIONS,
+                 fixed_columns=None, constraints=None):
+        """ Initialize PoseRepairer class.
+        Parameters:
+            def_values (ndarray)     -- Vector of default controller values
+            group_indices (ndarray)  -- Group index per controller, see pose_sampler.get_group_indices
+            num_groups (int)         -- Number of controller groups
+            num_iterations (int)     -- Number of bisection steps on the global blend factor
+            fixed_columns (ndarray)  -- Indices of the controllers that keep their sampled values, see
+                                        PoseSampler.get_unblendable_columns
+            constraints (PoseConstraints) -- Constraints applied to the blended poses, poses they filter are invalid
+        """
+        self.def_values = np.asarray(def_values, dtype=np.float64)
+        self.group_indices = np.asarray(group_indices)
+        self.num_groups = num_groups
+        self.num_iterations = num_iterations
+        self.blended = np.ones(self.def_values.shape[0], dtype=bool)
+        if fixed_columns is not None:
+            self.blended[np.asarray(fixed_columns, dtype=np.int64)] = False
+        self.constraints = constraints
+
+        self.num_repaired = 0
+        self.num_failed = 0
+        self.num_tests = 0
+        self.blend_factor_sum = 0.0
+
+    def get_candidate(self, pose, blend_factors):
+        """Blend the controllers that may be blended and apply the constraints.
+        Return:
+            The candidate pose, or None when the constraints filter it
+        """
+        factors = np.where(self.blended, blend_factors, 1.0)
+        candidate = blend_pose(pose, self.def_values, factors)
+        if self.constraints is None:
+            return candidate
+        candidates, valid = self.constraints.apply(candidate[np.newaxis])
+        return candidates[0] if valid[0] else None
+
+    def test_candidate(self, pose, blend_factors, is_valid):
+        """Get the candidate pose of the blend factors when it passes the constraints and the pose test, else None.
+        """
+        candidate = self.get_candidate(pose, blend_factors)
+        if candidate is None:
+            return None
+        self.num_tests += 1
+        return candidate if is_valid(candidate) else None
+
+    def repair(self, pose, is_valid):
+        """Find the closest valid pose between the default pose and an invalid pose.
+        The global blend factor is bisected first, then every changed group is grown back to its sampled values
+        when the pose stays valid. The returned pose is always one that passed the pose test.
+        Parameters:
+            pose (ndarray)       -- Vector of controller values that failed the pose test
+            is_valid (function)  -- Pose test, takes a vector of controller values and returns a bool
+        Return:
+            The repaired pose, or None when no valid pose with any sampled change was found
+        """
+        pose = np.asarray(pose, dtype=np.float64)
+        if not np.any(self.blended & (pose != self.def_values)):
+            self.num_failed += 1
+            return None
+
+        # The pose itself is known to be invalid.
+        repaired_pose = None
+        valid_factor = 0.0
+        invalid_factor = 1.0
+        for _ in range(self.num_iterations):
+            factor = 0.5 * (valid_factor + invalid_factor)
+            candidate = self.test_candidate(pose, factor, is_valid)
+            if candidate is not None:
+                valid_factor = factor
+                repaired_pose = candidate
+            else:
+                invalid_factor = factor
+
+        blend_factors = np.full(pose.shape[0], valid_factor)
+        changed_groups = np.unique(self.group_indices[(pose != self.def_values) & (self.group_indices >= 0)])
+        for group_index in changed_groups:
+            group_factors = blend_factors.copy()
+            group_factors[self.group_indices == group_index] = 1.0
+            candidate = self.test_candidate(pose, group_factors, is_valid)
+            if candidate is not None:
+                blend_factors = group_factors
+                repaired_pose = candidate
+
+        if repaired_pose is None:
+            self.num_failed += 1
+            return None
+
+        self.num_repaired += 1
+        self.blend_factor_sum += blend_factors[self.blended].mean()
+        return repaired_pose
+
+    def estimate_time_saved(self, acceptance_rate, seconds_per_test, max_attempts):
+        """Estimate the time saved by the repairs against drawing new poses.
+        Parameters:
+            acceptance_rate (float)   -- Fraction of freshly sampled poses that pass the pose test
+            seconds_per_test (float)  -- Average duration of a pose test
+            max_attempts (int)        -- Maximum number of poses resampling would have tested
+        Return:
+            The estimated number of tests and seconds saved, negative when repairing was slower
+        """
+        if self.num_repaired == 0:
+            return 0.0, 0.0
+        # Expected number of tests until a fresh pose passes, limited by the retry attempts.
+        if acceptance_rate > 0.0:
+            resample_tests = min(1.0 / acceptance_rate, max_attempts)
+        else:
+            resample_tests = float(max_attempts)
+        repair_tests = self.num_tests / float(self.num_repaired + self.num_failed)
+        tests_saved = self.num_repaired * resample_tests - (self.num_repaired + self.num_failed) * repair_tests
+        return tests_saved, tests_saved * seconds_per_test
+
+    def report(self, acceptance_rate, seconds_per_test, max_attempts):
+        """Print the repair statistics.
+        Parameters:
+            acceptance_rate (float)   -- Fraction of freshly sampled poses that pass the pose test
+            seconds_per_test (float)  -- Average duration of a pose test
+            max_attempts (int)        -- Maximum number of poses resampling would have tested
+        """
+        if self.num_repaired + self.num_failed == 0:
+            return
+        tests_saved, seconds_saved = self.estimate_time_saved(acceptance_rate, seconds_per_test, max_attempts)
+        print('[MLDeformer] Repaired {} poses ({} failed) with {} pose tests, average blend factor {:.2f}'.format(
+            self.num_repaired, self.num_failed, self.num_tests,
+            self.blend_factor_sum / max(1, self.num_repaired)))
+        # Resampling was not run, so the saving is derived from the acceptance rate of fresh poses.
+        print('[MLDeformer] Estimated saving against resampling: {:.0f} pose tests, about {:.2f} seconds '
+              '(estimate from a {:.1%} acceptance rate of fresh poses and {:.2f} ms per test)'.format(
+                  tests_saved, seconds_saved, acceptance_rate, 1000.0 * seconds_per_test))
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module samples random controller values in batches.
+Groups are activated with a probability, active controllers get values in their ranges or, with a small
+probability, their min or max value, and the others keep their default value.
+A whole (frames x controllers) pose matrix is produced per call.
+"""
+
+import numpy as np
+
+from . import random_stream
+from .quasi_random import UnitCubeSampler, SAMPLING_STRATEGY_UNIFORM
+
+# Number of poses that are sampled at once when poses are consumed one by one.
+DEFAULT_BATCH_SIZE = 1024
+
+# Number of times poses rejected by the constraints are redrawn, after that the violating controllers are reset.
+MAX_CONSTRAINT_ROUNDS = 8
+
+# Rounds of the group probability test drawn up front per frame in per-frame mode, rows without an active
+# group after them draw further rounds from their own generator.
+FRAME_ACTIVATION_ROUNDS = 4
+
+
+def get_group_indices(target_groups, num_controllers):
+    """Get the index of the group each controller belongs to.
+    Parameters:
+        target_groups (dict())  -- {group_name -> [index list]} where the indices ref the controller attributes
+        num_controllers (int)   -- Number of controller attributes
+    Return:
+        Vector (ndarray) of group indices, -1 for controllers that are not part of any group
+    """
+    group_indices = np.full(num_controllers, -1, dtype=np.int64)
+    for group_index, controller_indices in enumerate(target_groups.values()):
+        group_indices[list(controller_indices)] = group_index
+    return group_indices
+
+
+def sample_group_activations(rng, num_samples, num_groups, target_prob):
+    """Perform the probability test for selecting controller groups.
+    Rows without any active group are resampled until at least one group is active.
+    Parameters:
+        rng (numpy.random.Generator)    -- Random number generator
+        num_samples (int)               -- Number of poses
+        num_groups (int)                -- Number of controller groups
+        target_prob (float/ndarray)     -- Probability of activating a group, either global or per group
+    Return:
+        Boolean matrix (num_samples x num_groups) of active groups
+    """
+    group_active = rng.random((num_samples, num_groups)) < target_prob
+    # Without any group that can pass the test, resampling would never end.
+    if not can_activate_groups(num_groups, target_prob):
+        return group_active
+
+    resample = ~group_active.any(axis=1)
+    while resample.any():
+        group_active[resample] = rng.random((np.count_nonzero(resample), num_groups)) < target_prob
+        resample = ~group_active.any(axis=1)
+    return group_active
+
+
+def can_activate_groups(num_groups, target_prob):
+    return num_groups > 0 and np.any(np.asarray(target_prob) > 0.0)
+
+
+def expand_group_activations(group_active, group_indices):
+    """Expand the group probability test to the controllers of each group."""
+    controller_active = np.zeros((group_active.shape[0], len(group_indices)), dtype=bool)
+    grouped = group_indices >= 0
+    controller_active[:, grouped] = group_active[:, group_indices[grouped]]
+    return controller_active
+
+
+def get_range_values(unit_samples, force_limit, force_max, max_values, min_values, distributions=None):
+    """Map unit cube points to controller values, forcing some of them to their max or min value."""
+    if distributions is not None:
+        values = distributions.transform(unit_samples)
+    else:
+        values = min_values + (max_values - min_values) * unit_samples
+    values = np.where(force_limit & force_max, max_values, values)
+    return np.where(force_limit & ~force_max, min_values, values)
+
+
+def sample_poses(rng, num_samples, group_indices, num_groups, target_prob, max_values, min_values, def_values,
+                 max_min_prob=0.01, unit_samples=None, distributions=None, rotation_samplers=None, pose_prior=None,
+                 return_group_active=False):
+    """Sample a batch of poses from prepared controller vectors.
+    Parameters:
+        rng (numpy.random.Generator)    -- Random number generator
+        num_samples (int)               -- Number of poses to sample
+        group_indices (ndarray)         -- Group index per controller, see get_group_indices
+        num_groups (int)                -- Number of controller groups
+        target_prob (float/ndarray)     -- Probability of activating a group, either global or per group
+        max_values (ndarray)            -- Maximum value per controller
+        min_values (ndarray)            -- Minimum value per controller
+        def_values (ndarray)            -- Default value per controller
+        max_min_prob (float)            -- Probability of a target controller being set to a max or minimum value
+        unit_samples (ndarray)          -- Matrix (num_samples x num_controllers) of points in the unit cube that
+                                           place the values in the ranges, independent uniform draws when None
+        distributions (ControllerDistributions) -- Maps the unit samples to the controller values, uniformly
+                                                   in the ranges when None
+        rotation_samplers (list(RotationGroupSampler)) -- Replace the rotation channels of joints by uniform
+                                                          orientations within their limits
+        pose_prior (PosePrior)          -- Replaces the values of a fraction of the poses by samples of the prior
+        return_group_active (bool)      -- Also return the groups that passed the probability test
+    Return:
+        Matrix (num_samples x num_controllers) of random controller values and, with return_group_active,
+        the Boolean matrix (num_samples x num_groups) of active groups
+    """
+    num_controllers = len(group_indices)
+
+    group_active = sample_group_activations(rng, num_samples, num_groups, target_prob)
+    controller_active = expand_group_activations(group_active, group_indices)
+
+    # Create random controller activations inside the user-defined ranges, some at their max or min value.
+    if unit_samples is None:
+        unit_samples = rng.random((num_samples, num_controllers))
+    force_limit = rng.random((num_samples, num_controllers)) < max_min_prob
+    force_max = rng.random((num_samples, num_controllers)) < 0.5
+    values = get_range_values(unit_samples, force_limit, force_max, max_values, min_values, distributions)
+
+    for rotation_sampler in rotation_samplers or ():
+        values[:, rotation_sampler.columns] = rotation_sampler.sample(rng, num_samples)
+    if pose_prior is not None:
+        pose_prior.sample_into(rng, values, min_values, max_values)
+
+    # Assign default values to controllers that do not pass the probability test.
+    poses = np.where(controller_active, values, def_values)
+    return (poses, group_active) if return_group_active else poses
+
+
+def sample_frame_poses(generators, group_indices, num_groups, target_prob, max_values, min_values, def_values,
+                       max_min_prob=0.01, distributions=None, rotation_samplers=None, pose_prior=None):
+    """Sample one pose per random number generator, vectorized over the generators.
+    Every generator draws one fixed size block of uniforms, so the math runs on the whole batch at once and
+    every row still only depends on its own generator. Rotation samplers and the prior draw a varying amount
+    of numbers and run per row after the block.
+    Parameters:
+        generators (list(numpy.random.Generator)) -- Random number generator per pose
+        See sample_poses for the other parameters.
+    Return:
+        Matrix (len(generators) x num_controllers) of random controller values and the Boolean matrix
+        (len(generators) x num_groups) of active groups
+    """
+    num_samples = len(generators)
+    num_controllers = len(group_indices)
+    num_activations = FRAME_ACTIVATION_ROUNDS * num_groups
+    block = np.empty((num_samples, num_activations + 3 * num_controllers))
+    for row, rng in enumerate(generators):
+        block[row] = rng.random(block.shape[1])
+
+    # Every row takes the first round that activates a group.
+    rounds = block[:, :num_activations].reshape(num_samples, FRAME_ACTIVATION_ROUNDS, num_groups) < target_prob
+    round_has_active = rounds.any(axis=2)
+    group_active = rounds[np.arange(num_samples), np.argmax(round_has_active, axis=1)]
+    if can_activate_groups(num_groups, target_prob):
+        for row in np.nonzero(~round_has_active.any(axis=1))[0]:
+            group_active[row] = sample_group_activations(generators[row], 1, num_groups, target_prob)[0]
+    controller_active = expand_group_activations(group_active, group_indices)
+
+    unit_samples, force_limit, force_max = np.split(block[:, num_activations:], 3, axis=1)
+    values = get_range_values(unit_samples, force_limit < max_min_prob, force_max < 0.5, max_values, min_values,
+                              distributions)
+
+    if rotation_samplers or pose_prior is not None:
+        for row, rng in enumerate(generators):
+            for rotation_sampler in rotation_samplers or ():
+                values[row, rotation_sampler.columns] = rotation_sampler.sample(rng, 1)[0]
+            if pose_prior is not None:
+                pose_prior.sample_into(rng, values[row:row + 1], min_values, max_values)
+
+    return np.where(controller_active, values, def_values), group_active
+
+
+def get_controller_vectors(num_controllers, max_values, min_values, def_values):
+    """Convert the user-defined ranges into one value per controller.
+    Parameters:
+        num_controllers (int)    -- Number of controller attributes
+        max_values (list(float)) -- Maximum allowed value, either one for all controllers or one per controller
+        min_values (list(float)) -- Minimum allowed value, either one for all controllers or one per controller
+        def_values (list(float)) -- Default value, either one for all controllers or one per controller
+    Return:
+        Tuple of max, min and default value vectors (ndarray)
+    """
+    assert len(max_values) == len(min_values), 'vector size mismatch len(max_values):{} != len(min_values):{}'.format(
+        len(max_values), len(min_values))
+    assert len(def_values) == len(max_values), 'vector size mismatch len(def_values):{} != len(max_values):{}'.format(
+        len(def_values), len(max_values))
+    assert len(def_values) in (1, num_controllers), 'vector size mismatch size:{} != len(def_values):{}'.format(
+        num_controllers, len(def_values))
+
+    # A single user-defined range applies to all controllers.
+    shape = (num_controllers,)
+    return (np.broadcast_to(np.asarray(max_values, dtype=np.float64), shape),
+            np.broadcast_to(np.asarray(min_values, dtype=np.float64), shape),
+            np.broadcast_to(np.asarray(def_values, dtype=np.float64), shape))
+
+
+class PoseSampler(object):
+    """Samples poses in batches and hands them out one by one."""
+
+    def __init__(self, target_controller_attributes, target_groups, target_prob,
+                 max_values, min_values, def_values, max_min_prob=0.01, random_seed=None,
+                 batch_size=DEFAULT_BATCH_SIZE, seed_mode=random_stream.SEED_MODE_SEQUENTIAL,
+                 sampling_strategy=SAMPLING_STRATEGY_UNIFORM, distributions=None, rotation_samplers=None,
+                 pose_prior=None, constraints=None):
+        """ Initialize PoseSampler class.
+        Parameters:
+            target_controller_attributes (list (string))    -- Names of controller attributes
+            target_groups (dict())   -- {group_name -> [index list]} where the indices ref target_controller_attributes
+            target_prob (float)      -- Probability of activating a controller group
+            max_values (list(float)) -- Maximum allowed value assigned to a controller
+            min_values (list(float)) -- Minimum allowed value assigned to a controller
+            def_values (list(float)) -- Default value assigned to a controller a.k.a rest value
+            max_min_prob (float)     -- Probability of a target controller being set to a max or minimum value
+            random_seed (int)        -- Seed of the random number generator
+            batch_size (int)         -- Number of poses sampled at once by next_pose
+            seed_mode (int)          -- random_stream.SEED_MODE_SEQUENTIAL or random_stream.SEED_MODE_PER_FRAME
+            sampling_strategy (int)  -- One of the quasi_random.SAMPLING_STRATEGY_* values, only used in
+                                        sequential mode since quasi-random points depend on the earlier points
+            distributions (ControllerDistributions) -- Distribution of the values per controller, uniform when None
+            rotation_samplers (list(RotationGroupSampler)) -- Samplers of joint orientations, they replace the
+                                                              values of their rotation channels
+            pose_prior (PosePrior)   -- Prior fitted on existing animation, mixed with the other sampled values
+            constraints (PoseConstraints) -- Constraints that fix or reject the sampled poses
+        """
+        self.num_controllers = len(target_controller_attributes)
+        self.target_groups = target_groups
+        self.num_groups = len(target_groups)
+        self.group_indices = get_group_indices(target_groups, self.num_controllers)
+        self.target_prob = target_prob
+        self.max_values, self.min_values, self.def_values = get_controller_vectors(
+            self.num_controllers, max_values, min_values, def_values)
+        self.max_min_prob = max_min_prob
+        self.batch_size = batch_size
+        self.random_seed = random_seed if random_seed is not None else 0
+        self.seed_mode = seed_mode
+        self.rng = random_stream.create_sequential_generator(random_seed)
+        if seed_mode == random_stream.SEED_MODE_PER_FRAME and sampling_strategy != SAMPLING_STRATEGY_UNIFORM:
+            print('[MLDeformer] Quasi-random sampling is not supported per frame, using uniform sampling instead.')
+            sampling_strategy = SAMPLING_STRATEGY_UNIFORM
+        self.sampling_strategy = sampling_strategy
+        self.unit_cube_sampler = UnitCubeSampler(sampling_strategy, self.num_controllers, random_seed)
+        self.distributions = distributions if distributions is not None and not distributions.is_uniform() else None
+        self.rotation_samplers = list(rotation_samplers or [])
+        self.pose_prior = pose_prior
+        self.constraints = constraints if constraints is not None and len(constraints) > 0 else None
+        # Poses sampled ahead and the groups that were active in them.
+        self.poses = None
+        self.group_active = None
+        self.next_pose_index = 0
+
+    def get_unblendable_columns(self):
+        """Get the controllers whose sampled values can't be blended without leaving their distribution:
+        discrete values and the channels of sampled joint orientations.
+        Return:
+            Vector (ndarray) of controller indices
+        """
+        columns = [sampler.columns for sampler in self.rotation_samplers]
+        if self.distributions is not None:
+            columns.append(self.distributions.discrete_columns)
+        return np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + columns).astype(np.int64))
+
+    def set_group_probabilities(self, target_prob):
+        """Change the activation probabilities, the poses that were sampled ahead are discarded.
+        Parameters:
+            target_prob (float/ndarray) -- Probability of activating a group, either global or per group
+        """
+        self.target_prob = target_prob
+        self.poses = None
+        self.group_active = None
+
+    def get_state(self):
+        """Get the state that decides the next poses, to continue the sampling later with set_state.
+        Return:
+            Json serializable state and a dict with the poses sampled ahead and their active groups, if any
+        """
+        state = {
+            'rng_state': self.rng.bit_generator.state,
+            'num_unit_samples': self.unit_cube_sampler.get_state(),
+            'target_prob': np.asarray(self.target_prob).tolist(),
+            'next_pose_index': self.next_pose_index}
+        arrays = {}
+        if self.poses is not None:
+            arrays = {'sampled_poses': self.poses, 'sampled_group_active': self.group_active}
+        return state, arrays
+
+    def set_state(self, state, arrays):
+        """Restore a state returned by get_state.
+        Parameters:
+            state (dict)   -- Json serializable state
+            arrays (dict)  -- The poses sampled ahead and their active groups, if any
+        """
+        self.rng.bit_generator.state = state['rng_state']
+        self.unit_cube_sampler.set_state(state['num_unit_samples'])
+        # Adapted probabilities are per group, the configured probability is a single value.
+        target_prob = state['target_prob']
+        self.target_prob = np.array(target_prob, dtype=np.float64) if isinstance(target_prob, list) else target_prob
+        self.poses = arrays.get('sampled_poses')
+        self.group_active = arrays.get('sampled_group_active')
+        self.next_pose_index = state['next_pose_index']
+
+    def sample_with_generator(self, rng, num_samples):
+        """Sample a batch of poses from a given random number generator.
+        Poses rejected by the constraints are redrawn, up to MAX_CONSTRAINT_ROUNDS times, after which
+        the controllers that violate the constraints are reset to their defaults.
+        Parameters:
+            rng (numpy.random.Generator) -- Random number generator
+            num_samples (int)            -- Number of poses to sample
+        Return:
+            Matrix (num_samples x num_controllers) of random controller values and the Boolean matrix
+            (num_samples x num_groups) of the groups that passed the probability test
+        """
+        poses, group_active = self.sample_unconstrained(rng, num_samples)
+        if self.constraints is None:
+            return poses, group_active
+
+        poses, valid = self.constraints.apply(poses)
+        for _ in range(MAX_CONSTRAINT_ROUNDS):
+            rejected = np.nonzero(~valid)[0]
+            if len(rejected) == 0:
+                return poses, group_active
+            redrawn_poses, group_active[rejected] = self.sample_unconstrained(rng, len(rejected))
+            poses[rejected], valid[rejected] = self.constraints.apply(redrawn_poses)
+        rejected = np.nonzero(~valid)[0]
+        poses[rejected] = self.constraints.apply(poses[rejected], fix_filters=True)[0]
+        return poses, group_active
+
+    def sample_unconstrained(self, rng, num_samples):
+        unit_samples = None
+        if self.sampling_strategy != SAMPLING_STRATEGY_UNIFORM:
+            unit_samples = self.unit_cube_sampler.sample(rng, num_samples)
+        return sample_poses(rng, num_samples, self.group_indices, self.num_groups, self.target_prob,
+                            self.max_values, self.min_values, self.def_values, self.max_min_prob, unit_samples,
+                            self.distributions, self.rotation_samplers, self.pose_prior, return_group_active=True)
+
+    def sample(self, num_samples):
+        """Sample a batch of poses from the sequential random stream.
+        Parameters:
+            num_samples (int) -- Number of poses to sample
+        Return:
+            Matrix (num_samples x num_controllers) of random controller values
+        """
+        return self.sample_with_generator(self.rng, num_samples)[0]
+
+    def sample_frames(self, frames, retry=0):
+        """Sample the poses of the given frames.
+        In per-frame mode every row only depends on the seed, its frame and the retry attempt.
+        The sampling is vectorized over the rows, creating the generator of every row is the remaining per-row cost.
+        Parameters:
+            frames (list(int))        -- Frame numbers
+            retry (int/list(int))     -- Retry attempt, 0 for the first attempt, either for all rows or per row
+        Return:
+            Matrix (len(frames) x num_controllers) of random controller values and the Boolean matrix
+            (len(frames) x num_groups) of the groups that passed the probability test
+        """
+        if self.seed_mode != random_stream.SEED_MODE_PER_FRAME:
+            return self.sample_with_generator(self.rng, len(frames))
+
+        retries = np.broadcast_to(retry, (len(frames),))
+        generators = [random_stream.create_frame_generator(self.random_seed, int(frame), int(frame_retry))
+                      for frame, frame_retry in zip(frames, retries)]
+        poses, group_active = sample_frame_poses(
+            generators, self.group_indices, self.num_groups, self.target_prob, self.max_values, self.min_values,
+            self.def_values, self.max_min_prob, self.distributions, self.rotation_samplers, self.pose_prior)
+        if self.constraints is None:
+            return poses, group_active
+
+        # Rejected rows are redrawn from their own generator, which keeps them independent of the other rows.
+        poses, valid = self.constraints.apply(poses)
+        for row in np.nonzero(~valid)[0]:
+            row_poses, row_group_active = self.sample_with_generator(generators[row], 1)
+            poses[row], group_active[row] = row_poses[0], row_group_active[0]
+        return poses, group_active
+
+    def pose_candidates(self, frame, first_retry, num_candidates):
+        """Get the candidate poses of consecutive retry attempts of a frame.
+        Parameters:
+            frame (int)           -- Frame number
+            first_retry (int)     -- Retry attempt of the first candidate
+            num_candidates (int)  -- Number of candidates
+        Return:
+            Matrix (num_candidates x num_controllers) of random controller values and the Boolean matrix
+            (num_candidates x num_groups) of the groups that passed the probability test
+        """
+        if self.seed_mode == random_stream.SEED_MODE_PER_FRAME:
+            return self.sample_frames([frame] * num_candidates, np.arange(first_retry, first_retry + num_candidates))
+        candidates = [self.next_pose_and_groups() for _ in range(num_candidates)]
+        return (np.array([pose for pose, _ in candidates]).reshape(num_candidates, self.num_controllers),
+                np.array([groups for _, groups in candidates], dtype=bool).reshape(num_candidates, self.num_groups))
+
+    def next_pose_and_groups(self):
+        """Get the next pose and its active groups, sampling a new batch when the current one is used up.
+        Return:
+            Vector (ndarray) of random controller values and Boolean vector of the active groups
+        """
+        if self.poses is None or self.next_pose_index >= len(self.poses):
+            self.poses, self.group_active = self.sample_with_generator(self.rng, self.batch_size)
+            self.next_pose_index = 0
+        index = self.next_pose_index
+        self.next_pose_index += 1
+        return self.poses[index], self.group_active[index]
+
+    def next_pose(self):
+        """Get the next pose, sampling a new batch when the current one is used up.
+        Return:
+            Vector (ndarray) of random controller values
+        """
+        return self.next_pose_and_groups()[0]
+
+    def pose(self, frame, retry=0):
+        """Get the pose of a frame.
+        Parameters:
+            frame (int) -- Frame number
+            retry (int) -- Retry attempt, 0 for the first attempt
+        Return:
+            Vector (ndarray) of random controller values
+        """
+        if self.seed_mode == random_stream.SEED_MODE_PER_FRAME:
+            return self.sample_frames([frame], retry)[0][0]
+        return self.next_pose()
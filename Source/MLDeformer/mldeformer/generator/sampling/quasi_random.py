@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module draws points in the unit cube with different sampling strategies.
+Quasi-random strategies spread the points more evenly than independent uniform draws,
+so the controller ranges are covered with fewer frames.
+Scrambled Sobol sequences need scipy, without it Latin hypercube sampling is used instead.
+"""
+
+import warnings
+
+import numpy as np
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+SAMPLING_STRATEGY_UNIFORM = 0
+SAMPLING_STRATEGY_SOBOL = 1
+SAMPLING_STRATEGY_LATIN_HYPERCUBE = 2
+
+
+def latin_hypercube(rng, num_samples, num_dimensions):
+    """Draw a Latin hypercube sample: every dimension has exactly one point in each of num_samples strata.
+    Parameters:
+        rng (numpy.random.Generator) -- Random number generator
+        num_samples (int)            -- Number of points
+        num_dimensions (int)         -- Number of dimensions
+    Return:
+        Matrix (num_samples x num_dimensions) of points in [0, 1)
+    """
+    strata = np.argsort(rng.random((num_samples, num_dimensions)), axis=0)
+    return (strata + rng.random((num_samples, num_dimensions))) / float(max(1, num_samples))
+
+
+class UnitCubeSampler(object):
+    """Draws batches of points in the unit cube with a sampling strategy."""
+
+    def __init__(self, strategy, num_dimensions, random_seed=None):
+        """ Initialize UnitCubeSampler class.
+        Parameters:
+            strategy (int)        -- One of the SAMPLING_STRATEGY_* values
+            num_dimensions (int)  -- Number of dimensions
+            random_seed (int)     -- Seed of the Sobol scrambling
+        """
+        if strategy == SAMPLING_STRATEGY_SOBOL and qmc is None:
+            print('[MLDeformer] Sobol sampling requires scipy, using Latin hypercube sampling instead.')
+            strategy = SAMPLING_STRATEGY_LATIN_HYPERCUBE
+        self.strategy = strategy
+        self.num_dimensions = num_dimensions
+        self.sobol_engine = None
+        if strategy == SAMPLING_STRATEGY_SOBOL and num_dimensions > 0:
+            self.sobol_engine = qmc.Sobol(num_dimensions, scramble=True, seed=random_seed)
+
+    def sample(self, rng, num_samples):
+        """Draw the next batch of points.
+        The Sobol sequence continues over batches, Latin hypercube strata are per batch.
+        Parameters:
+            rng (numpy.random.Generator) -- Random number generator for the uniform and Latin hypercube strategies
+            num_samples (int)            -- Number of points
+        Return:
+            Matrix (num_samples x num_dimensions) of points in [0, 1)
+        """
+        if self.sobol_engine is not None:
+            with warnings.catch_warnings():
+                # The balance warning for batch sizes that aren't a power of 2 doesn't apply to a continued sequence.
+                warnings.simplefilter('ignore')
+                return self.sobol_engine.random(num_samples)
+        if self.strategy == SAMPLING_STRATEGY_LATIN_HYPERCUBE:
+            return latin_hypercube(rng, num_samples, self.num_dimensions)
+        return rng.random((num_samples, self.num_dimensions))
+
+    def get_state(self):
+        """Get the number of points drawn from the Sobol sequence, the other strategies only use the rng."""
+        return int(self.sobol_engine.num_generated) if self.sobol_engine is not None else 0
+
+    def set_state(self, num_generated):
+        """Continue the Sobol sequence after a given number of points.
+        Parameters:
+            num_generated (int) -- Number of points drawn before, see get_state
+        """
+        if self.sobol_engine is not None:
+            self.sobol_engine.reset()
+            self.sobol_engine.fast_forward(num_generated)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module creates random number generators for pose sampling.
+The per-frame generators are counter-based, so the random stream of a frame and retry
+does not depend on how many numbers were drawn for any other frame.
+"""
+
+import numpy as np
+
+# Sequential mode: one random stream for the whole generation, poses depend on all earlier draws.
+SEED_MODE_SEQUENTIAL = 0
+# Per-frame mode: the pose of a frame and retry is a pure function of (seed, frame, retry).
+SEED_MODE_PER_FRAME = 1
+
+_UINT64_RANGE = 2 ** 64
+
+
+def create_sequential_generator(random_seed):
+    """Create a single random number generator for a whole generation.
+    Parameters:
+        random_seed (int) -- Seed value
+    Return:
+        numpy.random.Generator
+    """
+    return np.random.default_rng(random_seed)
+
+
+def create_frame_generator(random_seed, frame, retry=0):
+    """Create the random number generator of a given frame and retry attempt.
+    The Philox key holds the seed, the two high words of the counter hold the frame and retry.
+    The two low words are left for the draws themselves, so streams never overlap.
+    Parameters:
+        random_seed (int) -- Seed value
+        frame (int)       -- Frame number, negative frames are allowed
+        retry (int)       -- Retry attempt of the frame, 0 for the first attempt
+    Return:
+        numpy.random.Generator
+    """
+    counter = ((frame % _UINT64_RANGE) << 192) | ((retry % _UINT64_RANGE) << 128)
+    return np.random.Generator(np.random.Philox(counter=counter, key=random_seed % (2 ** 128)))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module samples joint orientations uniformly within the limits of their Euler channels.
+Sampling the rotateX/Y/Z channels independently clusters the orientations near the gimbal poles of the middle axis.
+Uniform orientations, the same distribution as uniform unit quaternions, have a density proportional to the cosine
+of the middle angle in Euler coordinates. So the angles are drawn in the limits and rejected by that density,
+which keeps every orientation inside the limits without converting through quaternions and back.
+The limits are the Euler angle ranges of the channels: the parameter ranges, narrowed by the enabled joint limits.
+The orientations replace the max/min snapping and the distributions of the rotation channels.
+"""
+
+import numpy as np
+
+ROTATION_SAMPLING_EULER = 0
+ROTATION_SAMPLING_ORIENTATION = 1
+
+# Axis order of the Maya rotate orders, the first axis is applied first.
+ROTATE_ORDERS = ((0, 1, 2), (1, 2, 0), (2, 0, 1), (0, 2, 1), (1, 0, 2), (2, 1, 0))
+
+# Number of rejection rounds before the remaining rows keep independent Euler angles.
+MAX_REJECTION_ROUNDS = 32
+
+
+def get_max_abs_cosine(min_angle, max_angle):
+    """Get the maximum of |cos| over an angle interval in radians."""
+    # |cos| peaks at multiples of pi.
+    if np.floor(max_angle / np.pi) * np.pi >= min_angle:
+        return 1.0
+    return max(abs(np.cos(min_angle)), abs(np.cos(max_angle)))
+
+
+class RotationGroupSampler(object):
+    """Samples the rotateX/Y/Z channels of a joint as uniform orientations within the channel limits."""
+
+    def __init__(self, columns, rotate_order, min_values, max_values, degrees=True):
+        """ Initialize RotationGroupSampler class.
+        Parameters:
+            columns (list(int))     -- Controller indices of the x, y and z rotation channels
+            rotate_order (int)      -- Maya rotate order, 0 (xyz) to 5 (zyx)
+            min_values (ndarray)    -- Minimum x, y and z angle
+            max_values (ndarray)    -- Maximum x, y and z angle
+            degrees (bool)          -- Whether the angles are in degrees instead of radians
+        """
+        self.columns = np.asarray(columns, dtype=np.int64)
+        self.rotate_order = rotate_order
+        self.middle_axis = ROTATE_ORDERS[rotate_order][1]
+        self.min_values = np.asarray(min_values, dtype=np.float64)
+        self.max_values = np.asarray(max_values, dtype=np.float64)
+        self.scale = np.pi / 180.0 if degrees else 1.0
+        self.max_density = get_max_abs_cosine(self.min_values[self.middle_axis] * self.scale,
+                                              self.max_values[self.middle_axis] * self.scale)
+        self.num_rejected = 0
+        self.num_fallbacks = 0
+
+    def sample(self, rng, num_samples):
+        """Draw uniform orientations within the limits.
+        Rows that are still rejected after MAX_REJECTION_ROUNDS keep their independent Euler angles.
+        Parameters:
+            rng (numpy.random.Generator) -- Random number generator
+            num_samples (int)            -- Number of orientations
+        Return:
+            Matrix (num_samples x 3) of x, y and z angles, in the units of the limits
+        """
+        value_range = self.max_values - self.min_values
+        angles = self.min_values + value_range * rng.random((num_samples, 3))
+        if self.max_density <= 0.0:
+            return angles
+
+        remaining = np.arange(num_samples)
+        for _ in range(MAX_REJECTION_ROUNDS):
+            density = np.abs(np.cos(angles[remaining, self.middle_axis] * self.scale))
+            rejected = rng.random(len(remaining)) * self.max_density > density
+            remaining = remaining[rejected]
+            if len(remaining) == 0:
+                break
+            self.num_rejected += len(remaining)
+            angles[remaining] = self.min_values + value_range * rng.random((len(remaining), 3))
+        self.num_fallbacks += len(remaining)
+        return angles
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Module 'mesh' includes DCC-independent mesh functions and classes.
+"""
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module contains axis aligned bounding box tests used to cull rays and segments before exact intersection tests.
+"""
+
+import numpy as np
+
+# The far distance of the slab test is enlarged a little, so rounding never culls a ray that touches a box.
+SLAB_ROUNDING_FACTOR = 1.0 + 1e-9
+SLAB_ROUNDING_MARGIN = 1e-12
+
+
+def get_points_bounding_box(points):
+    """Returns the axis aligned bounding box of a set of points.
+
+    Parameters:
+        points (array) -- Point positions (num_points x 3)
+    Return:
+        Box minimum and maximum (3)
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def pad_bounding_box(box_min, box_max, relative_padding=1e-4):
+    """Grows a box by a fraction of its diagonal, so tests against it are conservative.
+    """
+    padding = relative_padding * np.linalg.norm(np.asarray(box_max) - np.asarray(box_min))
+    return np.asarray(box_min) - padding, np.asarray(box_max) + padding
+
+
+def transform_bounding_box(box_min, box_max, matrix):
+    """Returns the axis aligned bounding box of a transformed box.
+
+    Parameters:
+        box_min (array) -- Box minimum (3)
+        box_max (array) -- Box maximum (3)
+        matrix (array)  -- 4x4 transformation matrix that transforms row vectors
+    Return:
+        Box minimum and maximum of the transformed corners (3)
+    """
+    box_min = np.asarray(box_min, dtype=np.float64)
+    box_max = np.asarray(box_max, dtype=np.float64)
+    corner_selection = np.array([[(i >> axis) & 1 for axis in range(3)] for i in range(8)], dtype=bool)
+    corners = np.where(corner_selection, box_max, box_min)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    corners = np.dot(corners, matrix[:3, :3]) + matrix[3, :3]
+    return corners.min(axis=0), corners.max(axis=0)
+
+
+def boxes_overlap(min_a, max_a, min_b, max_b):
+    """Returns true where the boxes a and b overlap, boxes are given as (... x 3) arrays.
+    """
+    return np.all((np.asarray(min_a) <= max_b) & (np.asarray(max_a) >= min_b), axis=-1)
+
+
+def rays_overlap_boxes(origins, inv_directions, box_min, box_max, max_distance):
+    """Slab test of rays against boxes.
+
+    Parameters:
+        origins (array)        -- Ray origins (num_rays x 3)
+        inv_directions (array) -- Inverse of the ray directions (num_rays x 3)
+        box_min (array)        -- Box minimum, either one box (3) or one box per ray (num_rays x 3)
+        box_max (array)        -- Box maximum, either one box (3) or one box per ray (num_rays x 3)
+        max_distance (float/array) -- Maximum ray parameter in units of the direction length, either one for all
+                                      rays or one per ray (num_rays)
+    Return:
+        Mask of the rays that overlap their box (num_rays)
+    """
+    with np.errstate(invalid='ignore'):
+        t1 = (box_min - origins) * inv_directions
+        t2 = (box_max - origins) * inv_directions
+    # A ray parallel to a slab with its origin in a slab plane gives a NaN, it stays inside that slab.
+    in_slab_plane = np.isnan(t1) | np.isnan(t2)
+    t_near = np.where(in_slab_plane, -np.inf, np.minimum(t1, t2)).max(axis=1)
+    t_far = np.where(in_slab_plane, np.inf, np.maximum(t1, t2)).min(axis=1)
+    # Rays that graze a box edge or corner can round to a far distance just before the near one.
+    t_far = t_far * SLAB_ROUNDING_FACTOR + SLAB_ROUNDING_MARGIN
+    return (t_near <= t_far) & (t_far >= 0.0) & (t_near <= max_distance)
+
+
+def rays_overlap_box(origins, directions, box_min, box_max, max_distance):
+    """Returns a mask of the rays that overlap a single box, see rays_overlap_boxes.
+    """
+    origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+    directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+    with np.errstate(divide='ignore'):
+        inv_directions = 1.0 / directions
+    return rays_overlap_boxes(origins, inv_directions, np.asarray(box_min, dtype=np.float64),
+                              np.asarray(box_max, dtype=np.float64), max_distance)
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module contains a bounding volume hierarchy over mesh triangles and batched ray-triangle intersection tests.
+"""
+
+import numpy as np
+
+from .bounding_box import rays_overlap_boxes
+
+DEFAULT_LEAF_SIZE = 8
+DEFAULT_RAY_CHUNK_SIZE = 4096
+DEFAULT_MAX_DISTANCE = 500.0
+
+
+def transform_rays(origins, directions, matrix, max_distance=DEFAULT_MAX_DISTANCE):
+    """Transforms rays into another space, for example the object space of a mesh.
+
+    The directions are normalized in the target space and the maximum ray parameter is scaled by how much the
+    transform stretches every ray, so the rays end at the same points as in the source space.
+
+    Parameters:
+        origins (array)      -- Ray origins (num_rays x 3)
+        directions (array)   -- Ray directions (num_rays x 3), don't need to be normalized
+        matrix (array)       -- 4x4 transform, points are row vectors as in Maya
+        max_distance (float) -- Maximum ray parameter in the source space, in units of the direction length
+    Return:
+        Origins, unit directions and the maximum ray parameter per ray (num_rays) in the target space
+    """
+    origins = np.dot(np.asarray(origins, dtype=np.float64).reshape(-1, 3), matrix[:3, :3]) + matrix[3, :3]
+    directions = np.dot(np.asarray(directions, dtype=np.float64).reshape(-1, 3), matrix[:3, :3])
+    lengths = np.linalg.norm(directions, axis=1)
+    lengths = np.where(lengths > 0.0, lengths, 1.0)
+    return origins, directions / lengths[:, np.newaxis], max_distance * lengths
+
+
+class TriangleBVH(object):
+    """Bounding volume hierarchy over the triangles of a mesh.
+
+    All rays are traversed together: every iteration tests the active (ray, node) pairs against the node boxes
+    and expands the surviving pairs into their children, or into ray-triangle tests at the leaves.
+    The hierarchy can be refitted to deformed vertex positions as long as the triangles stay the same.
+
+    With a triangle to face map, hits are counted per polygon like Maya's MFnMesh.allIntersections, so a ray
+    through the shared diagonal of a quad counts once.
+
+    Parameters:
+        vertices (array)       -- Vertex positions (num_vertices x 3)
+        triangles (array)      -- Vertex indices of the triangles (num_triangles x 3)
+        leaf_size (int)        -- Maximum number of triangles in a leaf
+        triangle_faces (array) -- Optional face index per triangle (num_triangles), hits are counted per triangle
+                                  without it
+    """
+
+    def __init__(self, vertices, triangles, leaf_size=DEFAULT_LEAF_SIZE, triangle_faces=None):
+        self.triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+        self.num_triangles = self.triangles.shape[0]
+        self.leaf_size = max(1, int(leaf_size))
+        self.triangle_faces = None
+        self.num_faces = 0
+        if triangle_faces is not None:
+            self.triangle_faces = np.asarray(triangle_faces, dtype=np.int64).reshape(self.num_triangles)
+            self.num_faces = int(self.triangle_faces.max()) + 1 if self.num_triangles > 0 else 0
+
+        # Nodes, children are always created after their parents.
+        self.node_min = None
+        self.node_max = None
+        self.node_left = None
+        self.node_right = None
+        self.node_start = None
+        self.node_count = None
+        self.node_depth = None
+
+        # Triangle data in leaf order.
+        self.triangle_order = None
+        self.tri_faces = None
+        self.tri_v0 = None
+        self.tri_edge1 = None
+        self.tri_edge2 = None
+
+        self.build(vertices)
+
+    @property
+    def num_nodes(self):
+        return 0 if self.node_left is None else self.node_left.shape[0]
+
+    def get_triangle_vertices(self, vertices):
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        return vertices[self.triangles]
+
+    def build(self, vertices):
+        """Builds the hierarchy by splitting the triangles at the median centroid along the longest axis.
+
+        Parameters:
+            vertices (array) -- Vertex positions (num_vertices x 3)
+        """
+        tri_vertices = self.get_triangle_vertices(vertices)
+        tri_min = tri_vertices.min(axis=1)
+        tri_max = tri_vertices.max(axis=1)
+        centroids = tri_vertices.mean(axis=1)
+
+        order = np.arange(self.num_triangles)
+        node_min, node_max = [], []
+        node_left, node_right = [], []
+        node_start, node_count, node_depth = [], [], []
+
+        def add_node(start, end, depth):
+            node_min.append(tri_min[order[start:end]].min(axis=0) if end > start else np.zeros(3))
+            node_max.append(tri_max[order[start:end]].max(axis=0) if end > start else np.zeros(3))
+            node_left.append(-1)
+            node_right.append(-1)
+            node_start.append(start)
+            node_count.append(end - start)
+            node_depth.append(depth)
+            return len(node_left) - 1
+
+        stack = [(add_node(0, self.num_triangles, 0), 0, self.num_triangles, 0)]
+        while stack:
+            node, start, end, depth = stack.pop()
+            if end - start <= self.leaf_size:
+                continue
+
+            sub_order = order[start:end]
+            sub_centroids = centroids[sub_order]
+            extent = sub_centroids.max(axis=0) - sub_centroids.min(axis=0)
+            axis = int(np.argmax(extent))
+            if extent[axis] <= 0.0:
+                continue
+
+            mid = (start + end) // 2
+            partition = np.argpartition(sub_centroids[:, axis], mid - start)
+            order[start:end] = sub_order[partition]
+
+            left = add_node(start, mid, depth + 1)
+            right = add_node(mid, end, depth + 1)
+            node_left[node] = left
+            node_right[node] = right
+            stack.append((left, start, mid, depth + 1))
+            stack.append((right, mid, end, depth + 1))
+
+        self.node_min = np.array(node_min, dtype=np.float64).reshape(-1, 3)
+        self.node_max = np.array(node_max, dtype=np.float64).reshape(-1, 3)
+        self.node_left = np.array(node_left, dtype=np.int64)
+        self.node_right = np.array(node_right, dtype=np.int64)
+        self.node_start = np.array(node_start, dtype=np.int64)
+        self.node_count = np.array(node_count, dtype=np.int64)
+        self.node_depth = np.array(node_depth, dtype=np.int64)
+        self.triangle_order = order
+        if self.triangle_faces is not None:
+            self.tri_faces = self.triangle_faces[order]
+        self.set_triangle_data(tri_vertices[order])
+
+    def refit(self, vertices):
+        """Updates the node boxes and triangle data to new vertex positions, keeping the hierarchy.
+
+        Refitting is much cheaper than a rebuild. The hierarchy gets less efficient when the mesh deforms a lot,
+        but the results stay exact.
+
+        Parameters:
+            vertices (array) -- Deformed vertex positions (num_vertices x 3)
+        """
+        tri_vertices = self.get_triangle_vertices(vertices)[self.triangle_order]
+        self.set_triangle_data(tri_vertices)
+        if self.num_triangles == 0:
+            return
+
+        tri_min = tri_vertices.min(axis=1)
+        tri_max = tri_vertices.max(axis=1)
+
+        # Leaves cover disjoint triangle ranges, so they can be reduced in one go.
+        leaves = np.nonzero((self.node_left < 0) & (self.node_count > 0))[0]
+        leaves = leaves[np.argsort(self.node_start[leaves])]
+        self.node_min[leaves] = np.minimum.reduceat(tri_min, self.node_start[leaves], axis=0)
+        self.node_max[leaves] = np.maximum.reduceat(tri_max, self.node_start[leaves], axis=0)
+
+        # Inner nodes, deepest level first.
+        inner = np.nonzero(self.node_left >= 0)[0]
+        for depth in range(int(self.node_depth.max()), -1, -1):
+            nodes = inner[self.node_depth[inner] == depth]
+            if nodes.size == 0:
+                continue
+            left = self.node_left[nodes]
+            right = self.node_right[nodes]
+            self.node_min[nodes] = np.minimum(self.node_min[left], self.node_min[right])
+            self.node_max[nodes] = np.maximum(self.node_max[left], self.node_max[right])
+
+    def set_triangle_data(self, tri_vertices):
+        self.tri_v0 = np.ascontiguousarray(tri_vertices[:, 0])
+        self.tri_edge1 = np.ascontiguousarray(tri_vertices[:, 1] - tri_vertices[:, 0])
+        self.tri_edge2 = np.ascontiguousarray(tri_vertices[:, 2] - tri_vertices[:, 0])
+
+    def count_intersections(self, origins, directions, max_distance=DEFAULT_MAX_DISTANCE,
+                            chunk_size=DEFAULT_RAY_CHUNK_SIZE, tolerance=1e-6):
+        """Counts the triangles hit by every ray, or the faces when the hierarchy has a triangle to face map.
+
+        Rays only go forward and hits are counted for ray parameters in (tolerance, max_distance]. As in
+        Maya's MFnMesh.allIntersections, the ray parameter is measured in units of the direction length.
+
+        Parameters:
+            origins (array)      -- Ray origins (num_rays x 3)
+            directions (array)   -- Ray directions (num_rays x 3), don't need to be normalized
+            max_distance (float/array) -- Maximum ray parameter, either one for all rays or one per ray
+            chunk_size (int)     -- Number of rays traversed together, bounds the memory use
+            tolerance (float)    -- Hits closer to the origin are ignored
+        Return:
+            Number of hits per ray (num_rays)
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        num_rays = origins.shape[0]
+        max_distances = np.broadcast_to(np.asarray(max_distance, dtype=np.float64), (num_rays,))
+        counts = np.zeros(num_rays, dtype=np.int64)
+        if num_rays == 0 or self.num_triangles == 0:
+            return counts
+
+        for start in range(0, num_rays, chunk_size):
+            end = min(num_rays, start + chunk_size)
+            counts[start:end] = self.count_chunk_intersections(origins[start:end], directions[start:end],
+                                                               max_distances[start:end], tolerance)
+        return counts
+
+    def count_chunk_intersections(self, origins, directions, max_distances, tolerance):
+        num_rays = origins.shape[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv_directions = 1.0 / directions
+
+        hit_ray_ids = []
+        hit_tri_ids = []
+        ray_ids = np.arange(num_rays)
+        node_ids = np.zeros(num_rays, dtype=np.int64)
+        while ray_ids.size > 0:
+            hit = self.intersect_boxes(origins[ray_ids], inv_directions[ray_ids], node_ids, max_distances[ray_ids])
+            ray_ids = ray_ids[hit]
+            node_ids = node_ids[hit]
+
+            is_leaf = self.node_left[node_ids] < 0
+            if np.any(is_leaf):
+                leaf_ray_ids, leaf_tri_ids = self.intersect_leaves(origins, directions, ray_ids[is_leaf],
+                                                                   node_ids[is_leaf], max_distances, tolerance)
+                hit_ray_ids.append(leaf_ray_ids)
+                hit_tri_ids.append(leaf_tri_ids)
+
+            ray_ids = ray_ids[~is_leaf]
+            node_ids = node_ids[~is_leaf]
+            ray_ids = np.concatenate((ray_ids, ray_ids))
+            node_ids = np.concatenate((self.node_left[node_ids], self.node_right[node_ids]))
+
+        hit_ray_ids = np.concatenate(hit_ray_ids) if hit_ray_ids else np.zeros(0, dtype=np.int64)
+        if self.tri_faces is not None and hit_ray_ids.size > 0:
+            # The triangles of a face can be in different leaves, so the hits are made unique at the end.
+            hit_faces = self.tri_faces[np.concatenate(hit_tri_ids)]
+            hit_ray_ids = np.unique(hit_ray_ids * self.num_faces + hit_faces) // self.num_faces
+        return np.bincount(hit_ray_ids, minlength=num_rays)
+
+    def intersect_boxes(self, origins, inv_directions, node_ids, max_distances):
+        """Slab test of rays against node boxes, returns a mask of the pairs that overlap.
+        """
+        return rays_overlap_boxes(origins, inv_directions, self.node_min[node_ids], self.node_max[node_ids],
+                                  max_distances)
+
+    def intersect_leaves(self, origins, directions, ray_ids, node_ids, max_distances, tolerance):
+        """Moller-Trumbore test of rays against all triangles of their leaves.
+
+        Return:
+            The ray id and the leaf order triangle id of every hit
+        """
+        num_tris = self.node_count[node_ids]
+        total = int(num_tris.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        pair_ray_ids = np.repeat(ray_ids, num_tris)
+        offsets = np.arange(total) - np.repeat(np.cumsum(num_tris) - num_tris, num_tris)
+        tri_ids = np.repeat(self.node_start[node_ids], num_tris) + offsets
+
+        ray_dirs = directions[pair_ray_ids]
+        edge1 = self.tri_edge1[tri_ids]
+        edge2 = self.tri_edge2[tri_ids]
+
+        p = np.cross(ray_dirs, edge2)
+        det = np.einsum('ij,ij->i', edge1, p)
+        valid = np.abs(det) > 1e-12
+        inv_det = np.zeros_like(det)
+        inv_det[valid] = 1.0 / det[valid]
+
+        s = origins[pair_ray_ids] - self.tri_v0[tri_ids]
+        u = np.einsum('ij,ij->i', s, p) * inv_det
+        q = np.cross(s, edge1)
+        v = np.einsum('ij,ij->i', ray_dirs, q) * inv_det
+        t = np.einsum('ij,ij->i', edge2, q) * inv_det
+
+        hit = valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > tolerance) & (t <= max_distances[pair_ray_ids])
+        return pair_ray_ids[hit], tri_ids[hit]
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+This module contains the polygon topology of a mesh and vectorized per-face geometry.
+"""
+
+import numpy as np
+
+
+class PolygonTopology(object):
+    """Face to vertex index arrays of a polygon mesh.
+
+    The topology is built once; the face centers and normals of any deformed vertex positions are then computed
+    with a few array operations for all faces together.
+
+    Parameters:
+        face_vertex_counts (array) -- Number of vertices of every face (num_faces)
+        face_vertices (array)      -- Vertex indices of all faces, concatenated in face order
+    """
+
+    def __init__(self, face_vertex_counts, face_vertices):
+        self.face_vertex_counts = np.asarray(face_vertex_counts, dtype=np.int64).ravel()
+        self.face_vertices = np.asarray(face_vertices, dtype=np.int64).ravel()
+        assert self.face_vertex_counts.sum() == self.face_vertices.shape[0]
+        assert np.all(self.face_vertex_counts > 0)
+
+        self.num_faces = self.face_vertex_counts.shape[0]
+        self.face_starts = np.cumsum(self.face_vertex_counts) - self.face_vertex_counts
+
+        # Index of the next vertex of the same face, for the edges of Newell's method.
+        face_ends = np.repeat(self.face_starts + self.face_vertex_counts, self.face_vertex_counts)
+        next_corner = np.arange(self.face_vertices.shape[0]) + 1
+        next_corner[next_corner == face_ends] -= self.face_vertex_counts
+        self.next_face_vertices = self.face_vertices[next_corner]
+
+    def get_face_centers(self, points):
+        """Returns the average vertex position of every face.
+
+        Parameters:
+            points (array) -- Vertex positions (num_vertices x 3)
+        Return:
+            Face centers (num_faces x 3)
+        """
+        if self.num_faces == 0:
+            return np.zeros((0, 3), dtype=np.float64)
+        points = np.asarray(points, dtype=np.float64)
+        sums = np.add.reduceat(points[self.face_vertices, :3], self.face_starts, axis=0)
+        return sums / self.face_vertex_counts[:, np.newaxis]
+
+    def get_face_normals(self, points):
+        """Returns the unit normal of every face with Newell's method, which also handles non-planar faces.
+
+        Parameters:
+            points (array) -- Vertex positions (num_vertices x 3)
+        Return:
+            Face normals (num_faces x 3), zero for degenerate faces
+        """
+        if self.num_faces == 0:
+            return np.zeros((0, 3), dtype=np.float64)
+        points = np.asarray(points, dtype=np.float64)
+        current = points[self.face_vertices, :3]
+        following = points[self.next_face_vertices, :3]
+        normals = np.add.reduceat(np.cross(current, following), self.face_starts, axis=0)
+
+        lengths = np.linalg.norm(normals, axis=1)
+        non_degenerate = lengths > 0.0
+        normals[non_degenerate] /= lengths[non_degenerate, np.newaxis]
+        return normals
+
+    def get_face_centers_and_normals(self, points):
+        return self.get_face_centers(points), self.get_face_normals(points)
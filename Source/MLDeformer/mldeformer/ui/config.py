@@ -7,6 +7,12 @@ import os
 from .json_encoder import JsonEncoder
 from .mesh_mapping import MeshMapping
 from .parameter import Parameter
+from mldeformer.generator.maya.rig import check_interpenetrations
+from mldeformer.generator.sampling import pose_prior
+from mldeformer.generator.sampling import pose_repair
+from mldeformer.generator.sampling import quasi_random
+from mldeformer.generator.sampling import random_stream
+from mldeformer.generator.sampling import rotation_sampling
 
 
 # The configuration and parameters state.
@@ -16,12 +22,46 @@ class Config:
     COLLISION_MODE_NONE = 0
     COLLISION_MODE_RAY_MESH = 1
     COLLISION_MODE_BONE_MESH = 2
+    SEED_MODE_SEQUENTIAL = random_stream.SEED_MODE_SEQUENTIAL
+    SEED_MODE_PER_FRAME = random_stream.SEED_MODE_PER_FRAME
+    INTERSECTION_ENGINE_MAYA = check_interpenetrations.INTERSECTION_ENGINE_MAYA
+    INTERSECTION_ENGINE_NUMPY = check_interpenetrations.INTERSECTION_ENGINE_NUMPY
+    REPAIR_MODE_NONE = pose_repair.REPAIR_MODE_NONE
+    REPAIR_MODE_BISECT = pose_repair.REPAIR_MODE_BISECT
+    SAMPLING_STRATEGY_UNIFORM = quasi_random.SAMPLING_STRATEGY_UNIFORM
+    SAMPLING_STRATEGY_SOBOL = quasi_random.SAMPLING_STRATEGY_SOBOL
+    SAMPLING_STRATEGY_LATIN_HYPERCUBE = quasi_random.SAMPLING_STRATEGY_LATIN_HYPERCUBE
+    ROTATION_SAMPLING_EULER = rotation_sampling.ROTATION_SAMPLING_EULER
+    ROTATION_SAMPLING_ORIENTATION = rotation_sampling.ROTATION_SAMPLING_ORIENTATION
+    PRIOR_SOURCE_NONE = pose_prior.PRIOR_SOURCE_NONE
+    PRIOR_SOURCE_SCENE = pose_prior.PRIOR_SOURCE_SCENE
+    PRIOR_SOURCE_FILE = pose_prior.PRIOR_SOURCE_FILE
 
     def __init__(self, output_folder):
         self.config_version = 2
         self.num_samples = 25000
         self.start_frame = 0
         self.random_seed = 7777
+        self.seed_mode = Config.SEED_MODE_SEQUENTIAL
+        self.sampling_strategy = Config.SAMPLING_STRATEGY_UNIFORM
+        self.rotation_sampling_mode = Config.ROTATION_SAMPLING_EULER
+        self.prior_source = Config.PRIOR_SOURCE_NONE
+        self.prior_file = ''
+        self.prior_start_frame = 0
+        self.prior_end_frame = -1
+        self.prior_ratio = 0.5
+        self.prior_num_components = 4
+        self.constraints = list()
+        self.mirror_poses = False
+        self.mirror_pairs = list()
+        self.mirror_patterns = [['_l_', '_r_'], ['_L_', '_R_']]
+        self.mirror_negated_channels = ['translateX', 'rotateY', 'rotateZ']
+        self.min_pose_distance = 0.0
+        self.adaptive_num_samples = False
+        self.adaptive_chunk_size = 1000
+        self.adaptive_min_improvement = 0.002
+        self.checkpoint_interval = 0
+        self.keyframe_flush_interval = 0
         self.controller_probability = 0.75
         self.set_max_min_probability = 0.01
         self.save_target_alembic = True
@@ -33,6 +73,14 @@ class Config:
         self.collision_mode = Config.COLLISION_MODE_NONE
         self.collision_retry_attempts = 20
         self.allowed_collisions = 1
+        self.intersection_engine = Config.INTERSECTION_ENGINE_MAYA
+        self.prioritize_colliding_faces = True
+        self.collision_batch_size = 1
+        self.collision_repair_mode = Config.REPAIR_MODE_NONE
+        self.collision_repair_iterations = 4
+        self.adaptive_group_probability = False
+        self.adaptive_probability_min = 0.05
+        self.adaptive_probability_max = 0.95
         self.parameters = list()
         self.mesh_mappings = list()
 
@@ -47,8 +95,31 @@ class Config:
         if 'num_samples' in config_data: self.num_samples = config_data['num_samples']
         if 'start_frame' in config_data: self.start_frame = config_data['start_frame']
         if 'random_seed' in config_data: self.random_seed = config_data['random_seed']
+        if 'seed_mode' in config_data: self.seed_mode = config_data['seed_mode']
+        if 'sampling_strategy' in config_data: self.sampling_strategy = config_data['sampling_strategy']
+        if 'rotation_sampling_mode' in config_data: self.rotation_sampling_mode = config_data['rotation_sampling_mode']
+        if 'prior_source' in config_data: self.prior_source = config_data['prior_source']
+        if 'prior_file' in config_data: self.prior_file = config_data['prior_file']
+        if 'prior_start_frame' in config_data: self.prior_start_frame = config_data['prior_start_frame']
+        if 'prior_end_frame' in config_data: self.prior_end_frame = config_data['prior_end_frame']
+        if 'prior_ratio' in config_data: self.prior_ratio = config_data['prior_ratio']
+        if 'prior_num_components' in config_data: self.prior_num_components = config_data['prior_num_components']
+        if 'constraints' in config_data: self.constraints = list(config_data['constraints'])
+        if 'mirror_poses' in config_data: self.mirror_poses = config_data['mirror_poses']
+        if 'mirror_pairs' in config_data: self.mirror_pairs = list(config_data['mirror_pairs'])
+        if 'mirror_patterns' in config_data: self.mirror_patterns = list(config_data['mirror_patterns'])
+        if 'mirror_negated_channels' in config_data:
+            self.mirror_negated_channels = list(config_data['mirror_negated_channels'])
+        if 'min_pose_distance' in config_data: self.min_pose_distance = config_data['min_pose_distance']
+        if 'adaptive_num_samples' in config_data: self.adaptive_num_samples = config_data['adaptive_num_samples']
+        if 'adaptive_chunk_size' in config_data: self.adaptive_chunk_size = config_data['adaptive_chunk_size']
+        if 'adaptive_min_improvement' in config_data:
+            self.adaptive_min_improvement = config_data['adaptive_min_improvement']
+        if 'checkpoint_interval' in config_data: self.checkpoint_interval = config_data['checkpoint_interval']
+        if 'keyframe_flush_interval' in config_data:
+            self.keyframe_flush_interval = config_data['keyframe_flush_interval']
         if 'controller_probability' in config_data: self.controller_probability = config_data['controller_probability']
-        if 'set_max_min_probability' in config_data: self.set_max_probability = config_data['set_max_min_probability']
+        if 'set_max_min_probability' in config_data: self.set_max_min_probability = config_data['set_max_min_probability']
 
         if 'output_fbx_file' in config_data: self.output_fbx_file = config_data['output_fbx_file']
         if 'output_abc_file' in config_data: self.output_abc_file = config_data['output_abc_file']
@@ -58,6 +129,19 @@ class Config:
         if 'collision_mesh' in config_data: self.collision_mesh = config_data['collision_mesh']
         if 'collision_mode' in config_data: self.collision_mode = config_data['collision_mode']
         if 'allowed_collisions' in config_data: self.allowed_collisions = config_data['allowed_collisions']
+        if 'intersection_engine' in config_data: self.intersection_engine = config_data['intersection_engine']
+        if 'prioritize_colliding_faces' in config_data:
+            self.prioritize_colliding_faces = config_data['prioritize_colliding_faces']
+        if 'collision_batch_size' in config_data: self.collision_batch_size = config_data['collision_batch_size']
+        if 'collision_repair_mode' in config_data: self.collision_repair_mode = config_data['collision_repair_mode']
+        if 'collision_repair_iterations' in config_data:
+            self.collision_repair_iterations = config_data['collision_repair_iterations']
+        if 'adaptive_group_probability' in config_data:
+            self.adaptive_group_probability = config_data['adaptive_group_probability']
+        if 'adaptive_probability_min' in config_data:
+            self.adaptive_probability_min = config_data['adaptive_probability_min']
+        if 'adaptive_probability_max' in config_data:
+            self.adaptive_probability_max = config_data['adaptive_probability_max']
         if 'collision_retry_attempts' in config_data: 
             self.collision_retry_attempts = config_data['collision_retry_attempts']
 
@@ -95,6 +179,9 @@ class Config:
             if 'max_value' in parameter_data: new_parameter.max_value = parameter_data['max_value']
             if 'object_type' in parameter_data: new_parameter.object_type = parameter_data['object_type']
             if 'group_name' in parameter_data: new_parameter.group_name = parameter_data['group_name']
+            if 'distribution' in parameter_data: new_parameter.distribution = parameter_data['distribution']
+            if 'distribution_params' in parameter_data:
+                new_parameter.distribution_params = list(parameter_data['distribution_params'])
 
             self.parameters.append(new_parameter)
 
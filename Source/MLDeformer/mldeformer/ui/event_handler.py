@@ -11,6 +11,7 @@ from .config import Config
 from .json_encoder import JsonEncoder
 from .global_settings import GlobalSettings
 from mldeformer.generator.maya.generation import pose_generator
+from mldeformer.generator.maya.generation import sharding
 
 # Event handler base class.
 class EventHandler(object):
@@ -57,6 +58,9 @@ class EventHandler(object):
 
         self.generator_config = Config(self.output_path)
 
+        # Coverage statistics of the last generated poses, a CoverageStatistics.
+        self.coverage_statistics = None
+
         if not self.load_attribute_min_max_setup_from_file(self.min_max_settings_file):
             self.register_default_min_max_setup()
 
@@ -123,10 +127,19 @@ class EventHandler(object):
     def stop_progress_bar(self):
         raise Exception('Please implement the stop_progress_bar function in your derived event handler!')
 
-    # generate the frames in the DCC scene.
-    def generate(self):
+    # generate the frames in the DCC scene, or continue an interrupted generation from its checkpoint.
+    def generate(self, resume=False):
+        try:
+            return pose_generator.generate_samples_from_gui(self, resume)
+        except Exception as message:
+            traceback.print_exc()
+            print(str(message))
+            return False, str(message)
+
+    # generate the frames in several DCC processes in parallel, and merge them into the current scene.
+    def generate_sharded(self, num_shards=None, mayapy=None, num_processes=None):
         try:
-            return pose_generator.generate_samples_from_gui(self)
+            return sharding.generate_samples_sharded(self, num_shards, mayapy, num_processes)
         except Exception as message:
             traceback.print_exc()
             print(str(message))
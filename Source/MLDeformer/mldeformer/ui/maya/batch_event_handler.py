@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+
+from mldeformer.ui.maya.maya_event_handler import MayaEventHandler
+
+
+# Event handler for headless sessions, such as mayapy shard workers.
+# There is no main window or progress bar in those sessions, so progress is printed instead.
+class BatchEventHandler(MayaEventHandler):
+    def __init__(self, log_prefix='[MLDeformer]'):
+        super(BatchEventHandler, self).__init__()
+        self.log_prefix = log_prefix
+        self.last_progress_percentage = -1
+
+    def get_parent_window(self):
+        return None
+
+    # Start a new progress session, which just prints the status.
+    def start_progress_bar(self, status_text='Processing...', interruptable=True):
+        self.last_progress_percentage = -1
+        print('{} {}'.format(self.log_prefix, status_text))
+
+    # Print the progress in steps of ten percent, to keep the logs readable.
+    def set_progress_bar_value(self, progress_percentage):
+        if progress_percentage // 10 != self.last_progress_percentage // 10:
+            print('{} {}%'.format(self.log_prefix, progress_percentage))
+        self.last_progress_percentage = progress_percentage
+
+    # There is no user that can cancel.
+    def is_progress_bar_cancelled(self):
+        return False
+
+    def stop_progress_bar(self):
+        self.last_progress_percentage = -1
@@ -110,13 +110,17 @@ class MayaEventHandler(EventHandler):
             ray_mesh = self.generator_config.ray_mesh
             collision_mesh = self.generator_config.collision_mesh
             allowed_collisions = self.generator_config.allowed_collisions
+            intersection_engine = self.generator_config.intersection_engine
+            prioritize_faces = self.generator_config.prioritize_colliding_faces
             if ray_mesh != "" and collision_mesh != "": 
-                return check_interpenetrations.create_ray_mesh_test(ray_mesh, collision_mesh, allowed_collisions)
+                return check_interpenetrations.create_ray_mesh_test(ray_mesh, collision_mesh, allowed_collisions,
+                                                                    intersection_engine, prioritize_faces)
         elif self.generator_config.collision_mode == 2:
             collision_mesh = self.generator_config.collision_mesh
+            allowed_collisions = self.generator_config.allowed_collisions
             bone_list = [] 
             if collision_mesh != "":
-                return check_interpenetrations.create_bone_mesh_test(bone_list, collision_mesh)
+                return check_interpenetrations.create_bone_mesh_test(bone_list, collision_mesh, allowed_collisions)
     
         return None
 
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 # Copyright Epic Games, Inc. All Rights Reserved
 
+from mldeformer.generator.sampling import distributions
+
+
 # A rig parameter.
 # This is basically an attribute on an object.
 # The parameter has a given minimum and maximum value, as well as a default value.
 # The display name is what you see in the table in the UI, while the actual name is the identifier inside the DCC.
+# The distribution defines how values are sampled inside the range, its parameters depend on the distribution type.
 class Parameter:
+    DISTRIBUTION_UNIFORM = distributions.DISTRIBUTION_UNIFORM
+    DISTRIBUTION_NORMAL = distributions.DISTRIBUTION_NORMAL
+    DISTRIBUTION_BETA = distributions.DISTRIBUTION_BETA
+    DISTRIBUTION_DISCRETE = distributions.DISTRIBUTION_DISCRETE
+    DISTRIBUTION_LOG_UNIFORM = distributions.DISTRIBUTION_LOG_UNIFORM
+
     def __init__(self):
         self.name = ''
         self.display_name = ''
@@ -14,3 +24,5 @@ class Parameter:
         self.max_value = 1.0
         self.object_type = ''
         self.group_name = ''
+        self.distribution = Parameter.DISTRIBUTION_UNIFORM
+        self.distribution_params = list()
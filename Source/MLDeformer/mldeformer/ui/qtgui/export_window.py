@@ -9,6 +9,7 @@ import maya.cmds as cmds
 from PySide2 import QtCore
 from PySide2 import QtGui
 from PySide2 import QtWidgets
+from mldeformer.generator.maya.generation.fast_generation import FastGenerationContext
 from mldeformer.ui.qtgui.helpers import QtHelpers
 from mldeformer.ui.qtgui.file_picker_field_widget import FilePickerFieldWidget
 from mldeformer.ui.qtgui.mesh_mapping_widget import MeshMappingWidget
@@ -163,45 +164,44 @@ class DeformerExportWindow(TopLevelWindow):
             pre_check_errors.append(self.output_abc_file_widget.error_text)
 
         error_list = list()
+        user_cancelled = False
         start_time = time.time()
-        cmds.refresh(suspend=True)
 
         try:
-            # save the Fbx.
-            if self.output_fbx_file_widget.is_checked():
-                print('[MLDeformer] Saving Fbx to file {}'.format(config.output_fbx_file))
-                self.event_handler.start_progress_bar('Saving Fbx...')
-                saved_fbx, fbx_error_message = self.event_handler.save_fbx()
-                if not saved_fbx:
-                    error_message = 'Failed to save Fbx file:<br><b>' + config.output_fbx_file + '</b><br><font color="yellow">' + fbx_error_message + '</font>'
-                    error_list.append(error_message)
-                    print('[MLDeformer] Failed to save Fbx file')
-                user_cancelled = self.event_handler.is_progress_bar_cancelled()
-                self.event_handler.stop_progress_bar()
-
-            if user_cancelled:
-                QtWidgets.QMessageBox.information(self, 'Operation cancelled', 'Generation cancelled by user.',
-                                                  QtWidgets.QMessageBox.Ok)
-                return
-
-            # save the Alembic if we enabled exporting it, and if there is actually a target mesh.
-            if self.output_abc_file_widget.is_checked() and (
-                self.event_handler.get_first_enabled_mesh_mapping_index_with_target_mesh() != -1):
-                print('[MLDeformer] Saving Alembic to file {}'.format(config.output_abc_file))
-                self.event_handler.start_progress_bar('Saving Alembic...')
-                saved_alembic, abc_error_message = self.event_handler.save_alembic()
-                if not saved_alembic:
-                    error_message = 'Failed to save Alembic file:<br><b>' + config.output_abc_file + '</b><br><font color="yellow">' + abc_error_message + '</font>'
-                    error_list.append(error_message)
-                    print('[MLDeformer] Failed to save Alembic file')
-                user_cancelled = self.event_handler.is_progress_bar_cancelled()
-                self.event_handler.stop_progress_bar()
+            with FastGenerationContext('Export'):
+                # save the Fbx.
+                if self.output_fbx_file_widget.is_checked():
+                    print('[MLDeformer] Saving Fbx to file {}'.format(config.output_fbx_file))
+                    self.event_handler.start_progress_bar('Saving Fbx...')
+                    saved_fbx, fbx_error_message = self.event_handler.save_fbx()
+                    if not saved_fbx:
+                        error_message = 'Failed to save Fbx file:<br><b>' + config.output_fbx_file + '</b><br><font color="yellow">' + fbx_error_message + '</font>'
+                        error_list.append(error_message)
+                        print('[MLDeformer] Failed to save Fbx file')
+                    user_cancelled = self.event_handler.is_progress_bar_cancelled()
+                    self.event_handler.stop_progress_bar()
+
+                if user_cancelled:
+                    QtWidgets.QMessageBox.information(self, 'Operation cancelled', 'Generation cancelled by user.',
+                                                      QtWidgets.QMessageBox.Ok)
+                    return
+
+                # save the Alembic if we enabled exporting it, and if there is actually a target mesh.
+                if self.output_abc_file_widget.is_checked() and (
+                    self.event_handler.get_first_enabled_mesh_mapping_index_with_target_mesh() != -1):
+                    print('[MLDeformer] Saving Alembic to file {}'.format(config.output_abc_file))
+                    self.event_handler.start_progress_bar('Saving Alembic...')
+                    saved_alembic, abc_error_message = self.event_handler.save_alembic()
+                    if not saved_alembic:
+                        error_message = 'Failed to save Alembic file:<br><b>' + config.output_abc_file + '</b><br><font color="yellow">' + abc_error_message + '</font>'
+                        error_list.append(error_message)
+                        print('[MLDeformer] Failed to save Alembic file')
+                    user_cancelled = self.event_handler.is_progress_bar_cancelled()
+                    self.event_handler.stop_progress_bar()
         except RuntimeError:
             error_message = 'Unexpected runtime error when saving fbx or alembic file'
             error_list.append(error_message)
             print('[MLDeformer] Unexpected runtime error')
-        finally:
-            cmds.refresh(suspend=False)
 
         if user_cancelled:
             QtWidgets.QMessageBox.information(self, 'Operation cancelled', 'Generation cancelled by user.',
@@ -360,6 +360,12 @@ class DeformerMainWindow(TopLevelWindow):
         self.generate_button.clicked.connect(self.on_generate_button_pressed)
         self.right_layout.addWidget(self.generate_button)
 
+        # Add the resume button, which continues an interrupted generation from its last checkpoint.
+        self.resume_button = QtWidgets.QPushButton('Resume')
+        self.resume_button.setToolTip('Continue the last interrupted generation from its checkpoint')
+        self.resume_button.clicked.connect(self.on_resume_button_pressed)
+        self.right_layout.addWidget(self.resume_button)
+
         # ----------------------------------------------------------
         # Create the splitter.
         self.splitter = QtWidgets.QSplitter(QtCore.Qt.Orientation.Horizontal)
@@ -521,6 +527,14 @@ class DeformerMainWindow(TopLevelWindow):
     
     # When we press the Generate button.
     def on_generate_button_pressed(self):
+        self.generate_training_data(resume=False)
+
+    # When we press the Resume button.
+    def on_resume_button_pressed(self):
+        self.generate_training_data(resume=True)
+
+    # Generate the training data, or continue the generation from its checkpoint.
+    def generate_training_data(self, resume):
         config = self.event_handler.generator_config
 
         # Build a list of errors.
@@ -556,9 +570,12 @@ class DeformerMainWindow(TopLevelWindow):
             return
 
         # Generate the animation.
-        print('[MLDeformer] Generating {} frames with poses...'.format(config.num_samples))
+        if resume:
+            print('[MLDeformer] Resuming the generation of {} frames with poses...'.format(config.num_samples))
+        else:
+            print('[MLDeformer] Generating {} frames with poses...'.format(config.num_samples))
         start_time = time.time()
-        generate_success, generate_error = self.event_handler.generate()
+        generate_success, generate_error = self.event_handler.generate(resume)
         user_cancelled = self.event_handler.is_progress_bar_cancelled()
         self.event_handler.stop_progress_bar()  # Make sure we stop the progress bar.
 
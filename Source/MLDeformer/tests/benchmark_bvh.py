@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Benchmark of the triangle hierarchy used by the NumPy intersection engine, against a brute force test.
+Run it with a plain python interpreter from the tests folder:
+
+    python benchmark_bvh.py --resolution 100 --num-rays 20000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import conftest  # noqa: F401, makes the mldeformer package importable without Maya
+from mldeformer.generator.utils.mesh.bvh import TriangleBVH
+from test_bvh import count_intersections_brute_force
+
+
+def create_sphere_mesh(resolution, radius=10.0):
+    """UV sphere with 2 * resolution segments around and resolution rings."""
+    num_around = 2 * resolution
+    theta = np.linspace(0.0, np.pi, resolution + 1)
+    phi = np.linspace(0.0, 2.0 * np.pi, num_around, endpoint=False)
+    theta, phi = np.meshgrid(theta, phi, indexing='ij')
+    vertices = radius * np.stack((np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)),
+                                 axis=-1).reshape(-1, 3)
+    ring = np.arange(resolution)[:, None] * num_around
+    a = (ring + np.arange(num_around)[None, :]).ravel()
+    b = (ring + (np.arange(num_around)[None, :] + 1) % num_around).ravel()
+    triangles = np.concatenate((np.stack((a, b, b + num_around), axis=1),
+                                np.stack((a, b + num_around, a + num_around), axis=1)))
+    return vertices, triangles
+
+
+def time_call(function, *args, **kwargs):
+    start_time = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ray-triangle hierarchy.')
+    parser.add_argument('--resolution', type=int, default=100, help='Number of sphere rings')
+    parser.add_argument('--num-rays', type=int, default=20000, help='Number of rays')
+    parser.add_argument('--num-brute-force-rays', type=int, default=500,
+                        help='Number of rays that are also tested against all triangles')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the rays and the deformation')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vertices, triangles = create_sphere_mesh(args.resolution)
+    # Rays start from points near the surface, like the face centers of the collision test.
+    origins = vertices[rng.integers(len(vertices), size=args.num_rays)] * rng.uniform(0.9, 1.1, (args.num_rays, 1))
+    directions = rng.normal(size=(args.num_rays, 3))
+    print('{} triangles, {} rays'.format(len(triangles), args.num_rays))
+
+    bvh, build_time = time_call(TriangleBVH, vertices, triangles)
+    print('Build:            {:8.3f}s, {} nodes'.format(build_time, bvh.num_nodes))
+    deformed = vertices * np.array([1.3, 0.8, 1.0]) + rng.normal(scale=0.05, size=vertices.shape)
+    _, refit_time = time_call(bvh.refit, deformed)
+    print('Refit:            {:8.3f}s'.format(refit_time))
+    counts, count_time = time_call(bvh.count_intersections, origins, directions)
+    print('Hierarchy:        {:8.3f}s, {:.0f} rays per second'.format(count_time, args.num_rays / max(count_time, 1e-9)))
+
+    num_brute_force = min(args.num_brute_force_rays, args.num_rays)
+    expected, brute_force_time = time_call(count_intersections_brute_force, deformed, triangles,
+                                           origins[:num_brute_force], directions[:num_brute_force])
+    rays_per_second = num_brute_force / max(brute_force_time, 1e-9)
+    print('Brute force:      {:8.3f}s for {} rays, {:.0f} rays per second'.format(
+        brute_force_time, num_brute_force, rays_per_second))
+    print('Speedup:          {:8.1f}x'.format(args.num_rays / max(count_time, 1e-9) / rays_per_second))
+    print('Equal counts:     {}'.format(np.array_equal(counts[:num_brute_force], expected)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Test setup that runs the Maya-free parts of the generator with a plain python interpreter.
+The maya stub package is put on the python path, and the mldeformer package is registered without
+running its __init__, which imports the Qt based user interface.
+"""
+
+import os
+import sys
+import types
+
+TESTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_FOLDER = os.path.join(os.path.dirname(TESTS_FOLDER), 'mldeformer')
+
+sys.path.insert(0, os.path.join(TESTS_FOLDER, 'maya_stub'))
+
+if 'mldeformer' not in sys.modules:
+    mldeformer = types.ModuleType('mldeformer')
+    mldeformer.__path__ = [PACKAGE_FOLDER]
+    sys.modules['mldeformer'] = mldeformer
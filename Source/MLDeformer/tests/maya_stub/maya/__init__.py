@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+"""
+Stand-in for the maya package, so the Maya-free parts of the generator can be tested outside of mayapy.
+Every attribute of the stub modules is a MayaStub, which accepts any attribute access and call.
+Tests that need real results from Maya patch the functions they use.
+"""
+
+
+class MayaStub(object):
+    """Any Maya function, class or constant. Attributes and calls return new stubs."""
+
+    def __init__(self, name):
+        self.stub_name = name
+
+    def __getattr__(self, name):
+        return MayaStub('{}.{}'.format(self.stub_name, name))
+
+    def __call__(self, *args, **kwargs):
+        return MayaStub('{}()'.format(self.stub_name))
+
+    def __repr__(self):
+        return '<MayaStub {}>'.format(self.stub_name)
+
+
+def create_stub_getattr(module_name):
+    return lambda name: MayaStub('{}.{}'.format(module_name, name))
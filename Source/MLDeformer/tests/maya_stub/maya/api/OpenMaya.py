@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+from maya import create_stub_getattr
+
+__getattr__ = create_stub_getattr('maya.api.OpenMaya')
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.utils.mesh.bvh import TriangleBVH, DEFAULT_MAX_DISTANCE, transform_rays
+
+
+def count_intersections_brute_force(vertices, triangles, origins, directions, max_distance=DEFAULT_MAX_DISTANCE,
+                                    tolerance=1e-6, triangle_faces=None):
+    """Moller-Trumbore test of every ray against every triangle, counting the hit faces when triangle_faces is given.
+    """
+    tri_vertices = np.asarray(vertices, dtype=np.float64)[triangles]
+    v0 = tri_vertices[:, 0]
+    edge1 = tri_vertices[:, 1] - v0
+    edge2 = tri_vertices[:, 2] - v0
+    counts = np.zeros(len(origins), dtype=np.int64)
+    for ray_index, (origin, direction) in enumerate(zip(origins, directions)):
+        # The same operations as the hierarchy, so rays that graze edges are rounded the same way.
+        direction = np.broadcast_to(direction, edge2.shape)
+        p = np.cross(direction, edge2)
+        det = np.einsum('ij,ij->i', edge1, p)
+        valid = np.abs(det) > 1e-12
+        inv_det = np.zeros_like(det)
+        inv_det[valid] = 1.0 / det[valid]
+        s = origin - v0
+        u = np.einsum('ij,ij->i', s, p) * inv_det
+        q = np.cross(s, edge1)
+        v = np.einsum('ij,ij->i', direction, q) * inv_det
+        t = np.einsum('ij,ij->i', edge2, q) * inv_det
+        hit = valid & (u >= 0.0) & (v >= 0.0) & (u + v <= 1.0) & (t > tolerance) & (t <= max_distance)
+        counts[ray_index] = np.count_nonzero(hit) if triangle_faces is None else len(set(triangle_faces[hit]))
+    return counts
+
+
+def create_grid_mesh(num_x, num_y, rng=None, noise=0.0):
+    """Triangulated grid on integer coordinates in the z=0 plane, optionally with noisy heights."""
+    x, y = np.meshgrid(np.arange(num_x + 1, dtype=np.float64), np.arange(num_y + 1, dtype=np.float64))
+    z = rng.normal(scale=noise, size=x.shape) if rng is not None else np.zeros_like(x)
+    vertices = np.stack((x.ravel(), y.ravel(), z.ravel()), axis=1)
+    corners = (np.arange(num_y)[:, None] * (num_x + 1) + np.arange(num_x)[None, :]).ravel()
+    triangles = np.concatenate((np.stack((corners, corners + 1, corners + num_x + 2), axis=1),
+                                np.stack((corners, corners + num_x + 2, corners + num_x + 1), axis=1)))
+    return vertices, triangles
+
+
+def get_grid_quad_faces(num_x, num_y):
+    """Face index of every triangle of create_grid_mesh, the two triangles of a grid cell make up a quad."""
+    return np.tile(np.arange(num_x * num_y), 2)
+
+
+def create_random_rays(rng, num_rays, center, scale):
+    origins = center + rng.normal(scale=scale, size=(num_rays, 3))
+    directions = rng.normal(size=(num_rays, 3))
+    return origins, directions
+
+
+def get_grazing_rays(rng, vertices, triangles, num_rays):
+    """Rays that pass exactly through shared vertices, along edges or through edge midpoints."""
+    origins = []
+    directions = []
+    for _ in range(num_rays):
+        triangle = triangles[rng.integers(len(triangles))]
+        corner, other = rng.choice(3, size=2, replace=False)
+        target = vertices[triangle[corner]]
+        if rng.random() < 0.5:
+            target = 0.5 * (target + vertices[triangle[other]])
+        origin = target + rng.normal(size=3)
+        origins.append(origin)
+        directions.append(target - origin)
+    return np.array(origins), np.array(directions)
+
+
+def get_axis_aligned_rays(vertices):
+    """Rays along the coordinate axes through the vertices, they lie in the planes of the node boxes."""
+    origins = []
+    directions = []
+    for axis in range(3):
+        direction = np.zeros(3)
+        direction[axis] = 1.0
+        for vertex in vertices:
+            origin = vertex.copy()
+            origin[axis] -= 10.0
+            origins.append(origin)
+            directions.append(direction)
+    return np.array(origins), np.array(directions)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_triangles_match_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    num_triangles = 200
+    vertices = rng.uniform(-5.0, 5.0, size=(3 * num_triangles, 3))
+    triangles = np.arange(3 * num_triangles).reshape(-1, 3)
+    origins, directions = create_random_rays(rng, 500, 0.0, 5.0)
+
+    bvh = TriangleBVH(vertices, triangles, leaf_size=4)
+    np.testing.assert_array_equal(bvh.count_intersections(origins, directions),
+                                  count_intersections_brute_force(vertices, triangles, origins, directions))
+
+
+@pytest.mark.parametrize('seed, noise', [(0, 0.0), (1, 0.0), (2, 0.3), (3, 0.3)])
+def test_grazing_rays_match_brute_force(seed, noise):
+    rng = np.random.default_rng(seed)
+    vertices, triangles = create_grid_mesh(12, 9, rng, noise)
+    grazing_origins, grazing_directions = get_grazing_rays(rng, vertices, triangles, 300)
+    aligned_origins, aligned_directions = get_axis_aligned_rays(vertices)
+    origins = np.concatenate((grazing_origins, aligned_origins))
+    directions = np.concatenate((grazing_directions, aligned_directions))
+
+    expected = count_intersections_brute_force(vertices, triangles, origins, directions)
+    # The rays through shared vertices and edges must hit more than one triangle for the test to mean anything.
+    assert np.any(expected > 1)
+    bvh = TriangleBVH(vertices, triangles, leaf_size=2)
+    np.testing.assert_array_equal(bvh.count_intersections(origins, directions, chunk_size=97), expected)
+
+
+def test_refit_matches_brute_force():
+    rng = np.random.default_rng(5)
+    vertices, triangles = create_grid_mesh(10, 10, rng, 0.2)
+    origins, directions = create_random_rays(rng, 400, np.array([5.0, 5.0, 0.0]), 4.0)
+    bvh = TriangleBVH(vertices, triangles)
+
+    deformed = vertices * np.array([1.5, 0.7, 2.0]) + rng.normal(scale=0.3, size=vertices.shape)
+    bvh.refit(deformed)
+    np.testing.assert_array_equal(bvh.count_intersections(origins, directions),
+                                  count_intersections_brute_force(deformed, triangles, origins, directions))
+
+
+def test_max_distance_and_tolerance():
+    vertices, triangles = create_grid_mesh(2, 2)
+    bvh = TriangleBVH(vertices, triangles)
+    origins = np.array([[0.5, 0.25, -1.0], [0.5, 0.25, -1.0], [0.5, 0.25, 0.0]])
+    directions = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, 0.5], [0.0, 0.0, 1.0]])
+    # The ray parameter is in units of the direction length, hits at the origin are ignored.
+    np.testing.assert_array_equal(bvh.count_intersections(origins, directions, max_distance=1.5), [1, 0, 0])
+
+
+@pytest.mark.parametrize('seed, noise', [(0, 0.0), (1, 0.3)])
+def test_quad_faces_count_once(seed, noise):
+    rng = np.random.default_rng(seed)
+    vertices, triangles = create_grid_mesh(8, 6, rng, noise)
+    triangle_faces = get_grid_quad_faces(8, 6)
+    grazing_origins, grazing_directions = get_grazing_rays(rng, vertices, triangles, 300)
+    random_origins, random_directions = create_random_rays(rng, 300, np.array([4.0, 3.0, 0.0]), 3.0)
+    origins = np.concatenate((grazing_origins, random_origins))
+    directions = np.concatenate((grazing_directions, random_directions))
+
+    expected = count_intersections_brute_force(vertices, triangles, origins, directions,
+                                               triangle_faces=triangle_faces)
+    triangle_counts = count_intersections_brute_force(vertices, triangles, origins, directions)
+    # Rays through the quad diagonals hit two triangles of one face.
+    assert np.any(expected < triangle_counts)
+    # A small leaf size puts the triangles of a quad in different leaves.
+    bvh = TriangleBVH(vertices, triangles, leaf_size=1, triangle_faces=triangle_faces)
+    np.testing.assert_array_equal(bvh.count_intersections(origins, directions, chunk_size=61), expected)
+
+
+def test_quad_diagonal_hits_one_face():
+    vertices, triangles = create_grid_mesh(1, 1)
+    origins = np.array([[0.5, 0.5, -1.0], [0.25, 0.75, -1.0]])
+    directions = np.array([[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]])
+    np.testing.assert_array_equal(TriangleBVH(vertices, triangles).count_intersections(origins, directions), [2, 1])
+    quad_bvh = TriangleBVH(vertices, triangles, triangle_faces=get_grid_quad_faces(1, 1))
+    np.testing.assert_array_equal(quad_bvh.count_intersections(origins, directions), [1, 1])
+
+
+@pytest.mark.parametrize('scale', [0.01, 1.0, 37.0])
+def test_transformed_rays_keep_the_world_max_distance(scale):
+    rng = np.random.default_rng(11)
+    vertices, triangles = create_grid_mesh(10, 10, rng, 0.5)
+    rotation, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    world_matrix = np.eye(4)
+    world_matrix[:3, :3] = rotation * np.array([scale, 0.5 * scale, 2.0 * scale])
+    world_matrix[3, :3] = rng.normal(size=3)
+    world_vertices = np.dot(vertices, world_matrix[:3, :3]) + world_matrix[3, :3]
+
+    origins, directions = create_random_rays(rng, 600, world_vertices.mean(axis=0), 5.0 * scale)
+    # Unit world directions with a cutoff inside the mesh, so the maximum distance decides some hits.
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+    max_distance = 6.0 * scale
+    expected = TriangleBVH(world_vertices, triangles).count_intersections(origins, directions, max_distance)
+    assert np.count_nonzero(expected) > 0
+    assert np.any(expected != TriangleBVH(world_vertices, triangles).count_intersections(origins, directions))
+
+    object_origins, object_directions, max_distances = transform_rays(origins, directions,
+                                                                      np.linalg.inv(world_matrix), max_distance)
+    np.testing.assert_allclose(np.linalg.norm(object_directions, axis=1), 1.0)
+    counts = TriangleBVH(vertices, triangles).count_intersections(object_origins, object_directions, max_distances)
+    np.testing.assert_array_equal(counts, expected)
+
+
+def test_empty_inputs():
+    vertices, triangles = create_grid_mesh(1, 1)
+    bvh = TriangleBVH(vertices, triangles)
+    assert bvh.count_intersections(np.zeros((0, 3)), np.zeros((0, 3))).shape == (0,)
+    empty_bvh = TriangleBVH(np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64))
+    np.testing.assert_array_equal(empty_bvh.count_intersections(np.zeros((2, 3)), np.ones((2, 3))), [0, 0])
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import os
+
+import numpy as np
+import pytest
+
+from mldeformer.generator.sampling import checkpoint
+from mldeformer.generator.sampling.pose_sampler import PoseSampler
+from mldeformer.generator.sampling.quasi_random import SAMPLING_STRATEGY_LATIN_HYPERCUBE, SAMPLING_STRATEGY_SOBOL, \
+    SAMPLING_STRATEGY_UNIFORM
+
+NUM_CONTROLLERS = 12
+CONTROLLER_NAMES = ['ctrl_{}.translateX'.format(index) for index in range(NUM_CONTROLLERS)]
+TARGET_GROUPS = dict(('group_{}'.format(index), [2 * index, 2 * index + 1]) for index in range(NUM_CONTROLLERS // 2))
+NUM_FRAMES = 500
+SETTINGS_HASH = checkpoint.get_settings_hash({'random_seed': 5})
+
+
+def create_sampler(sampling_strategy):
+    return PoseSampler(CONTROLLER_NAMES, TARGET_GROUPS, 0.3, [1.0] * NUM_CONTROLLERS, [0.0] * NUM_CONTROLLERS,
+                       [0.0] * NUM_CONTROLLERS, random_seed=5, batch_size=64, sampling_strategy=sampling_strategy)
+
+
+def generate(pose_sampler, poses, end_frame, checkpoint_writer=None, checkpoint_interval=0):
+    """Generate the frames up to end_frame, adapting the group probabilities and saving checkpoints on the way."""
+    for frame in range(len(poses), end_frame):
+        poses.append(pose_sampler.next_pose())
+        if (frame + 1) % 100 == 0:
+            pose_sampler.set_group_probabilities(np.linspace(0.1, 0.9, len(TARGET_GROUPS)))
+        if checkpoint_writer is not None and ((frame + 1) % checkpoint_interval == 0 or frame + 1 == end_frame):
+            save_checkpoint(checkpoint_writer, pose_sampler, poses)
+    return poses
+
+
+def save_checkpoint(checkpoint_writer, pose_sampler, poses):
+    num_saved_poses = checkpoint_writer.num_saved_poses
+    state, arrays = pose_sampler.get_state()
+    checkpoint_writer.save(SETTINGS_HASH, np.arange(num_saved_poses, len(poses)), np.array(poses[num_saved_poses:]),
+                           len(poses), {'sampler': state}, arrays)
+
+
+@pytest.mark.parametrize('sampling_strategy', [SAMPLING_STRATEGY_UNIFORM, SAMPLING_STRATEGY_SOBOL,
+                                               SAMPLING_STRATEGY_LATIN_HYPERCUBE])
+@pytest.mark.parametrize('crash_frame', [37, 250])
+def test_resumed_generation_matches_uninterrupted_generation(tmp_path, sampling_strategy, crash_frame):
+    file_path = str(tmp_path / checkpoint.CHECKPOINT_FILE_NAME)
+    expected = np.array(generate(create_sampler(sampling_strategy), [], NUM_FRAMES))
+
+    # A crash while saving leaves poses in the pose file that the last state doesn't cover.
+    interrupted = generate(create_sampler(sampling_strategy), [], crash_frame, checkpoint.CheckpointWriter(file_path),
+                           checkpoint_interval=30)
+    with open(checkpoint.get_pose_file_path(file_path), 'ab') as pose_file:
+        pose_file.write(np.ones(3 * (NUM_CONTROLLERS + 1)).tobytes())
+
+    loaded = checkpoint.GenerationCheckpoint.load_from_file(file_path)
+    assert loaded.settings_hash == SETTINGS_HASH and loaded.next_frame == crash_frame
+    np.testing.assert_array_equal(loaded.frame_times, np.arange(crash_frame))
+    np.testing.assert_array_equal(loaded.poses, np.array(interrupted))
+
+    pose_sampler = create_sampler(sampling_strategy)
+    pose_sampler.set_state(loaded.state['sampler'], loaded.arrays)
+    checkpoint_writer = checkpoint.CheckpointWriter(file_path, len(loaded.poses))
+    resumed = generate(pose_sampler, list(loaded.poses), NUM_FRAMES, checkpoint_writer, checkpoint_interval=50)
+    np.testing.assert_array_equal(np.array(resumed), expected)
+
+    # The ignored poses are cut off, the pose file holds every frame exactly once.
+    loaded = checkpoint.GenerationCheckpoint.load_from_file(file_path)
+    np.testing.assert_array_equal(loaded.poses, expected)
+    np.testing.assert_array_equal(loaded.frame_times, np.arange(NUM_FRAMES))
+    assert os.path.getsize(checkpoint.get_pose_file_path(file_path)) == NUM_FRAMES * (NUM_CONTROLLERS + 1) * 8
+
+
+def test_missing_poses_and_removal(tmp_path):
+    file_path = str(tmp_path / checkpoint.CHECKPOINT_FILE_NAME)
+    generate(create_sampler(SAMPLING_STRATEGY_UNIFORM), [], 40, checkpoint.CheckpointWriter(file_path),
+             checkpoint_interval=20)
+    pose_file_path = checkpoint.get_pose_file_path(file_path)
+    with open(pose_file_path, 'r+b') as pose_file:
+        pose_file.truncate(10 * (NUM_CONTROLLERS + 1) * 8)
+    with pytest.raises(IOError):
+        checkpoint.GenerationCheckpoint.load_from_file(file_path)
+
+    checkpoint.remove_checkpoint(file_path)
+    assert not os.path.exists(file_path) and not os.path.exists(pose_file_path)
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+
+from mldeformer.generator.sampling.distributions import ControllerDistributions, DISTRIBUTION_BETA, \
+    DISTRIBUTION_UNIFORM, get_beta_inverse_cdf_table
+
+
+def test_beta_columns_with_shared_parameters_are_grouped():
+    types = [DISTRIBUTION_BETA] * 5 + [DISTRIBUTION_UNIFORM]
+    parameters = [[2.0, 5.0], [], [2.0, 5.0], [0.5, 0.5], [2.0, 2.0], []]
+    min_values = -np.ones(6)
+    max_values = np.arange(6) + 1.0
+    distributions = ControllerDistributions(types, parameters, min_values, max_values, np.zeros(6))
+    assert sorted(columns.tolist() for columns, _, _ in distributions.beta_groups) == [[0, 2], [1, 4], [3]]
+
+    unit_samples = np.random.default_rng(0).random((500, 6))
+    values = distributions.transform(unit_samples)
+    for column, (alpha, beta) in enumerate([(2.0, 5.0), (2.0, 2.0), (2.0, 5.0), (0.5, 0.5), (2.0, 2.0)]):
+        probabilities, fractions = get_beta_inverse_cdf_table(alpha, beta)
+        expected = min_values[column] + (max_values[column] - min_values[column]) * np.interp(
+            unit_samples[:, column], probabilities, fractions)
+        np.testing.assert_array_equal(values[:, column], expected)
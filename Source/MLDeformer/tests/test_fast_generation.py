@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import pytest
+
+from mldeformer.generator.maya.generation import fast_generation
+
+
+class FakeCmds(object):
+    """Scene state of the commands used by the fast generation context, recording the undo state of every call."""
+
+    def __init__(self, batch=False):
+        self.batch = batch
+        self.undo_state = True
+        self.auto_keyframe_state = True
+        self.refresh_suspended = False
+        self.viewport_paused = False
+
+    def undoInfo(self, query=False, stateWithoutFlush=None):
+        if query:
+            return self.undo_state
+        self.undo_state = stateWithoutFlush
+
+    def autoKeyframe(self, query=False, state=None):
+        if query:
+            return self.auto_keyframe_state
+        self.auto_keyframe_state = state
+
+    def about(self, batch=False):
+        return self.batch
+
+    def refresh(self, suspend=False):
+        self.refresh_suspended = suspend
+
+    def ogs(self, query=False, pause=False):
+        if query:
+            return self.viewport_paused
+        self.viewport_paused = not self.viewport_paused
+
+
+@pytest.fixture
+def fake_cmds(monkeypatch):
+    cmds = FakeCmds()
+    monkeypatch.setattr(fast_generation, 'cmds', cmds)
+    monkeypatch.setattr(fast_generation, '_active_context_count', [0])
+    return cmds
+
+
+def assert_scene_restored(cmds):
+    assert cmds.undo_state and cmds.auto_keyframe_state
+    assert not cmds.refresh_suspended and not cmds.viewport_paused
+    assert fast_generation._active_context_count[0] == 0
+
+
+def test_probes_run_without_undo_and_state_is_restored(fake_cmds):
+    probe_states = []
+    probe = lambda: probe_states.append((fake_cmds.undo_state, fake_cmds.auto_keyframe_state))
+    with fast_generation.FastGenerationContext('Test', probe=probe, num_probe_iterations=3) as context:
+        assert not fake_cmds.undo_state and fake_cmds.refresh_suspended and fake_cmds.viewport_paused
+        with fast_generation.FastGenerationContext('Nested'):
+            assert fast_generation._active_context_count[0] == 2
+        assert fake_cmds.refresh_suspended
+        context.num_operations = 5
+    assert probe_states == [(False, False)] * 6
+    assert context.get_estimated_time_saved() is not None
+    assert_scene_restored(fake_cmds)
+
+
+@pytest.mark.parametrize('failing_call', [2, 5])
+def test_failing_probe_restores_the_scene(fake_cmds, failing_call):
+    calls = []
+
+    def probe():
+        calls.append(1)
+        if len(calls) == failing_call:
+            raise RuntimeError('Probe failed')
+
+    with pytest.raises(RuntimeError):
+        with fast_generation.FastGenerationContext('Test', probe=probe, num_probe_iterations=3):
+            pass
+    assert_scene_restored(fake_cmds)
+
+    # A later context isn't treated as nested.
+    with fast_generation.FastGenerationContext('Test'):
+        assert not fake_cmds.undo_state and fake_cmds.refresh_suspended
+    assert_scene_restored(fake_cmds)
+
+
+def test_failing_viewport_command_restores_the_scene(fake_cmds, monkeypatch):
+    def failing_ogs(query=False, pause=False):
+        raise RuntimeError('No viewport')
+
+    monkeypatch.setattr(fake_cmds, 'ogs', failing_ogs)
+    with pytest.raises(RuntimeError):
+        with fast_generation.FastGenerationContext('Test'):
+            pass
+    assert fake_cmds.undo_state and fake_cmds.auto_keyframe_state and not fake_cmds.refresh_suspended
+    assert fast_generation._active_context_count[0] == 0
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.maya.animation import key_frame_animation
+
+NUM_CONTROLLERS = 50
+CONTROLLER_ATTRIBUTES = ['ctrl_{}.translateX'.format(index) for index in range(NUM_CONTROLLERS)]
+
+
+class FakeCurveWriter(object):
+    """Curve writer that makes the same radians and transposed copies of the values as AnimCurveWriter."""
+
+    def __init__(self, ctrl_list, attr_list):
+        self.frame_times = []
+
+    def write(self, frame_times, values, keep_existing=True):
+        curve_values = np.array(values, dtype=np.float64, copy=True)
+        curve_values = np.ascontiguousarray(np.radians(curve_values).T)
+        self.frame_times.extend(frame_times)
+
+    def print_timings(self):
+        pass
+
+
+def store_frames(key_frame_anim, num_frames):
+    key_frame_anim.set_controller_attributes(CONTROLLER_ATTRIBUTES)
+    key_frame_anim.allocate_keyframes(num_frames)
+    values = np.random.default_rng(0).random((num_frames, NUM_CONTROLLERS))
+    for frame in range(num_frames):
+        key_frame_anim.store_keyframes(float(frame), values[frame])
+    key_frame_anim.set_all_stored_keyframes()
+
+
+@pytest.mark.parametrize('flush_interval', [0, 100])
+def test_key_memory_is_measured(monkeypatch, capsys, flush_interval):
+    monkeypatch.setattr(key_frame_animation, 'AnimCurveWriter', FakeCurveWriter)
+    key_frame_anim = key_frame_animation.KeyFrameAnimation()
+    key_frame_anim.set_flush_interval(flush_interval)
+    store_frames(key_frame_anim, 1000)
+    assert key_frame_anim.curve_writer.frame_times == list(range(1000))
+
+    # The write holds at least one copy of the flushed values, and the buffer holds the flushed frames.
+    num_flushed_frames = flush_interval or 1000
+    copy_bytes = num_flushed_frames * NUM_CONTROLLERS * 8
+    assert key_frame_anim.peak_write_frames == num_flushed_frames
+    assert copy_bytes <= key_frame_anim.peak_write_memory <= 4 * copy_bytes
+    assert key_frame_anim.peak_key_memory == key_frame_anim.get_key_buffer_bytes() + key_frame_anim.peak_write_memory
+    assert 'Peak key frame memory' in capsys.readouterr().out
+
+
+def test_measure_peak_memory_keeps_tracing_state():
+    result, peak_memory = key_frame_animation.measure_peak_memory(lambda size: np.ones(size).sum(), 100000)
+    assert result == 100000 and peak_memory >= 800000
+    assert not key_frame_animation.tracemalloc.is_tracing()
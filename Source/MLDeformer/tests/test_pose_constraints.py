@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.sampling.pose_constraints import PoseConstraints
+
+CONTROLLER_NAMES = ['a', 'b', 'c']
+MIN_VALUES = [-1.0] * 3
+MAX_VALUES = [1.0] * 3
+
+
+def create_constraints(action='fix', def_values=(0.0, 0.0, 0.0), offset=0.0):
+    return PoseConstraints([
+        {'type': 'conditional', 'target': 'a', 'driver': 'b', 'operator': '>', 'value': 0.5, 'action': action},
+        {'type': 'coupled', 'source': 'a', 'target': 'c', 'scale': -1.0, 'offset': offset}],
+        CONTROLLER_NAMES, list(def_values), MIN_VALUES, MAX_VALUES)
+
+
+def test_coupled_target_follows_its_reset_source():
+    constraints = create_constraints()
+    poses, valid = constraints.apply(np.array([[0.7, 0.2, 0.0], [0.7, 0.8, 0.0]]))
+    np.testing.assert_array_equal(poses, [[0.0, 0.2, 0.0], [0.7, 0.8, -0.7]])
+    assert np.all(valid)
+    assert constraints.num_fixed == 1
+
+
+@pytest.mark.parametrize('def_values, offset, expected', [((0.3, 0.0, 0.0), 0.0, [0.3, 0.2, -0.3]),
+                                                          ((0.0, 0.0, 0.0), 0.25, [0.0, 0.2, 0.25])])
+def test_coupled_target_of_reset_source_keeps_the_coupling(def_values, offset, expected):
+    constraints = create_constraints(def_values=def_values, offset=offset)
+    poses, _ = constraints.apply(np.array([[0.7, 0.2, 0.9]]))
+    np.testing.assert_allclose(poses[0], expected)
+
+
+def test_fixed_filters_reset_coupled_targets():
+    constraints = create_constraints(action='filter')
+    poses, valid = constraints.apply(np.array([[0.7, 0.2, 0.0]]))
+    assert not valid[0]
+    poses, valid = constraints.apply(np.array([[0.7, 0.2, 0.0]]), fix_filters=True)
+    assert valid[0]
+    np.testing.assert_array_equal(poses[0], [0.0, 0.2, 0.0])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.sampling.pose_index import PoseDistanceIndex
+
+
+def get_brute_force_far_enough(accepted, points, radius):
+    squared_distances = np.sum((points[:, np.newaxis, :] - accepted[np.newaxis, :, :]) ** 2, axis=2)
+    return np.all(squared_distances >= radius * radius, axis=1)
+
+
+@pytest.mark.parametrize('num_dimensions, radius', [(3, 0.05), (12, 0.4), (12, 2.0)])
+def test_batch_query_matches_brute_force(num_dimensions, radius):
+    rng = np.random.default_rng(5)
+    distance_index = PoseDistanceIndex(num_dimensions, radius)
+    accepted = rng.random((400, num_dimensions))
+    for point in accepted:
+        distance_index.add(point)
+    # Half of the batch lies close to accepted poses.
+    points = np.concatenate((rng.random((50, num_dimensions)),
+                             accepted[:50] + rng.normal(0.0, radius / (2.0 * np.sqrt(num_dimensions)),
+                                                        (50, num_dimensions))))
+    expected = get_brute_force_far_enough(accepted, points, radius)
+    assert not np.all(expected)
+    np.testing.assert_array_equal(distance_index.are_far_enough(points), expected)
+    np.testing.assert_array_equal([distance_index.is_far_enough(point) for point in points], expected)
+
+
+def test_empty_index_accepts_every_pose():
+    distance_index = PoseDistanceIndex(4, 0.1)
+    np.testing.assert_array_equal(distance_index.are_far_enough(np.zeros((3, 4))), [True, True, True])
+    distance_index.add(np.zeros(4))
+    np.testing.assert_array_equal(distance_index.are_far_enough(np.array([[0.0, 0.0, 0.0, 0.05], [0.5, 0, 0, 0]])),
+                                  [False, True])
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+
+from mldeformer.generator.maya.generation.pose_generator import get_distinct_pose_mask
+from mldeformer.generator.sampling.coverage import normalize_poses
+from mldeformer.generator.sampling.distributions import ControllerDistributions, DISTRIBUTION_DISCRETE, \
+    DISTRIBUTION_UNIFORM
+from mldeformer.generator.sampling.pose_constraints import PoseConstraints
+from mldeformer.generator.sampling.pose_index import PoseDistanceIndex
+from mldeformer.generator.sampling.pose_repair import PoseRepairer
+from mldeformer.generator.sampling.pose_sampler import PoseSampler
+
+CONTROLLER_NAMES = ['ctrl_{}.translateX'.format(index) for index in range(6)]
+TARGET_GROUPS = {'group_a': [0, 1], 'group_b': [2, 3], 'group_c': [4, 5]}
+MAX_VALUES = [1.0] * 6
+MIN_VALUES = [-1.0] * 6
+DEF_VALUES = [0.0] * 6
+
+
+def create_sampler(constraints=None):
+    types = [DISTRIBUTION_UNIFORM, DISTRIBUTION_DISCRETE] * 3
+    distributions = ControllerDistributions(types, [[], [-1.0, 0.0, 1.0]] * 3, np.array(MIN_VALUES),
+                                            np.array(MAX_VALUES), np.array(DEF_VALUES))
+    if constraints is not None:
+        constraints = PoseConstraints(constraints, CONTROLLER_NAMES, DEF_VALUES, MIN_VALUES, MAX_VALUES)
+    return PoseSampler(CONTROLLER_NAMES, TARGET_GROUPS, 1.0, MAX_VALUES, MIN_VALUES, DEF_VALUES, random_seed=3,
+                       distributions=distributions, constraints=constraints)
+
+
+def create_repairer(pose_sampler):
+    return PoseRepairer(pose_sampler.def_values, pose_sampler.group_indices, pose_sampler.num_groups, 6,
+                        pose_sampler.get_unblendable_columns(), pose_sampler.constraints)
+
+
+def is_small(pose):
+    """Pose test that rejects large continuous values."""
+    return np.abs(pose[[0, 2, 4]]).sum() < 0.6
+
+
+def test_discrete_values_are_not_blended():
+    pose_sampler = create_sampler()
+    repairer = create_repairer(pose_sampler)
+    assert pose_sampler.get_unblendable_columns().tolist() == [1, 3, 5]
+
+    pose = np.array([0.9, 1.0, -0.8, -1.0, 0.7, 1.0])
+    tested = []
+    repaired = repairer.repair(pose, lambda values: tested.append(values.copy()) or is_small(values))
+    assert repaired is not None and is_small(repaired)
+    # Every tested pose keeps the sampled discrete values, and the result is one of the tested poses.
+    for values in tested:
+        np.testing.assert_array_equal(values[[1, 3, 5]], pose[[1, 3, 5]])
+    assert any(np.array_equal(values, repaired) for values in tested)
+    assert repairer.num_tests == len(tested)
+
+
+def test_constraints_are_applied_to_repaired_poses():
+    pose_sampler = create_sampler([
+        {'type': 'coupled', 'source': CONTROLLER_NAMES[0], 'target': CONTROLLER_NAMES[2], 'scale': -1.0},
+        {'type': 'conditional', 'target': CONTROLLER_NAMES[4], 'driver': CONTROLLER_NAMES[0], 'operator': '>',
+         'value': 0.5, 'action': 'filter'}])
+    repairer = create_repairer(pose_sampler)
+
+    pose = pose_sampler.constraints.apply(np.array([[0.9, 1.0, 0.0, -1.0, 0.2, 1.0]]))[0][0]
+    tested = []
+    repaired = repairer.repair(pose, lambda values: tested.append(values.copy()) or is_small(values))
+    assert repaired is not None
+    for values in tested:
+        # The coupling holds and the filtered poses never reach the pose test.
+        assert values[2] == -values[0]
+        assert values[4] == 0.0 or values[0] > 0.5
+    fixed, valid = pose_sampler.constraints.apply(repaired[np.newaxis])
+    assert valid[0]
+    np.testing.assert_array_equal(fixed[0], repaired)
+
+
+def test_repaired_poses_keep_the_minimum_distance():
+    pose_sampler = create_sampler()
+    repairer = create_repairer(pose_sampler)
+    distance_index = PoseDistanceIndex(6, 0.02)
+    pose = np.array([0.9, 1.0, -0.8, -1.0, 0.7, 1.0])
+
+    # Accept the pose the repair finds without a distance check, the same repair must then find another pose.
+    first = create_repairer(pose_sampler).repair(pose, is_small)
+    distance_index.add(normalize_poses(first, pose_sampler.min_values, pose_sampler.max_values)[0])
+    repaired = repairer.repair(pose, lambda values: get_distinct_pose_mask(
+        distance_index, pose_sampler, values)[0] and is_small(values))
+    assert repaired is not None and is_small(repaired)
+    assert get_distinct_pose_mask(distance_index, pose_sampler, repaired)[0]
+
+
+def test_pose_without_blendable_changes_fails():
+    pose_sampler = create_sampler()
+    repairer = create_repairer(pose_sampler)
+    assert repairer.repair(np.array([0.0, 1.0, 0.0, -1.0, 0.0, 1.0]), lambda values: False) is None
+    assert repairer.num_failed == 1 and repairer.num_tests == 0
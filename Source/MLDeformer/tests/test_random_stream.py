@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.sampling import random_stream
+from mldeformer.generator.sampling.distributions import ControllerDistributions, DISTRIBUTION_BETA, \
+    DISTRIBUTION_DISCRETE, DISTRIBUTION_NORMAL, DISTRIBUTION_UNIFORM
+from mldeformer.generator.sampling.pose_constraints import PoseConstraints
+from mldeformer.generator.sampling.pose_sampler import PoseSampler
+
+NUM_CONTROLLERS = 8
+CONTROLLER_NAMES = ['ctrl_{}.translateX'.format(index) for index in range(NUM_CONTROLLERS)]
+TARGET_GROUPS = dict(('group_{}'.format(index), [2 * index, 2 * index + 1]) for index in range(NUM_CONTROLLERS // 2))
+MAX_VALUES = [1.0] * NUM_CONTROLLERS
+MIN_VALUES = [-1.0] * NUM_CONTROLLERS
+DEF_VALUES = [0.0] * NUM_CONTROLLERS
+
+
+def create_frame_sampler(random_seed=7, with_distributions=False, with_constraints=False):
+    distributions = None
+    if with_distributions:
+        types = [DISTRIBUTION_UNIFORM, DISTRIBUTION_NORMAL, DISTRIBUTION_BETA, DISTRIBUTION_DISCRETE] * 2
+        distributions = ControllerDistributions(types, [[]] * NUM_CONTROLLERS, np.array(MIN_VALUES),
+                                                np.array(MAX_VALUES), np.array(DEF_VALUES))
+    constraints = None
+    if with_constraints:
+        constraints = PoseConstraints([
+            {'type': 'conditional', 'target': CONTROLLER_NAMES[0], 'driver': CONTROLLER_NAMES[2], 'operator': '>',
+             'value': 0.0, 'action': 'filter'},
+            {'type': 'coupled', 'source': CONTROLLER_NAMES[4], 'target': CONTROLLER_NAMES[5], 'scale': -1.0}],
+            CONTROLLER_NAMES, DEF_VALUES, MIN_VALUES, MAX_VALUES)
+    return PoseSampler(CONTROLLER_NAMES, TARGET_GROUPS, 0.6, MAX_VALUES, MIN_VALUES, DEF_VALUES,
+                       random_seed=random_seed, seed_mode=random_stream.SEED_MODE_PER_FRAME,
+                       distributions=distributions, constraints=constraints)
+
+
+def test_frame_generator_only_depends_on_seed_frame_and_retry():
+    first = random_stream.create_frame_generator(3, 120, 2).random(16)
+    # Drawing from other frames in between doesn't change the stream.
+    random_stream.create_frame_generator(3, 119, 2).random(1000)
+    assert np.array_equal(random_stream.create_frame_generator(3, 120, 2).random(16), first)
+    assert not np.array_equal(random_stream.create_frame_generator(3, 120, 3).random(16), first)
+    assert not np.array_equal(random_stream.create_frame_generator(3, 121, 2).random(16), first)
+    assert not np.array_equal(random_stream.create_frame_generator(4, 120, 2).random(16), first)
+
+
+@pytest.mark.parametrize('with_distributions, with_constraints', [(False, False), (True, False), (True, True)])
+def test_frame_poses_are_independent_of_order_and_sharding(with_distributions, with_constraints):
+    frames = np.arange(-5, 95)
+    poses, group_active = create_frame_sampler(
+        with_distributions=with_distributions, with_constraints=with_constraints).sample_frames(frames)
+
+    # Shuffled order.
+    order = np.random.default_rng(0).permutation(len(frames))
+    shuffled_poses, shuffled_group_active = create_frame_sampler(
+        with_distributions=with_distributions, with_constraints=with_constraints).sample_frames(frames[order])
+    assert np.array_equal(shuffled_poses, poses[order])
+    assert np.array_equal(shuffled_group_active, group_active[order])
+
+    # Uneven shards with their own samplers, in reverse shard order.
+    sharded_poses = np.zeros_like(poses)
+    for shard_frames in reversed(np.array_split(np.arange(len(frames)), [13, 14, 60])):
+        shard_sampler = create_frame_sampler(with_distributions=with_distributions, with_constraints=with_constraints)
+        sharded_poses[shard_frames] = shard_sampler.sample_frames(frames[shard_frames])[0]
+    assert np.array_equal(sharded_poses, poses)
+
+    # One frame at a time.
+    single_sampler = create_frame_sampler(with_distributions=with_distributions, with_constraints=with_constraints)
+    for row in (99, 0, 42):
+        assert np.array_equal(single_sampler.pose(int(frames[row])), poses[row])
+
+
+def test_retry_candidates_match_single_retries():
+    sampler = create_frame_sampler(with_distributions=True)
+    candidates, candidate_group_active = sampler.pose_candidates(30, 2, 5)
+    for index in range(5):
+        poses, group_active = create_frame_sampler(with_distributions=True).sample_frames([30], 2 + index)
+        assert np.array_equal(candidates[index], poses[0])
+        assert np.array_equal(candidate_group_active[index], group_active[0])
+    assert not np.array_equal(candidates[0], candidates[1])
+
+
+def test_frame_poses_depend_on_seed():
+    frames = np.arange(20)
+    assert not np.array_equal(create_frame_sampler(random_seed=1).sample_frames(frames)[0],
+                              create_frame_sampler(random_seed=2).sample_frames(frames)[0])
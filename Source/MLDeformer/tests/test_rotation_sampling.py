@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import numpy as np
+import pytest
+
+from mldeformer.generator.maya.generation import pose_generator
+from mldeformer.generator.sampling.distributions import DISTRIBUTION_NORMAL, DISTRIBUTION_UNIFORM
+
+CONTROLLER_ATTRIBUTES = ['joint1.rotateX', 'joint1.rotateY', 'joint1.rotateZ']
+
+
+class FakeCmds(object):
+    """Scene with a single joint, with limits on its x minimum and z maximum rotation."""
+
+    def currentUnit(self, query=False, angle=False):
+        return 'deg'
+
+    def attributeQuery(self, name, node=None, exists=False):
+        return True
+
+    def getAttr(self, name):
+        return 0
+
+    def objectType(self, node):
+        return 'joint'
+
+    def joint(self, node, query=False, **kwargs):
+        return [-30.0, 200.0, -360.0, 360.0, -360.0, 45.0, True, False, False, False, False, True]
+
+
+@pytest.fixture
+def fake_cmds(monkeypatch):
+    cmds = FakeCmds()
+    monkeypatch.setattr(pose_generator, 'cmds', cmds)
+    return cmds
+
+
+def test_rotation_range_is_narrowed_by_the_joint_limits(fake_cmds):
+    samplers = pose_generator.get_rotation_group_samplers({'joint1': [0, 1, 2]}, CONTROLLER_ATTRIBUTES,
+                                                          [90.0, 90.0, 90.0], [-90.0, -90.0, -90.0])
+    assert len(samplers) == 1
+    np.testing.assert_array_equal(samplers[0].min_values, [-30.0, -90.0, -90.0])
+    np.testing.assert_array_equal(samplers[0].max_values, [90.0, 90.0, 45.0])
+
+    angles = samplers[0].sample(np.random.default_rng(0), 1000)
+    assert np.all(angles >= samplers[0].min_values) and np.all(angles <= samplers[0].max_values)
+
+
+@pytest.mark.parametrize('distribution_types, warns', [([DISTRIBUTION_UNIFORM] * 3, False),
+                                                       ([DISTRIBUTION_UNIFORM, DISTRIBUTION_NORMAL,
+                                                         DISTRIBUTION_UNIFORM], True)])
+def test_non_uniform_rotation_distribution_warns(fake_cmds, capsys, distribution_types, warns):
+    pose_generator.get_rotation_group_samplers({'joint1': [0, 1, 2]}, CONTROLLER_ATTRIBUTES, [90.0] * 3,
+                                               [-90.0] * 3, distribution_types)
+    assert ('Warning' in capsys.readouterr().out) == warns
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+# Copyright Epic Games, Inc. All Rights Reserved
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from mldeformer.generator.maya.animation.key_frame_animation import KeyFrameAnimation
+from mldeformer.generator.maya.generation import sharding
+from mldeformer.ui.config import Config
+
+
+class FakeEventHandler(object):
+    """Event handler that cancels after a number of progress checks, or never when cancel_after is None."""
+
+    def __init__(self, generator_config=None, cancel_after=None, fail_after=None):
+        self.generator_config = generator_config
+        self.cancel_after = cancel_after
+        self.fail_after = fail_after
+        self.num_checks = 0
+        self.progress_values = []
+
+    def start_progress_bar(self, title):
+        pass
+
+    def set_progress_bar_value(self, value):
+        self.progress_values.append(value)
+        if self.fail_after is not None and len(self.progress_values) > self.fail_after:
+            raise RuntimeError('Progress bar failed')
+
+    def is_progress_bar_cancelled(self):
+        self.num_checks += 1
+        return self.cancel_after is not None and self.num_checks > self.cancel_after
+
+
+def python_command(code):
+    return [sys.executable, '-c', code]
+
+
+def save_test_shard(file_path, frame_times, values, controller_attributes):
+    key_frame_anim = KeyFrameAnimation()
+    key_frame_anim.set_controller_attributes(controller_attributes)
+    key_frame_anim.allocate_keyframes(len(frame_times))
+    key_frame_anim.store_keyframes_batch(np.asarray(frame_times, dtype=np.float64), np.asarray(values))
+    sharding.save_shard(file_path, key_frame_anim)
+
+
+@pytest.mark.parametrize('start_frame, num_samples, num_shards', [
+    (0, 100, 4), (7, 10, 3), (-5, 3, 8), (0, 1, 1), (10, 1000, 7)])
+def test_split_frame_range_covers_range(start_frame, num_samples, num_shards):
+    shards = sharding.split_frame_range(start_frame, num_samples, num_shards)
+    assert len(shards) == min(num_shards, num_samples)
+    assert shards[0][0] == start_frame
+    for (shard_start, shard_num_samples), (next_start, _) in zip(shards[:-1], shards[1:]):
+        assert shard_start + shard_num_samples == next_start
+    sizes = [shard_num_samples for _, shard_num_samples in shards]
+    assert sum(sizes) == num_samples
+    assert max(sizes) - min(sizes) <= 1
+
+
+@pytest.mark.parametrize('start_frame, num_samples, num_shards', [(0, 100, 4), (3, 11, 3), (1, 7, 8), (0, 1, 2)])
+def test_split_frame_range_keeps_frame_pairs_together(start_frame, num_samples, num_shards):
+    shards = sharding.split_frame_range(start_frame, num_samples, num_shards, alignment=2)
+    assert sum(shard_num_samples for _, shard_num_samples in shards) == num_samples
+    # Mirrored frames are at odd offsets from the start frame, every shard has to start at a source frame.
+    assert all((shard_start - start_frame) % 2 == 0 for shard_start, _ in shards)
+    assert len(shards) == min(num_shards, (num_samples + 1) // 2)
+
+
+def test_split_frame_range_without_frames():
+    assert sharding.split_frame_range(3, 0, 4) == [(3, 0)]
+
+
+def test_save_and_load_shard(tmp_path):
+    shard_file = str(tmp_path / 'Shard0.npz')
+    values = np.arange(6, dtype=np.float64).reshape(3, 2)
+    save_test_shard(shard_file, [4, 5, 6], values, ['arm.rotateX', 'leg.translateY'])
+
+    frame_times, loaded_values, controller_attributes = sharding.load_shard(shard_file)
+    np.testing.assert_array_equal(frame_times, [4, 5, 6])
+    np.testing.assert_array_equal(loaded_values, values)
+    assert controller_attributes == ['arm.rotateX', 'leg.translateY']
+
+
+def test_merge_shards_in_frame_order(tmp_path):
+    rng = np.random.default_rng(3)
+    attributes = ['a.tx', 'b.ty', 'c.tz']
+    values = rng.random((10, 3))
+    shard_files = []
+    # Saved out of frame order, like shards that finish in any order.
+    for shard_index, frames in enumerate([range(6, 10), range(0, 3), range(3, 6)]):
+        shard_files.append(str(tmp_path / 'Shard{}.npz'.format(shard_index)))
+        save_test_shard(shard_files[-1], list(frames), values[list(frames)], attributes)
+
+    frame_times, merged_values, controller_attributes = sharding.merge_shards(shard_files)
+    np.testing.assert_array_equal(frame_times, np.arange(10))
+    np.testing.assert_array_equal(merged_values, values)
+    assert controller_attributes == attributes
+
+
+def test_merge_shards_rejects_different_attributes(tmp_path):
+    first_file = str(tmp_path / 'Shard0.npz')
+    second_file = str(tmp_path / 'Shard1.npz')
+    save_test_shard(first_file, [0], np.zeros((1, 1)), ['a.tx'])
+    save_test_shard(second_file, [1], np.zeros((1, 1)), ['b.tx'])
+    with pytest.raises(ValueError):
+        sharding.merge_shards([first_file, second_file])
+
+
+def test_merge_shards_rejects_overlapping_frames(tmp_path):
+    first_file = str(tmp_path / 'Shard0.npz')
+    second_file = str(tmp_path / 'Shard1.npz')
+    save_test_shard(first_file, [0, 1], np.zeros((2, 1)), ['a.tx'])
+    save_test_shard(second_file, [1, 2], np.zeros((2, 1)), ['a.tx'])
+    with pytest.raises(ValueError):
+        sharding.merge_shards([first_file, second_file])
+
+
+def test_merge_shards_without_shards():
+    frame_times, values, controller_attributes = sharding.merge_shards([])
+    assert len(frame_times) == 0 and values.shape == (0, 0) and controller_attributes == []
+
+
+def test_run_shard_commands_return_codes_and_logs(tmp_path):
+    commands = [python_command('print("shard {}")'.format(index)) for index in range(3)]
+    commands.append(python_command('import sys; sys.exit(3)'))
+    log_files = [str(tmp_path / 'Shard{}.log'.format(index)) for index in range(len(commands))]
+    event_handler = FakeEventHandler()
+
+    return_codes = sharding.run_shard_commands(commands, log_files, num_processes=2, event_handler=event_handler,
+                                               poll_interval=0.01)
+    assert return_codes == [0, 0, 0, 3]
+    for index in range(3):
+        with open(log_files[index]) as log:
+            assert log.read().strip() == 'shard {}'.format(index)
+    assert event_handler.progress_values[-1] == 100
+
+
+def test_run_shard_commands_kills_workers_when_cancelled(tmp_path):
+    commands = [python_command('import time; time.sleep(60)') for _ in range(3)]
+    log_files = [str(tmp_path / 'Shard{}.log'.format(index)) for index in range(len(commands))]
+
+    start_time = time.time()
+    return_codes = sharding.run_shard_commands(commands, log_files, num_processes=2,
+                                               event_handler=FakeEventHandler(cancel_after=1), poll_interval=0.01)
+    assert return_codes == [None, None, None]
+    # The sleeping workers are killed instead of waited for.
+    assert time.time() - start_time < 30
+    # The third shard never started, so it has no log.
+    assert not os.path.exists(log_files[2])
+
+
+def test_run_shard_commands_kills_workers_on_error(tmp_path, monkeypatch):
+    processes = []
+    popen = sharding.subprocess.Popen
+
+    def record_popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(sharding.subprocess, 'Popen', record_popen)
+    commands = [python_command('import time; time.sleep(60)') for _ in range(2)]
+    log_files = [str(tmp_path / 'Shard{}.log'.format(index)) for index in range(len(commands))]
+    with pytest.raises(RuntimeError):
+        sharding.run_shard_commands(commands, log_files, num_processes=2, event_handler=FakeEventHandler(fail_after=0),
+                                    poll_interval=0.01)
+    assert len(processes) == 2
+    assert all(process.poll() is not None for process in processes)
+
+
+@pytest.mark.parametrize('name, value', [
+    ('min_pose_distance', 0.1), ('adaptive_num_samples', True)])
+def test_generate_samples_sharded_rejects_history_dependent_settings(tmp_path, name, value):
+    config = Config(str(tmp_path))
+    setattr(config, name, value)
+    generated, message = sharding.generate_samples_sharded(FakeEventHandler(config), mayapy=sys.executable)
+    assert not generated
+    assert name in message
+
+
+@pytest.mark.parametrize('return_codes', [None, [None, None], [0, 1]])
+def test_generate_samples_sharded_removes_temporary_folder(tmp_path, monkeypatch, return_codes):
+    work_folder = str(tmp_path / 'work')
+
+    def make_work_folder(prefix=''):
+        os.makedirs(work_folder)
+        return work_folder
+
+    def run_shards(commands, log_files, num_processes=None, event_handler=None):
+        assert os.path.isdir(work_folder)
+        if return_codes is None:
+            raise RuntimeError('Worker failed to start')
+        return return_codes
+
+    monkeypatch.setattr(sharding.tempfile, 'mkdtemp', make_work_folder)
+    monkeypatch.setattr(sharding, 'run_shard_commands', run_shards)
+    config = Config(str(tmp_path))
+    config.num_samples = 10
+    event_handler = FakeEventHandler(config)
+    if return_codes is None:
+        with pytest.raises(RuntimeError):
+            sharding.generate_samples_sharded(event_handler, num_shards=2, mayapy=sys.executable)
+    else:
+        generated, _ = sharding.generate_samples_sharded(event_handler, num_shards=2, mayapy=sys.executable)
+        assert not generated
+    assert not os.path.exists(work_folder)